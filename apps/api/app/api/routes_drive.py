@@ -24,21 +24,21 @@ class FolderSelectReq(BaseModel):
 
 
 @router.post("/drive/oauth/start")
-def oauth_start(req: OAuthStartReq):
+async def oauth_start(req: OAuthStartReq):
     try:
-        return create_oauth_start(email=req.email)
+        return await create_oauth_start(email=req.email)
     except RuntimeError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 @router.get("/drive/oauth/callback")
-def oauth_callback(code: str | None = None, state: str | None = None, error: str | None = None):
+async def oauth_callback(code: str | None = None, state: str | None = None, error: str | None = None):
     if error:
         raise HTTPException(status_code=400, detail=f"OAuth provider returned error: {error}")
     if not code or not state:
         raise HTTPException(status_code=400, detail="Missing OAuth code/state")
     try:
-        return complete_oauth_callback(state=state, code=code)
+        return await complete_oauth_callback(state=state, code=code)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
     except RuntimeError as exc:
@@ -46,29 +46,37 @@ def oauth_callback(code: str | None = None, state: str | None = None, error: str
 
 
 @router.get("/drive/status")
-def drive_status(email: EmailStr = Query(...)):
-    return get_drive_status(email=email)
+async def drive_status(email: EmailStr = Query(...)):
+    return await get_drive_status(email=email)
 
 
 @router.get("/drive/folders")
-def drive_folders(email: EmailStr = Query(...)):
+async def drive_folders(
+    email: EmailStr = Query(...),
+    page_size: int = Query(200, ge=1, le=1000),
+    page_token: str | None = Query(None),
+):
     try:
-        return list_drive_folders(email=email)
+        return await list_drive_folders(email=email, page_size=page_size, page_token=page_token)
     except (ValueError, RuntimeError) as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 @router.get("/drive/photos")
-def drive_photos(email: EmailStr = Query(...), limit: int = Query(30, ge=1, le=200)):
+async def drive_photos(
+    email: EmailStr = Query(...),
+    limit: int = Query(30, ge=1, le=1000),
+    page_token: str | None = Query(None),
+):
     try:
-        return list_selected_folder_photos(email=email, limit=limit)
+        return await list_selected_folder_photos(email=email, limit=limit, page_token=page_token)
     except (ValueError, RuntimeError) as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
 
 @router.post("/drive/folder/select")
-def folder_select(req: FolderSelectReq):
+async def folder_select(req: FolderSelectReq):
     try:
-        return select_drive_folder(email=req.email, folder_id=req.folder_id, folder_name=req.folder_name)
+        return await select_drive_folder(email=req.email, folder_id=req.folder_id, folder_name=req.folder_name)
     except (ValueError, RuntimeError) as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
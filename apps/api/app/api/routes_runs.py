@@ -1,10 +1,30 @@
-from fastapi import APIRouter
-from pydantic import BaseModel, EmailStr
+import asyncio
+import hashlib
+import uuid
 
-from app.services.run_service import create_run, get_run
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr, Field
+
+from app.services.artifact_projection import parse_fields
+from app.services.background_jobs import revoke_step_tasks
+from app.services.run_events import run_event_hub, run_event_stream
+from app.services.run_service import (
+    RerunUnavailable,
+    cancel_run,
+    create_rerun,
+    create_run_once,
+    create_runs,
+    get_run_progress,
+    get_run_version,
+    get_run_with_version,
+)
+from app.settings import RUNS_BATCH_MAX, RUNS_COALESCE_RUNNING
 
 router = APIRouter(tags=["runs"])
 
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
 
 class CreateRunReq(BaseModel):
     email: EmailStr
@@ -12,11 +32,127 @@ class CreateRunReq(BaseModel):
 
 
 @router.post("/runs")
-def post_runs(req: CreateRunReq):
-    run_id = create_run(email=req.email, trigger=req.trigger)
-    return {"run_id": run_id}
+async def post_runs(req: CreateRunReq, idempotency_key: str | None = Header(default=None)):
+    if idempotency_key is not None:
+        idempotency_key = idempotency_key.strip()
+        if not idempotency_key or len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise HTTPException(
+                status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters"
+            )
+    run_id, created = await create_run_once(
+        email=req.email, trigger=req.trigger, idempotency_key=idempotency_key, coalesce=RUNS_COALESCE_RUNNING
+    )
+    return {"run_id": run_id, "created": created}
+
+
+class CreateRunsBatchReq(BaseModel):
+    emails: list[EmailStr] = Field(min_length=1, max_length=RUNS_BATCH_MAX)
+    trigger: str = "manual"
+
+
+@router.post("/runs/batch")
+async def post_runs_batch(req: CreateRunsBatchReq):
+    run_ids = await create_runs(emails=req.emails, trigger=req.trigger)
+    return {"run_ids": run_ids}
+
+
+@router.post("/runs/{run_id}/rerun")
+async def post_run_rerun(
+    run_id: str,
+    from_step: str = Query(alias="from", description="Step to start from; earlier steps reuse this run's artifacts."),
+):
+    try:
+        run_id = str(uuid.UUID(run_id))
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail="Run not found") from exc
+    from_step = from_step.strip().upper()
+    try:
+        new_run_id = await create_rerun(run_id, from_step)
+    except RerunUnavailable as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if new_run_id is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {"run_id": new_run_id, "parent_run_id": run_id, "from": from_step}
+
+
+@router.post("/runs/{run_id}/cancel")
+async def post_run_cancel(run_id: str):
+    try:
+        run_id = str(uuid.UUID(run_id))
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail="Run not found") from exc
+    result = await cancel_run(run_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    if result["status"] != "CANCELED":
+        raise HTTPException(status_code=409, detail=f"Run already {result['status']}")
+    task_ids = result.pop("task_ids")
+    # Revoked tasks never start; steps already running notice the cancel before their next provider call.
+    result["revoked"] = await asyncio.to_thread(revoke_step_tasks, task_ids) if task_ids else True
+    return result
+
+
+def _etag(version: str, variant: str = "") -> str:
+    if variant:
+        version = f"{version}-{hashlib.md5(variant.encode('utf-8')).hexdigest()[:12]}"
+    return f'"{version}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
 
 
 @router.get("/runs/{run_id}")
-def get_runs(run_id: str):
-    return get_run(run_id)
+async def get_runs(
+    run_id: str,
+    response: Response,
+    artifacts: str | None = Query(default=None, description="Comma-separated artifact kinds; empty for none."),
+    fields: str | None = Query(default=None, description="Comma-separated JSON paths kept in each artifact."),
+    if_none_match: str | None = Header(default=None),
+):
+    kinds = [kind.strip() for kind in artifacts.split(",") if kind.strip()] if artifacts is not None else None
+    try:
+        field_tree = parse_fields(fields) if fields else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    variant = f"{artifacts}|{fields}" if artifacts is not None or fields else ""
+
+    if if_none_match:
+        version = await get_run_version(run_id)
+        if version and _etag_matches(if_none_match, _etag(version, variant)):
+            return Response(status_code=304, headers={"ETag": _etag(version, variant), "Cache-Control": "no-cache"})
+
+    payload, version = await get_run_with_version(run_id, kinds=kinds, fields=field_tree)
+    if version:
+        response.headers["ETag"] = _etag(version, variant)
+        response.headers["Cache-Control"] = "no-cache"
+    return payload
+
+
+@router.get("/runs/{run_id}/events")
+async def get_run_events(run_id: str, request: Request):
+    try:
+        run_id = str(uuid.UUID(run_id))
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail="Run not found") from exc
+
+    # Subscribe (which waits for LISTEN to be live) before taking the snapshot, so no transition can fall between
+    # the two; transitions lost to a listener reconnect are covered by the stream's resync.
+    queue = await run_event_hub.subscribe(run_id)
+    try:
+        snapshot = await get_run_progress(run_id)
+    except Exception:
+        run_event_hub.unsubscribe(run_id, queue)
+        raise
+    if snapshot is None:
+        run_event_hub.unsubscribe(run_id, queue)
+        raise HTTPException(status_code=404, detail="Run not found")
+
+    return StreamingResponse(
+        run_event_stream(run_id, queue, snapshot, request.is_disconnected, get_run_progress),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
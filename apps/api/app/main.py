@@ -1,13 +1,25 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from app.api.routes_drive import router as drive_router
 from app.api.routes_runs import router as runs_router
+from app.services.drive_service import close_http_client
+from app.services.run_service import engine
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    yield
+    await close_http_client()
+    await engine.dispose()
+
 
-app = FastAPI(title="HelloStylish API")
+app = FastAPI(title="HelloStylish API", lifespan=lifespan)
 app.include_router(runs_router, prefix="/api")
 app.include_router(drive_router, prefix="/api")
 
 
 @app.get("/health")
-def health():
+async def health():
     return {"ok": True}
@@ -0,0 +1,78 @@
+import re
+
+MAX_PROJECTION_FIELDS = 50
+MAX_PROJECTION_DEPTH = 6
+_FIELD_SEGMENT = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def parse_fields(fields: str) -> dict:
+    """Turn ``ranked_items.sku,ranked_items.score`` into a nested key tree; {} marks a value kept whole."""
+    paths = {tuple(path.strip().split(".")) for path in fields.split(",") if path.strip()}
+    if len(paths) > MAX_PROJECTION_FIELDS:
+        raise ValueError(f"At most {MAX_PROJECTION_FIELDS} fields may be requested")
+
+    tree: dict = {}
+    for segments in sorted(paths, key=len):
+        if len(segments) > MAX_PROJECTION_DEPTH or not all(_FIELD_SEGMENT.match(segment) for segment in segments):
+            raise ValueError(f"Invalid field path: {'.'.join(segments)}")
+        if any(segments[:idx] in paths for idx in range(1, len(segments))):
+            continue  # an ancestor is already requested whole
+        node = tree
+        for segment in segments[:-1]:
+            node = node.setdefault(segment, {})
+        node[segments[-1]] = {}
+    return tree
+
+
+def projection_sql(expr: str, tree: dict, params: dict) -> str:
+    """Build a JSONB expression keeping only ``tree`` from ``expr``; arrays of objects are projected per element.
+
+    Keys are bound as parameters (added to ``params``), never interpolated.
+    """
+    names: dict[tuple[int, str], str] = {}
+
+    def bind(node: dict) -> None:
+        for key, child in node.items():
+            name = f"pf_{len(names)}"
+            names[(id(node), key)] = name
+            params[name] = key
+            bind(child)
+
+    def build_object(source: str, node: dict, depth: int) -> str:
+        parts = []
+        for key, child in node.items():
+            name = names[(id(node), key)]
+            parts.append(f"CAST(:{name} AS TEXT), {build(f'({source} -> CAST(:{name} AS TEXT))', child, depth + 1)}")
+        return f"jsonb_build_object({', '.join(parts)})"
+
+    def build(source: str, node: dict, depth: int) -> str:
+        if not node:
+            return source
+        element, ordinal = f"pe_{depth}", f"po_{depth}"
+        element_object = build_object(element, node, depth)
+        element_sql = f"CASE jsonb_typeof({element}) WHEN 'object' THEN {element_object} ELSE NULL END"
+        return (
+            f"CASE jsonb_typeof({source}) "
+            f"WHEN 'object' THEN {build_object(source, node, depth)} "
+            f"WHEN 'array' THEN (SELECT COALESCE(jsonb_agg({element_sql} ORDER BY {ordinal}), '[]'::jsonb) "
+            f"FROM jsonb_array_elements({source}) WITH ORDINALITY AS pt_{depth}({element}, {ordinal})) "
+            f"ELSE NULL END"
+        )
+
+    bind(tree)
+    return build(expr, tree, 0)
+
+
+def project_payload(value, tree: dict):
+    """Python twin of projection_sql, for payloads that live in object storage."""
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [_project_object(item, tree) if isinstance(item, dict) else None for item in value]
+    if isinstance(value, dict):
+        return _project_object(value, tree)
+    return None
+
+
+def _project_object(value: dict, tree: dict) -> dict:
+    return {key: project_payload(value.get(key), child) for key, child in tree.items()}
@@ -0,0 +1,34 @@
+from personal_stylist_common.artifact_storage import ArtifactStore
+
+from app.settings import (
+    ARTIFACT_FS_ROOT,
+    MINIO_ACCESS_KEY,
+    MINIO_BUCKET,
+    MINIO_ENDPOINT,
+    MINIO_SECRET_KEY,
+    MINIO_SECURE,
+)
+
+# Read-only here; the workers write payloads through the same ArtifactStore.
+artifact_store = ArtifactStore(
+    fs_root=ARTIFACT_FS_ROOT,
+    minio_endpoint=MINIO_ENDPOINT,
+    minio_access_key=MINIO_ACCESS_KEY,
+    minio_secret_key=MINIO_SECRET_KEY,
+    minio_bucket=MINIO_BUCKET,
+    minio_secure=MINIO_SECURE,
+)
+
+
+def load_json_artifact(storage_backend: str, key: str) -> dict:
+    """Read a zstd-compressed JSON artifact written by the workers' object-storage backend."""
+    return artifact_store.get_json(storage_backend, key)
+
+
+def resolve_artifact(row: dict) -> dict:
+    """Return an artifact row with inline_json filled from object storage when the payload lives outside Postgres."""
+    storage_backend = row.get("storage_backend") or "inline"
+    item = {key: value for key, value in row.items() if key not in ("storage_backend", "storage_key")}
+    if row.get("inline_json") is None and storage_backend != "inline" and row.get("storage_key"):
+        item["inline_json"] = load_json_artifact(storage_backend, row["storage_key"])
+    return item
@@ -0,0 +1,32 @@
+from celery import Celery
+
+from app.settings import CELERY_BROKER_URL, CELERY_RESULT_BACKEND
+
+# Served by the dedicated low-concurrency worker so pre-warming never takes slots from interactive runs.
+BACKGROUND_QUEUE = "background"
+
+celery_app = Celery("api", broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
+
+
+def enqueue_style_brief_prewarm(user_id) -> bool:
+    try:
+        celery_app.send_task(
+            "workers.worker.prewarm_style_brief",
+            args=[str(user_id)],
+            queue=BACKGROUND_QUEUE,
+        )
+    except Exception:
+        # Pre-warming is an optimization; the run path still computes STYLE_BRIEF inline.
+        return False
+    return True
+
+
+def revoke_step_tasks(task_ids: list[str]) -> bool:
+    if not task_ids:
+        return True
+    try:
+        celery_app.control.revoke(task_ids)
+    except Exception:
+        # Revoking only saves the slot; a canceled step's task is skipped when it fails to claim the step.
+        return False
+    return True
@@ -0,0 +1,64 @@
+import json
+import logging
+import time
+
+from redis import asyncio as redis_asyncio
+
+from app.settings import DRIVE_LISTING_CACHE_MAX_AGE_SECONDS, DRIVE_LISTING_CACHE_URL
+
+logger = logging.getLogger(__name__)
+
+# Stored per user and listing ("folders" or "photos:<folder_id>"):
+#   {"change_token": <Drive changes start token>, "validated_at": <epoch>, "pages": {<page key>: <page payload>}}
+# validated_at drives the short freshness TTL; the key itself expires after DRIVE_LISTING_CACHE_MAX_AGE_SECONDS.
+
+
+class _MemoryListingStore:
+    """Process-local fallback when no cache URL is configured (single-process dev and tests)."""
+
+    def __init__(self):
+        self._items: dict[str, tuple[float, str]] = {}
+
+    async def get(self, key: str) -> str | None:
+        item = self._items.get(key)
+        if not item or item[0] < time.monotonic():
+            self._items.pop(key, None)
+            return None
+        return item[1]
+
+    async def set(self, key: str, value: str, ex: int) -> None:
+        self._items[key] = (time.monotonic() + ex, value)
+
+    async def delete(self, key: str) -> None:
+        self._items.pop(key, None)
+
+
+_store = None
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        _store = redis_asyncio.from_url(DRIVE_LISTING_CACHE_URL) if DRIVE_LISTING_CACHE_URL else _MemoryListingStore()
+    return _store
+
+
+def _key(user_id, listing: str) -> str:
+    return f"drive-listing:{user_id}:{listing}"
+
+
+async def load_listing(user_id, listing: str) -> dict | None:
+    try:
+        raw = await _get_store().get(_key(user_id, listing))
+    except Exception:
+        logger.warning("drive listing cache read failed", exc_info=True)
+        return None
+    return json.loads(raw) if raw else None
+
+
+async def save_listing(user_id, listing: str, entry: dict) -> None:
+    try:
+        await _get_store().set(_key(user_id, listing), json.dumps(entry), ex=DRIVE_LISTING_CACHE_MAX_AGE_SECONDS)
+    except Exception:
+        logger.warning("drive listing cache write failed", exc_info=True)
+
@@ -1,21 +1,53 @@
+import asyncio
 import secrets
+import time
 from datetime import datetime, timedelta, timezone
 from urllib.parse import urlencode
 
-import requests
+import httpx
 from sqlalchemy import text
 
+from app.services.background_jobs import enqueue_style_brief_prewarm
+from app.services.drive_listing_cache import load_listing, save_listing
+from app.services.drive_tokens import drive_tokens
 from app.services.run_service import engine, ensure_user
 from app.settings import (
+    DRIVE_HTTP_MAX_CONNECTIONS,
+    DRIVE_LISTING_CACHE_TTL_SECONDS,
     GOOGLE_CLIENT_ID,
     GOOGLE_CLIENT_SECRET,
+    GOOGLE_DRIVE_API_BASE,
     GOOGLE_DRIVE_SCOPE,
     GOOGLE_OAUTH_REDIRECT_URI,
 )
 
 GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/v2/auth"
 GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
-GOOGLE_DRIVE_API = "https://www.googleapis.com/drive/v3"
+GOOGLE_DRIVE_API = GOOGLE_DRIVE_API_BASE.rstrip("/")
+DRIVE_FOLDER_MIME = "application/vnd.google-apps.folder"
+DRIVE_MAX_PAGE_SIZE = 1000
+DRIVE_CHANGES_MAX_PAGES = 5
+DRIVE_LISTING_MAX_CACHED_PAGES = 50
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    # One pooled client per process: slow Google calls wait on sockets, not on threadpool workers.
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=25,
+            limits=httpx.Limits(max_connections=DRIVE_HTTP_MAX_CONNECTIONS, max_keepalive_connections=100),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
 
 def _utcnow() -> datetime:
@@ -29,15 +61,16 @@ def _require_google_oauth_config() -> None:
         )
 
 
-def _get_user_id_by_email(email: str):
-    with engine.begin() as conn:
-        row = conn.execute(text("SELECT id FROM users WHERE email=:email"), {"email": email}).mappings().first()
+async def _get_user_id_by_email(email: str):
+    async with engine.begin() as conn:
+        result = await conn.execute(text("SELECT id FROM users WHERE email=:email"), {"email": email})
+        row = result.mappings().first()
     return row["id"] if row else None
 
 
-def _fetch_drive_connection(user_id):
-    with engine.begin() as conn:
-        return conn.execute(
+async def _fetch_drive_connection(user_id):
+    async with engine.begin() as conn:
+        result = await conn.execute(
             text(
                 """
                 SELECT user_id, access_token, refresh_token, token_expiry, scope, drive_user_email
@@ -46,7 +79,8 @@ def _fetch_drive_connection(user_id):
                 """
             ),
             {"user_id": user_id},
-        ).mappings().first()
+        )
+        return result.mappings().first()
 
 
 def _token_expiry(expires_in: int | str | None):
@@ -55,7 +89,7 @@ def _token_expiry(expires_in: int | str | None):
     return _utcnow() + timedelta(seconds=max(0, int(expires_in) - 30))
 
 
-def _upsert_drive_connection(
+async def _upsert_drive_connection(
     user_id,
     access_token: str,
     refresh_token: str | None,
@@ -63,8 +97,8 @@ def _upsert_drive_connection(
     scope: str | None,
     drive_user_email: str | None,
 ) -> None:
-    with engine.begin() as conn:
-        conn.execute(
+    async with engine.begin() as conn:
+        await conn.execute(
             text(
                 """
                 INSERT INTO drive_connections (
@@ -95,58 +129,16 @@ def _upsert_drive_connection(
         )
 
 
-def _refresh_access_token(user_id, refresh_token: str):
-    _require_google_oauth_config()
-
-    response = requests.post(
-        GOOGLE_TOKEN_URL,
-        data={
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "grant_type": "refresh_token",
-            "refresh_token": refresh_token,
-        },
-        timeout=20,
-    )
-    if response.status_code >= 400:
-        raise RuntimeError(f"Unable to refresh Drive access token: {response.text[:200]}")
-
-    payload = response.json()
-    access_token = payload.get("access_token")
+async def _ensure_access_token(user_id):
+    # Memory hits return without awaiting; misses go through redis.asyncio, the async engine and httpx.
+    access_token = await drive_tokens.get_token(user_id)
     if not access_token:
-        raise RuntimeError("Token refresh response missing access_token")
-
-    _upsert_drive_connection(
-        user_id=user_id,
-        access_token=access_token,
-        refresh_token=refresh_token,
-        token_expiry=_token_expiry(payload.get("expires_in")),
-        scope=payload.get("scope", GOOGLE_DRIVE_SCOPE),
-        drive_user_email=None,
-    )
-    return access_token
-
-
-def _ensure_access_token(user_id):
-    row = _fetch_drive_connection(user_id)
-    if not row:
         raise RuntimeError("Drive not connected for this user. Complete OAuth first.")
-
-    token_expiry = row.get("token_expiry")
-    if token_expiry and token_expiry > _utcnow() + timedelta(seconds=60):
-        return row["access_token"]
-
-    if row.get("refresh_token"):
-        return _refresh_access_token(user_id, row["refresh_token"])
-
-    if row.get("access_token"):
-        return row["access_token"]
-
-    raise RuntimeError("Drive connection has no usable access token")
+    return access_token
 
 
-def _drive_get(access_token: str, path: str, params: dict | None = None) -> dict:
-    response = requests.get(
+async def _drive_get(access_token: str, path: str, params: dict | None = None) -> dict:
+    response = await _get_http_client().get(
         f"{GOOGLE_DRIVE_API}{path}",
         headers={"Authorization": f"Bearer {access_token}"},
         params=params or {},
@@ -157,13 +149,13 @@ def _drive_get(access_token: str, path: str, params: dict | None = None) -> dict
     return response.json()
 
 
-def create_oauth_start(email: str) -> dict:
+async def create_oauth_start(email: str) -> dict:
     _require_google_oauth_config()
 
-    user_id = ensure_user(email)
+    user_id = await ensure_user(email)
     state = secrets.token_urlsafe(24)
-    with engine.begin() as conn:
-        conn.execute(
+    async with engine.begin() as conn:
+        await conn.execute(
             text("INSERT INTO drive_oauth_states (state, user_id, created_at) VALUES (:state, :user_id, :ts)"),
             {"state": state, "user_id": user_id, "ts": _utcnow()},
         )
@@ -190,11 +182,11 @@ def create_oauth_start(email: str) -> dict:
     }
 
 
-def complete_oauth_callback(state: str, code: str) -> dict:
+async def complete_oauth_callback(state: str, code: str) -> dict:
     _require_google_oauth_config()
 
-    with engine.begin() as conn:
-        state_row = conn.execute(
+    async with engine.begin() as conn:
+        result = await conn.execute(
             text(
                 """
                 SELECT state, user_id, created_at
@@ -203,18 +195,19 @@ def complete_oauth_callback(state: str, code: str) -> dict:
                 """
             ),
             {"state": state},
-        ).mappings().first()
+        )
+        state_row = result.mappings().first()
 
     if not state_row:
         raise ValueError("Invalid or expired OAuth state")
 
     state_created = state_row["created_at"]
     if state_created < _utcnow() - timedelta(minutes=20):
-        with engine.begin() as conn:
-            conn.execute(text("DELETE FROM drive_oauth_states WHERE state=:state"), {"state": state})
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM drive_oauth_states WHERE state=:state"), {"state": state})
         raise ValueError("OAuth state expired. Start OAuth again.")
 
-    token_response = requests.post(
+    token_response = await _get_http_client().post(
         GOOGLE_TOKEN_URL,
         data={
             "code": code,
@@ -235,7 +228,7 @@ def complete_oauth_callback(state: str, code: str) -> dict:
 
     drive_user_email = None
     try:
-        about = _drive_get(
+        about = await _drive_get(
             access_token,
             "/about",
             params={"fields": "user(emailAddress,displayName)"},
@@ -244,17 +237,19 @@ def complete_oauth_callback(state: str, code: str) -> dict:
     except Exception:
         drive_user_email = None
 
-    _upsert_drive_connection(
+    token_expiry = _token_expiry(token_data.get("expires_in"))
+    await _upsert_drive_connection(
         user_id=state_row["user_id"],
         access_token=access_token,
         refresh_token=token_data.get("refresh_token"),
-        token_expiry=_token_expiry(token_data.get("expires_in")),
+        token_expiry=token_expiry,
         scope=token_data.get("scope", GOOGLE_DRIVE_SCOPE),
         drive_user_email=drive_user_email,
     )
+    await drive_tokens.prime(state_row["user_id"], access_token, token_expiry)
 
-    with engine.begin() as conn:
-        conn.execute(text("DELETE FROM drive_oauth_states WHERE state=:state"), {"state": state})
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM drive_oauth_states WHERE state=:state"), {"state": state})
 
     return {
         "status": "connected",
@@ -263,14 +258,14 @@ def complete_oauth_callback(state: str, code: str) -> dict:
     }
 
 
-def get_drive_status(email: str) -> dict:
-    user_id = _get_user_id_by_email(email)
+async def get_drive_status(email: str) -> dict:
+    user_id = await _get_user_id_by_email(email)
     if not user_id:
         return {"connected": False, "selected_folder": None}
 
-    conn_row = _fetch_drive_connection(user_id)
-    with engine.begin() as conn:
-        folder = conn.execute(
+    conn_row = await _fetch_drive_connection(user_id)
+    async with engine.begin() as conn:
+        result = await conn.execute(
             text(
                 """
                 SELECT folder_id, folder_name, created_at
@@ -281,7 +276,8 @@ def get_drive_status(email: str) -> dict:
                 """
             ),
             {"user_id": user_id},
-        ).mappings().first()
+        )
+        folder = result.mappings().first()
 
     return {
         "connected": conn_row is not None,
@@ -290,53 +286,136 @@ def get_drive_status(email: str) -> dict:
     }
 
 
-def list_drive_folders(email: str) -> dict:
-    user_id = _get_user_id_by_email(email)
+async def _drive_start_page_token(access_token: str) -> str:
+    payload = await _drive_get(access_token, "/changes/startPageToken", params={"supportsAllDrives": "true"})
+    return payload["startPageToken"]
+
+
+async def _drive_changed_since(access_token: str, change_token: str, is_relevant) -> tuple[bool, str | None]:
+    """Scan the Drive changes feed from ``change_token``; returns (changed, new start token when unchanged)."""
+    page_token = change_token
+    for _ in range(DRIVE_CHANGES_MAX_PAGES):
+        payload = await _drive_get(
+            access_token,
+            "/changes",
+            params={
+                "pageToken": page_token,
+                "pageSize": 1000,
+                "spaces": "drive",
+                "fields": "nextPageToken,newStartPageToken,changes(fileId,removed,file(mimeType,parents,trashed))",
+                "includeItemsFromAllDrives": "true",
+                "supportsAllDrives": "true",
+            },
+        )
+        if any(is_relevant(change) for change in payload.get("changes", [])):
+            return True, None
+        if payload.get("newStartPageToken"):
+            return False, payload["newStartPageToken"]
+        page_token = payload.get("nextPageToken")
+        if not page_token:
+            break
+    return True, None
+
+
+async def _cached_drive_page(user_id, access_token: str, listing: str, params: dict, is_relevant) -> tuple[dict, str]:
+    """Serve one files.list page from the per-user listing cache, revalidating through the changes feed.
+
+    Fresh entries (younger than DRIVE_LISTING_CACHE_TTL_SECONDS) are served as-is; stale ones are kept when the
+    changes feed shows nothing relevant to the listing since they were built, and dropped otherwise.
+    """
+    page_key = f"{params['pageSize']}:{params.get('pageToken') or ''}"
+    entry = await load_listing(user_id, listing)
+    status = "hit"
+    if entry and time.time() - entry["validated_at"] >= DRIVE_LISTING_CACHE_TTL_SECONDS:
+        changed, new_token = await _drive_changed_since(access_token, entry["change_token"], is_relevant)
+        if changed:
+            entry = None
+        else:
+            entry.update(change_token=new_token, validated_at=time.time())
+            status = "revalidated"
+
+    if entry and page_key in entry["pages"]:
+        if status == "revalidated":
+            await save_listing(user_id, listing, entry)
+        return entry["pages"][page_key], status
+
+    if entry is None:
+        entry = {"change_token": await _drive_start_page_token(access_token), "validated_at": time.time(), "pages": {}}
+    page = await _drive_get(access_token, "/files", params=params)
+    entry["pages"][page_key] = page
+    while len(entry["pages"]) > DRIVE_LISTING_MAX_CACHED_PAGES:
+        entry["pages"].pop(next(iter(entry["pages"])))
+    await save_listing(user_id, listing, entry)
+    return page, "miss"
+
+
+def _is_folder_change(change: dict) -> bool:
+    file = change.get("file") or {}
+    return bool(change.get("removed")) or not file or file.get("mimeType") == DRIVE_FOLDER_MIME
+
+
+def _photo_change_filter(folder_id: str):
+    def is_relevant(change: dict) -> bool:
+        file = change.get("file") or {}
+        if change.get("removed") or not file:
+            return True
+        # Images moved out of the folder no longer list it as a parent, so any image change counts.
+        return folder_id in (file.get("parents") or []) or str(file.get("mimeType", "")).startswith("image/")
+
+    return is_relevant
+
+
+async def list_drive_folders(email: str, page_size: int = 200, page_token: str | None = None) -> dict:
+    user_id = await _get_user_id_by_email(email)
     if not user_id:
         raise ValueError("Unknown user email")
 
-    access_token = _ensure_access_token(user_id)
-    payload = _drive_get(
-        access_token,
-        "/files",
-        params={
-            "q": "mimeType='application/vnd.google-apps.folder' and trashed=false",
-            "fields": "files(id,name),nextPageToken",
-            "pageSize": 200,
-            "orderBy": "name_natural",
-            "includeItemsFromAllDrives": "true",
-            "supportsAllDrives": "true",
-        },
-    )
+    access_token = await _ensure_access_token(user_id)
+    params = {
+        "q": f"mimeType='{DRIVE_FOLDER_MIME}' and trashed=false",
+        "fields": "files(id,name),nextPageToken",
+        "pageSize": max(1, min(page_size, DRIVE_MAX_PAGE_SIZE)),
+        "orderBy": "name_natural",
+        "includeItemsFromAllDrives": "true",
+        "supportsAllDrives": "true",
+    }
+    if page_token:
+        params["pageToken"] = page_token
+    payload, cache_status = await _cached_drive_page(user_id, access_token, "folders", params, _is_folder_change)
 
     folders = payload.get("files", [])
-    return {"count": len(folders), "folders": folders}
+    return {
+        "count": len(folders),
+        "folders": folders,
+        "next_page_token": payload.get("nextPageToken"),
+        "cache": cache_status,
+    }
 
 
-def select_drive_folder(email: str, folder_id: str, folder_name: str | None) -> dict:
-    user_id = _get_user_id_by_email(email)
+async def select_drive_folder(email: str, folder_id: str, folder_name: str | None) -> dict:
+    user_id = await _get_user_id_by_email(email)
     if not user_id:
         raise ValueError("Unknown user email")
 
-    access_token = _ensure_access_token(user_id)
+    access_token = await _ensure_access_token(user_id)
 
     resolved_name = folder_name
     if not resolved_name:
-        metadata = _drive_get(
+        metadata = await _drive_get(
             access_token,
             f"/files/{folder_id}",
             params={"fields": "id,name,mimeType", "supportsAllDrives": "true"},
         )
-        if metadata.get("mimeType") != "application/vnd.google-apps.folder":
+        if metadata.get("mimeType") != DRIVE_FOLDER_MIME:
             raise ValueError("Provided file is not a Drive folder")
         resolved_name = metadata.get("name")
 
-    with engine.begin() as conn:
-        conn.execute(
+    async with engine.begin() as conn:
+        await conn.execute(
             text("UPDATE drive_folders SET is_selected=FALSE WHERE user_id=:user_id"),
             {"user_id": user_id},
         )
-        conn.execute(
+        await conn.execute(
             text(
                 """
                 INSERT INTO drive_folders (user_id, folder_id, folder_name, is_selected, created_at)
@@ -355,20 +434,23 @@ def select_drive_folder(email: str, folder_id: str, folder_name: str | None) ->
             },
         )
 
+    prewarm_queued = await asyncio.to_thread(enqueue_style_brief_prewarm, user_id)
+
     return {
         "status": "selected",
         "folder_id": folder_id,
         "folder_name": resolved_name,
+        "style_brief_prewarm": "queued" if prewarm_queued else "unavailable",
     }
 
 
-def list_selected_folder_photos(email: str, limit: int = 30) -> dict:
-    user_id = _get_user_id_by_email(email)
+async def list_selected_folder_photos(email: str, limit: int = 30, page_token: str | None = None) -> dict:
+    user_id = await _get_user_id_by_email(email)
     if not user_id:
         raise ValueError("Unknown user email")
 
-    with engine.begin() as conn:
-        folder = conn.execute(
+    async with engine.begin() as conn:
+        result = await conn.execute(
             text(
                 """
                 SELECT folder_id, folder_name
@@ -379,23 +461,28 @@ def list_selected_folder_photos(email: str, limit: int = 30) -> dict:
                 """
             ),
             {"user_id": user_id},
-        ).mappings().first()
+        )
+        folder = result.mappings().first()
 
     if not folder:
         raise ValueError("No selected Drive folder. Call /api/drive/folder/select first.")
 
-    access_token = _ensure_access_token(user_id)
-    payload = _drive_get(
-        access_token,
-        "/files",
-        params={
-            "q": f"'{folder['folder_id']}' in parents and mimeType contains 'image/' and trashed=false",
-            "fields": "files(id,name,mimeType,createdTime,webViewLink,thumbnailLink,imageMediaMetadata(width,height,time))",
-            "orderBy": "createdTime desc",
-            "pageSize": max(1, min(limit, 200)),
-            "includeItemsFromAllDrives": "true",
-            "supportsAllDrives": "true",
-        },
+    access_token = await _ensure_access_token(user_id)
+    params = {
+        "q": f"'{folder['folder_id']}' in parents and mimeType contains 'image/' and trashed=false",
+        "fields": (
+            "nextPageToken,"
+            "files(id,name,mimeType,createdTime,webViewLink,thumbnailLink,imageMediaMetadata(width,height,time))"
+        ),
+        "orderBy": "createdTime desc",
+        "pageSize": max(1, min(limit, DRIVE_MAX_PAGE_SIZE)),
+        "includeItemsFromAllDrives": "true",
+        "supportsAllDrives": "true",
+    }
+    if page_token:
+        params["pageToken"] = page_token
+    payload, cache_status = await _cached_drive_page(
+        user_id, access_token, f"photos:{folder['folder_id']}", params, _photo_change_filter(folder["folder_id"])
     )
 
     photos = payload.get("files", [])
@@ -403,4 +490,6 @@ def list_selected_folder_photos(email: str, limit: int = 30) -> dict:
         "folder": {"id": folder["folder_id"], "name": folder["folder_name"]},
         "count": len(photos),
         "photos": photos,
+        "next_page_token": payload.get("nextPageToken"),
+        "cache": cache_status,
     }
@@ -0,0 +1,17 @@
+from personal_stylist_common.drive_tokens import AsyncDriveTokenManager
+
+from app.services.run_service import engine
+from app.settings import (
+    DRIVE_TOKEN_CACHE_URL,
+    DRIVE_TOKEN_REFRESH_AHEAD_SECONDS,
+    GOOGLE_CLIENT_ID,
+    GOOGLE_CLIENT_SECRET,
+)
+
+drive_tokens = AsyncDriveTokenManager(
+    engine,
+    GOOGLE_CLIENT_ID,
+    GOOGLE_CLIENT_SECRET,
+    redis_url=DRIVE_TOKEN_CACHE_URL,
+    refresh_ahead_seconds=DRIVE_TOKEN_REFRESH_AHEAD_SECONDS,
+)
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+import psycopg
+
+from app.settings import DATABASE_URL, RUN_EVENTS_HEARTBEAT_SECONDS, RUN_EVENTS_LISTEN_TIMEOUT_SECONDS
+
+RUN_EVENTS_CHANNEL = "run_events"
+TERMINAL_RUN_STATUSES = {"SUCCEEDED", "FAILED", "CANCELED"}
+
+logger = logging.getLogger(__name__)
+
+
+def _libpq_url(url: str) -> str:
+    return url.replace("postgresql+psycopg://", "postgresql://", 1)
+
+
+class RunEventHub:
+    """Fan run_events notifications out to in-process subscribers.
+
+    One LISTEN connection per API process serves every watcher of every run; it is opened on the first
+    subscription and reconnects with backoff if Postgres goes away. Notifications sent while it is not listening
+    are lost, so subscribe() waits until LISTEN is live, and after a reconnect every watcher gets a ``resync``
+    event telling it to reload the run's snapshot.
+    """
+
+    def __init__(self, dsn: str, channel: str = RUN_EVENTS_CHANNEL):
+        self._dsn = dsn
+        self._channel = channel
+        self._lock = threading.Lock()
+        self._subscribers: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._thread: threading.Thread | None = None
+        self._listening = threading.Event()
+
+    async def subscribe(self, run_id: str) -> asyncio.Queue:
+        """Register a watcher once LISTEN is live; take the run's snapshot only after this returns."""
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(run_id, set()).add((asyncio.get_running_loop(), queue))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen_forever, name="run-events", daemon=True)
+                self._thread.start()
+        if not self._listening.is_set():
+            # Past the timeout the stream still works: its keepalive tick re-reads the run until it is terminal.
+            await asyncio.to_thread(self._listening.wait, RUN_EVENTS_LISTEN_TIMEOUT_SECONDS)
+        return queue
+
+    def unsubscribe(self, run_id: str, queue: asyncio.Queue) -> None:
+        with self._lock:
+            watchers = self._subscribers.get(run_id)
+            if not watchers:
+                return
+            watchers.difference_update({item for item in watchers if item[1] is queue})
+            if not watchers:
+                del self._subscribers[run_id]
+
+    def watcher_count(self, run_id: str) -> int:
+        with self._lock:
+            return len(self._subscribers.get(run_id, ()))
+
+    def dispatch(self, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except json.JSONDecodeError:
+            return
+        run_id = str(event.get("run_id") or "")
+        with self._lock:
+            watchers = list(self._subscribers.get(run_id, ()))
+        for loop, queue in watchers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def _on_listening(self, reconnected: bool) -> None:
+        self._listening.set()
+        if not reconnected:
+            return
+        with self._lock:
+            watchers = [(run_id, item) for run_id, items in self._subscribers.items() for item in items]
+        for run_id, (loop, queue) in watchers:
+            loop.call_soon_threadsafe(queue.put_nowait, {"type": "resync", "run_id": run_id})
+
+    def _listen_forever(self) -> None:
+        backoff = 1.0
+        connected_before = False
+        while True:
+            try:
+                with psycopg.connect(self._dsn, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {self._channel}")
+                    backoff = 1.0
+                    self._on_listening(reconnected=connected_before)
+                    connected_before = True
+                    for notify in conn.notifies():
+                        self.dispatch(notify.payload)
+            except Exception:
+                self._listening.clear()
+                logger.exception("run events listener failed; reconnecting in %.0fs", backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+
+run_event_hub = RunEventHub(_libpq_url(DATABASE_URL))
+
+
+def format_sse(event: dict, event_type: str | None = None) -> str:
+    return f"event: {event_type or event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def run_event_stream(
+    run_id: str,
+    queue: asyncio.Queue,
+    snapshot: dict,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    load_snapshot: Callable[[str], Awaitable[dict | None]],
+) -> AsyncIterator[str]:
+    """Yield a snapshot, then live events until the run finishes or the client goes away.
+
+    Events can be missed while the hub reconnects, so a ``resync`` (and every keepalive tick) reloads the snapshot;
+    a fresh snapshot is sent on resync, and the stream ends as soon as the reloaded run is terminal.
+    """
+    try:
+        yield format_sse({"run_id": run_id, **snapshot}, "snapshot")
+        if snapshot.get("status") in TERMINAL_RUN_STATUSES:
+            return
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=RUN_EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                snapshot = await load_snapshot(run_id)
+                if snapshot is None:
+                    return
+                if snapshot.get("status") in TERMINAL_RUN_STATUSES:
+                    yield format_sse({"run_id": run_id, **snapshot}, "snapshot")
+                    return
+                yield ": keepalive\n\n"
+                continue
+            if event.get("type") == "resync":
+                snapshot = await load_snapshot(run_id)
+                if snapshot is None:
+                    return
+                yield format_sse({"run_id": run_id, **snapshot}, "snapshot")
+                if snapshot.get("status") in TERMINAL_RUN_STATUSES:
+                    return
+                continue
+            yield format_sse(event)
+            if event.get("type") == "run" and event.get("status") in TERMINAL_RUN_STATUSES:
+                return
+    finally:
+        run_event_hub.unsubscribe(run_id, queue)
@@ -1,9 +1,16 @@
+import asyncio
+import uuid
 from collections.abc import Sequence
-from sqlalchemy import create_engine, text
+from datetime import datetime, timedelta, timezone
 
-from app.settings import DATABASE_URL
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+from app.services.artifact_projection import project_payload, projection_sql
+from app.services.artifact_storage import resolve_artifact
+from app.settings import DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_SIZE, RUNS_COALESCE_MAX_AGE_SECONDS
+
+engine = create_async_engine(DATABASE_URL, pool_pre_ping=True, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
 
 LOCKED_STEPS: Sequence[tuple[str, str]] = [
     ("STYLE_BRIEF", "stylist"),
@@ -15,9 +22,9 @@ LOCKED_STEPS: Sequence[tuple[str, str]] = [
 ]
 
 
-def ensure_user(email: str):
-    with engine.begin() as conn:
-        row = conn.execute(
+async def ensure_user(email: str):
+    async with engine.begin() as conn:
+        result = await conn.execute(
             text(
                 """
                 INSERT INTO users (email)
@@ -28,84 +35,482 @@ def ensure_user(email: str):
                 """
             ),
             {"email": email},
-        ).mappings().first()
+        )
+        row = result.mappings().first()
     return row["id"]
 
 
-def create_run(email: str, trigger: str = "manual") -> str:
-    user_id = ensure_user(email)
+async def _insert_locked_steps(conn, run_ids: Sequence[uuid.UUID]) -> None:
+    await conn.execute(
+        text(
+            """
+            INSERT INTO run_steps (run_id, step_index, step_key, agent_key, status)
+            SELECT r.run_id, s.step_index, s.step_key, s.agent_key, 'PENDING'
+            FROM unnest(CAST(:run_ids AS UUID[])) AS r(run_id)
+            CROSS JOIN unnest(
+              CAST(:step_indexes AS INT[]), CAST(:step_keys AS TEXT[]), CAST(:agent_keys AS TEXT[])
+            ) AS s(step_index, step_key, agent_key)
+            """
+        ),
+        {
+            "run_ids": list(run_ids),
+            "step_indexes": list(range(len(LOCKED_STEPS))),
+            "step_keys": [step_key for step_key, _ in LOCKED_STEPS],
+            "agent_keys": [agent_key for _, agent_key in LOCKED_STEPS],
+        },
+    )
+
+
+async def create_runs(emails: Sequence[str], trigger: str = "manual") -> list[str]:
+    """Create one run (with its locked steps) per email in three statements, whatever the batch size.
+
+    Run ids are generated here so the result lines up with ``emails``; repeated emails share a user but
+    each still gets its own run.
+    """
+    if not emails:
+        return []
+
+    unique_emails = list(dict.fromkeys(emails))
+    run_ids = [uuid.uuid4() for _ in emails]
+
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            text(
+                """
+                INSERT INTO users (email)
+                SELECT email FROM unnest(CAST(:emails AS TEXT[])) AS e(email)
+                ON CONFLICT (email)
+                DO UPDATE SET email = EXCLUDED.email
+                RETURNING id, email
+                """
+            ),
+            {"emails": unique_emails},
+        )
+        user_rows = result.mappings().all()
+        user_ids = {row["email"]: row["id"] for row in user_rows}
+
+        await conn.execute(
+            text(
+                """
+                INSERT INTO runs (id, user_id, trigger, status)
+                SELECT run_id, user_id, :trigger, 'RUNNING'
+                FROM unnest(CAST(:run_ids AS UUID[]), CAST(:user_ids AS UUID[])) AS r(run_id, user_id)
+                """
+            ),
+            {"run_ids": run_ids, "user_ids": [user_ids[email] for email in emails], "trigger": trigger},
+        )
+
+        await _insert_locked_steps(conn, run_ids)
+
+    return [str(run_id) for run_id in run_ids]
+
+
+async def create_run(email: str, trigger: str = "manual") -> str:
+    return (await create_runs([email], trigger=trigger))[0]
 
-    with engine.begin() as conn:
-        run_row = conn.execute(
+
+def _user_lock_key(user_id) -> int:
+    """Advisory lock id for one user's run creation (a signed 64-bit slice of the user id)."""
+    return int.from_bytes(uuid.UUID(str(user_id)).bytes[:8], "big", signed=True)
+
+
+async def create_run_once(
+    email: str, trigger: str = "manual", idempotency_key: str | None = None, coalesce: bool = False
+) -> tuple[str, bool]:
+    """Create a run unless an equivalent request already has one; returns ``(run_id, created)``.
+
+    A repeated ``idempotency_key`` returns the run it was first answered with, whatever that run's status. With
+    ``coalesce``, a RUNNING top-level run with the same inputs (trigger and the Drive folder selected when it was
+    created) that started within RUNS_COALESCE_MAX_AGE_SECONDS is returned instead of a new one. Requests for one
+    user are serialized by a transaction-scoped advisory lock.
+    """
+    async with engine.begin() as conn:
+        result = await conn.execute(
             text(
                 """
-                INSERT INTO runs (user_id, trigger, status)
-                VALUES (:uid, :trigger, 'RUNNING')
+                INSERT INTO users (email)
+                VALUES (:email)
+                ON CONFLICT (email)
+                DO UPDATE SET email = EXCLUDED.email
                 RETURNING id
                 """
             ),
-            {"uid": user_id, "trigger": trigger},
-        ).mappings().first()
-        run_id = run_row["id"]
+            {"email": email},
+        )
+        user_id = result.mappings().first()["id"]
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:lock_key)"), {"lock_key": _user_lock_key(user_id)})
+
+        result = await conn.execute(
+            text(
+                """
+                WITH selected AS (
+                  SELECT folder_id FROM drive_folders
+                  WHERE user_id = :user_id AND is_selected = TRUE
+                  ORDER BY created_at DESC
+                  LIMIT 1
+                )
+                SELECT
+                  (
+                    SELECT k.run_id FROM run_request_keys k
+                    WHERE k.user_id = :user_id AND k.idempotency_key = CAST(:idempotency_key AS TEXT)
+                  ) AS keyed_run_id,
+                  (SELECT folder_id FROM selected) AS folder_id,
+                  (
+                    SELECT r.id FROM runs r
+                    WHERE CAST(:coalesce AS BOOLEAN)
+                      AND r.user_id = :user_id AND r.status = 'RUNNING' AND r.parent_run_id IS NULL
+                      AND r.trigger = :trigger
+                      AND r.folder_id IS NOT DISTINCT FROM (SELECT folder_id FROM selected)
+                      AND r.created_at > :min_created_at
+                    ORDER BY r.created_at DESC
+                    LIMIT 1
+                  ) AS running_run_id
+                """
+            ),
+            {
+                "user_id": user_id,
+                "idempotency_key": idempotency_key,
+                "coalesce": coalesce,
+                "trigger": trigger,
+                "min_created_at": datetime.now(timezone.utc) - timedelta(seconds=RUNS_COALESCE_MAX_AGE_SECONDS),
+            },
+        )
+        existing = result.mappings().first()
+        if existing["keyed_run_id"] is not None:
+            return str(existing["keyed_run_id"]), False
 
-        for idx, (step_key, agent_key) in enumerate(LOCKED_STEPS):
-            conn.execute(
+        run_id = existing["running_run_id"]
+        created = run_id is None
+        if created:
+            run_id = uuid.uuid4()
+            await conn.execute(
                 text(
                     """
-                    INSERT INTO run_steps (run_id, step_index, step_key, agent_key, status)
-                    VALUES (:run_id, :step_index, :step_key, :agent_key, 'PENDING')
+                    INSERT INTO runs (id, user_id, trigger, status, folder_id)
+                    VALUES (:run_id, :user_id, :trigger, 'RUNNING', :folder_id)
                     """
                 ),
-                {
-                    "run_id": run_id,
-                    "step_index": idx,
-                    "step_key": step_key,
-                    "agent_key": agent_key,
-                },
+                {"run_id": run_id, "user_id": user_id, "trigger": trigger, "folder_id": existing["folder_id"]},
             )
+            await _insert_locked_steps(conn, [run_id])
 
-    return str(run_id)
+        if idempotency_key is not None:
+            await conn.execute(
+                text(
+                    """
+                    INSERT INTO run_request_keys (user_id, idempotency_key, run_id)
+                    VALUES (:user_id, :idempotency_key, :run_id)
+                    """
+                ),
+                {"user_id": user_id, "idempotency_key": idempotency_key, "run_id": run_id},
+            )
+
+    return str(run_id), created
 
 
-def get_run(run_id: str) -> dict:
-    with engine.begin() as conn:
-        run = conn.execute(
+async def cancel_run(run_id: str) -> dict | None:
+    """Mark a RUNNING run and its unfinished steps CANCELED; returns None for an unknown run.
+
+    ``task_ids`` lists the Celery tasks of steps that were QUEUED or RUNNING, for the caller to revoke. A run that
+    already finished is returned unchanged with ``canceled`` False.
+    """
+    async with engine.begin() as conn:
+        result = await conn.execute(
             text(
                 """
-                SELECT id, user_id, trigger, status, created_at, finished_at
-                FROM runs
-                WHERE id = :run_id
+                WITH run AS (
+                  SELECT id, status FROM runs WHERE id = :run_id FOR UPDATE
+                ),
+                canceled_run AS (
+                  UPDATE runs r SET status = 'CANCELED', finished_at = now()
+                  FROM run
+                  WHERE r.id = run.id AND run.status = 'RUNNING'
+                  RETURNING r.id
+                ),
+                canceled_steps AS (
+                  UPDATE run_steps s SET status = 'CANCELED', finished_at = now(), error = 'canceled'
+                  FROM canceled_run
+                  WHERE s.run_id = canceled_run.id AND s.status IN ('PENDING', 'QUEUED', 'RUNNING')
+                  RETURNING s.step_key, s.task_id
+                )
+                SELECT
+                  run.status AS previous_status,
+                  EXISTS (SELECT 1 FROM canceled_run) AS canceled,
+                  COALESCE((SELECT array_agg(step_key) FROM canceled_steps), '{}') AS step_keys,
+                  COALESCE((SELECT array_agg(task_id) FROM canceled_steps WHERE task_id IS NOT NULL), '{}') AS task_ids
+                FROM run
                 """
             ),
             {"run_id": run_id},
-        ).mappings().first()
+        )
+        row = result.mappings().first()
+    if row is None:
+        return None
+    return {
+        "run_id": run_id,
+        "status": "CANCELED" if row["canceled"] else row["previous_status"],
+        "canceled": row["canceled"],
+        "canceled_steps": list(row["step_keys"]),
+        "task_ids": list(row["task_ids"]),
+    }
+
+
+class RerunUnavailable(Exception):
+    """The source run has not finished every step before the requested rerun point."""
+
 
-        steps = conn.execute(
+async def create_rerun(run_id: str, from_step: str) -> str | None:
+    """Create a run that starts at ``from_step``, reusing the artifacts of ``run_id`` for every earlier step.
+
+    Earlier steps are inserted as SUCCEEDED and their artifacts point at the parent's payloads (blob refcounts are
+    bumped in the same transaction), so the orchestrator queues ``from_step`` first. Returns None for an unknown run.
+    """
+    step_keys = [step_key for step_key, _ in LOCKED_STEPS]
+    if from_step not in step_keys:
+        raise ValueError(f"Unknown step {from_step!r}; expected one of {', '.join(step_keys)}")
+    from_index = step_keys.index(from_step)
+    reused_kinds = [step_key.lower() for step_key in step_keys[:from_index]]
+    new_run_id = uuid.uuid4()
+
+    async with engine.begin() as conn:
+        result = await conn.execute(
             text(
                 """
-                SELECT step_index, step_key, agent_key, status, attempt, started_at, finished_at, error
-                FROM run_steps
-                WHERE run_id = :run_id
-                ORDER BY step_index ASC
+                SELECT
+                  r.user_id,
+                  COALESCE(
+                    (SELECT array_agg(s.step_key) FROM run_steps s WHERE s.run_id = r.id AND s.status = 'SUCCEEDED'),
+                    '{}'
+                  ) AS succeeded_steps,
+                  COALESCE((SELECT array_agg(DISTINCT a.kind) FROM artifacts a WHERE a.run_id = r.id), '{}') AS kinds
+                FROM runs r
+                WHERE r.id = :run_id
+                FOR SHARE OF r
                 """
             ),
             {"run_id": run_id},
-        ).mappings().all()
+        )
+        parent = result.mappings().first()
+        if parent is None:
+            return None
+        missing = [
+            step_key
+            for step_key in step_keys[:from_index]
+            if step_key not in parent["succeeded_steps"] or step_key.lower() not in parent["kinds"]
+        ]
+        if missing:
+            raise RerunUnavailable(f"Run {run_id} has no succeeded artifact for {', '.join(missing)}")
+
+        await conn.execute(
+            text(
+                """
+                INSERT INTO runs (id, user_id, trigger, status, parent_run_id, rerun_from)
+                VALUES (:new_run_id, :user_id, 'rerun', 'RUNNING', :run_id, :from_step)
+                """
+            ),
+            {"new_run_id": new_run_id, "user_id": parent["user_id"], "run_id": run_id, "from_step": from_step},
+        )
 
-        artifacts = conn.execute(
+        await conn.execute(
             text(
                 """
-                SELECT kind, inline_json, created_at
-                FROM artifacts
-                WHERE run_id = :run_id
-                ORDER BY created_at ASC
+                INSERT INTO run_steps (run_id, step_index, step_key, agent_key, status, finished_at)
+                SELECT
+                  :new_run_id, s.step_index, s.step_key, s.agent_key,
+                  CASE WHEN s.step_index < :from_index THEN 'SUCCEEDED' ELSE 'PENDING' END,
+                  CASE WHEN s.step_index < :from_index THEN now() END
+                FROM unnest(
+                  CAST(:step_indexes AS INT[]), CAST(:step_keys AS TEXT[]), CAST(:agent_keys AS TEXT[])
+                ) AS s(step_index, step_key, agent_key)
                 """
             ),
+            {
+                "new_run_id": new_run_id,
+                "from_index": from_index,
+                "step_indexes": list(range(len(LOCKED_STEPS))),
+                "step_keys": step_keys,
+                "agent_keys": [agent_key for _, agent_key in LOCKED_STEPS],
+            },
+        )
+
+        if reused_kinds:
+            # Latest artifact per reused kind. Blob-backed ones share the parent's blob; older rows are copied as is.
+            await conn.execute(
+                text(
+                    """
+                    WITH source AS (
+                      SELECT DISTINCT ON (a.kind)
+                        a.kind, a.user_id, a.mime_type, a.storage_backend, a.storage_key, a.inline_json, a.blob_hash
+                      FROM artifacts a
+                      WHERE a.run_id = :run_id AND a.kind = ANY(CAST(:kinds AS TEXT[]))
+                      ORDER BY a.kind, a.created_at DESC
+                    ),
+                    referenced AS (
+                      UPDATE artifact_blobs b
+                      SET refcount = b.refcount + refs.n, last_referenced_at = now()
+                      FROM (
+                        SELECT blob_hash, count(*) AS n FROM source WHERE blob_hash IS NOT NULL GROUP BY blob_hash
+                      ) refs
+                      WHERE b.content_hash = refs.blob_hash
+                    )
+                    INSERT INTO artifacts (
+                      run_id, run_step_id, user_id, kind, mime_type,
+                      storage_backend, storage_key, inline_json, blob_hash
+                    )
+                    SELECT :new_run_id, s.id, src.user_id, src.kind, src.mime_type, src.storage_backend,
+                           src.storage_key, src.inline_json, src.blob_hash
+                    FROM source src
+                    JOIN run_steps s ON s.run_id = :new_run_id AND lower(s.step_key) = src.kind
+                    """
+                ),
+                {"run_id": run_id, "new_run_id": new_run_id, "kinds": reused_kinds},
+            )
+
+    return str(new_run_id)
+
+
+# Changes whenever the run, any step or the artifact set changes, without reading artifact payloads.
+_RUN_VERSION_SQL = """
+md5(concat_ws(
+  '|',
+  r.status,
+  r.finished_at::text,
+  (SELECT string_agg(s.status || ':' || s.attempt, ',' ORDER BY s.step_index) FROM run_steps s WHERE s.run_id = r.id),
+  (SELECT count(*) || ':' || COALESCE(max(a.created_at)::text, '') FROM artifacts a WHERE a.run_id = r.id)
+))
+"""
+
+
+async def get_run_version(run_id: str) -> str | None:
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            text(f"SELECT {_RUN_VERSION_SQL} AS version FROM runs r WHERE r.id = :run_id"),
             {"run_id": run_id},
-        ).mappings().all()
+        )
+        row = result.mappings().first()
+    return row["version"] if row else None
 
-    return {
-        "run": dict(run) if run else None,
-        "steps": [dict(step) for step in steps],
-        "artifacts": [dict(item) for item in artifacts],
-    }
+
+async def get_run_with_version(
+    run_id: str, kinds: Sequence[str] | None = None, fields: dict | None = None
+) -> tuple[dict, str | None]:
+    """Return the run payload and its version token.
+
+    ``kinds`` limits artifacts to those kinds (an empty list drops them all); ``fields`` is a key tree from
+    ``parse_fields`` applied to each artifact payload inside Postgres, so unrequested data is never read out.
+    """
+    params: dict = {"run_id": run_id, "kinds": list(kinds) if kinds is not None else None}
+    # Artifacts written since content-addressed storage reference a blob; older rows carry their own payload.
+    payload_sql = "COALESCE(b.inline_json, a.inline_json)"
+    inline_json_sql = projection_sql(payload_sql, fields, params) if fields else payload_sql
+
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            text(
+                f"""
+                SELECT
+                  jsonb_build_object(
+                    'id', r.id, 'user_id', r.user_id, 'trigger', r.trigger, 'status', r.status,
+                    'created_at', r.created_at, 'finished_at', r.finished_at,
+                    'parent_run_id', r.parent_run_id, 'rerun_from', r.rerun_from
+                  ) AS run,
+                  COALESCE(
+                    (
+                      SELECT jsonb_agg(
+                        jsonb_build_object(
+                          'step_index', s.step_index, 'step_key', s.step_key, 'agent_key', s.agent_key,
+                          'status', s.status, 'attempt', s.attempt, 'started_at', s.started_at,
+                          'finished_at', s.finished_at, 'error', s.error
+                        )
+                        ORDER BY s.step_index ASC
+                      )
+                      FROM run_steps s
+                      WHERE s.run_id = r.id
+                    ),
+                    '[]'::jsonb
+                  ) AS steps,
+                  COALESCE(
+                    (
+                      SELECT jsonb_agg(
+                        jsonb_build_object(
+                          'kind', a.kind, 'inline_json', {inline_json_sql},
+                          'storage_backend', COALESCE(b.storage_backend, a.storage_backend),
+                          'storage_key', COALESCE(b.storage_key, a.storage_key), 'created_at', a.created_at
+                        )
+                        ORDER BY a.created_at ASC
+                      )
+                      FROM artifacts a
+                      LEFT JOIN artifact_blobs b ON b.content_hash = a.blob_hash
+                      WHERE a.run_id = r.id
+                        AND (CAST(:kinds AS TEXT[]) IS NULL OR a.kind = ANY(CAST(:kinds AS TEXT[])))
+                    ),
+                    '[]'::jsonb
+                  ) AS artifacts,
+                  {_RUN_VERSION_SQL} AS version
+                FROM runs r
+                WHERE r.id = :run_id
+                """
+            ),
+            params,
+        )
+        row = result.mappings().first()
+
+    if not row:
+        return {"run": None, "steps": [], "artifacts": []}, None
+
+    artifacts = []
+    for item in row["artifacts"]:
+        if item.get("inline_json") is not None or not item.get("storage_key"):
+            artifacts.append(resolve_artifact(item))
+            continue
+        # Object-storage reads are blocking; keep them off the event loop.
+        resolved = await asyncio.to_thread(resolve_artifact, item)
+        if fields:
+            resolved["inline_json"] = project_payload(resolved["inline_json"], fields)
+        artifacts.append(resolved)
+
+    return (
+        {
+            "run": row["run"],
+            "steps": row["steps"],
+            "artifacts": artifacts,
+        },
+        row["version"],
+    )
+
+
+async def get_run(run_id: str) -> dict:
+    return (await get_run_with_version(run_id))[0]
+
+
+async def get_run_progress(run_id: str) -> dict | None:
+    """Run and step statuses plus produced artifact kinds, without touching artifact payloads."""
+    async with engine.begin() as conn:
+        result = await conn.execute(
+            text(
+                """
+                SELECT
+                  r.status,
+                  COALESCE(
+                    (
+                      SELECT jsonb_agg(
+                        jsonb_build_object('step_key', s.step_key, 'status', s.status, 'attempt', s.attempt)
+                        ORDER BY s.step_index ASC
+                      )
+                      FROM run_steps s
+                      WHERE s.run_id = r.id
+                    ),
+                    '[]'::jsonb
+                  ) AS steps,
+                  COALESCE(
+                    (SELECT jsonb_agg(DISTINCT a.kind) FROM artifacts a WHERE a.run_id = r.id),
+                    '[]'::jsonb
+                  ) AS artifact_kinds
+                FROM runs r
+                WHERE r.id = :run_id
+                """
+            ),
+            {"run_id": run_id},
+        )
+        row = result.mappings().first()
+    return dict(row) if row else None
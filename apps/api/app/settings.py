@@ -16,3 +16,23 @@ GOOGLE_DRIVE_SCOPE = os.getenv(
     "GOOGLE_DRIVE_SCOPE",
     "https://www.googleapis.com/auth/drive.readonly",
 )
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
+MINIO_BUCKET = os.getenv("MINIO_BUCKET", "stylist-artifacts")
+MINIO_SECURE = os.getenv("MINIO_SECURE", "0") == "1"
+ARTIFACT_FS_ROOT = os.getenv("ARTIFACT_FS_ROOT", "/tmp/stylist-artifacts")
+RUNS_BATCH_MAX = int(os.getenv("RUNS_BATCH_MAX", "5000"))
+RUNS_COALESCE_RUNNING = os.getenv("RUNS_COALESCE_RUNNING", "0") == "1"
+RUNS_COALESCE_MAX_AGE_SECONDS = int(os.getenv("RUNS_COALESCE_MAX_AGE_SECONDS", "900"))
+RUN_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("RUN_EVENTS_HEARTBEAT_SECONDS", "15"))
+RUN_EVENTS_LISTEN_TIMEOUT_SECONDS = float(os.getenv("RUN_EVENTS_LISTEN_TIMEOUT_SECONDS", "5"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+GOOGLE_DRIVE_API_BASE = os.getenv("GOOGLE_DRIVE_API_BASE", "https://www.googleapis.com/drive/v3")
+DRIVE_HTTP_MAX_CONNECTIONS = int(os.getenv("DRIVE_HTTP_MAX_CONNECTIONS", "1000"))
+DRIVE_LISTING_CACHE_URL = os.getenv("DRIVE_LISTING_CACHE_URL", "")
+DRIVE_LISTING_CACHE_TTL_SECONDS = float(os.getenv("DRIVE_LISTING_CACHE_TTL_SECONDS", "30"))
+DRIVE_LISTING_CACHE_MAX_AGE_SECONDS = int(os.getenv("DRIVE_LISTING_CACHE_MAX_AGE_SECONDS", "3600"))
+DRIVE_TOKEN_CACHE_URL = os.getenv("DRIVE_TOKEN_CACHE_URL", "")
+DRIVE_TOKEN_REFRESH_AHEAD_SECONDS = int(os.getenv("DRIVE_TOKEN_REFRESH_AHEAD_SECONDS", "300"))
@@ -0,0 +1,46 @@
+import os
+from pathlib import Path
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "packages" / "common"))
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[3] / "infra" / "postgres" / "init"
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    """run_service against a throwaway schema of TEST_DATABASE_URL (e.g. the compose Postgres).
+
+    Every migration is applied to the schema. Yields a sync engine on the same schema for seeding and assertions.
+    """
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    from app.services import run_service
+
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = create_engine(url)
+    with admin.begin() as conn:
+        conn.exec_driver_sql(f"CREATE SCHEMA {schema}")
+    scoped_url = f"{url}{'&' if '?' in url else '?'}options=-csearch_path%3D{schema},public"
+    db = create_engine(scoped_url)
+    try:
+        with db.begin() as conn:
+            for migration in sorted(MIGRATIONS_DIR.glob("*.sql")):
+                conn.exec_driver_sql(migration.read_text())
+        # Tests drive run_service through asyncio.run, one event loop per call, so connections are not pooled.
+        monkeypatch.setattr(run_service, "engine", create_async_engine(scoped_url, poolclass=NullPool))
+        yield db
+    finally:
+        db.dispose()
+        with admin.begin() as conn:
+            conn.exec_driver_sql(f"DROP SCHEMA {schema} CASCADE")
+        admin.dispose()
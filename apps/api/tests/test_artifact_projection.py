@@ -0,0 +1,35 @@
+import pytest
+
+from app.services.artifact_projection import parse_fields, project_payload, projection_sql
+
+
+def test_parse_fields_builds_tree_and_keeps_whole_ancestors():
+    tree = parse_fields("ranked_items.sku, ranked_items.score,checkout_draft,checkout_draft.items")
+
+    assert tree == {"ranked_items": {"sku": {}, "score": {}}, "checkout_draft": {}}
+
+
+def test_parse_fields_rejects_unsafe_segments():
+    with pytest.raises(ValueError, match="Invalid field path"):
+        parse_fields("ranked_items.sku'); DROP TABLE runs; --")
+
+
+def test_projection_sql_binds_keys_as_parameters():
+    params = {"run_id": "r"}
+
+    sql = projection_sql("a.inline_json", parse_fields("ranked_items.sku"), params)
+
+    assert "ranked_items" not in sql
+    assert sorted(value for key, value in params.items() if key.startswith("pf_")) == ["ranked_items", "sku"]
+    assert "jsonb_array_elements" in sql
+
+
+def test_project_payload_matches_array_and_object_semantics():
+    payload = {
+        "ranked_items": [{"sku": "a", "score": 0.9, "title": "long"}, {"sku": "b"}, "junk"],
+        "checkout_draft": {"items": []},
+    }
+
+    projected = project_payload(payload, parse_fields("ranked_items.sku,ranked_items.score"))
+
+    assert projected == {"ranked_items": [{"sku": "a", "score": 0.9}, {"sku": "b", "score": None}, None]}
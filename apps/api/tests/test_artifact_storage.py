@@ -0,0 +1,31 @@
+import json
+
+import pytest
+import zstandard
+
+from app.services import artifact_storage
+
+
+def test_resolve_artifact_keeps_inline_payload():
+    row = {"kind": "rank", "inline_json": {"ranked_items": []}, "storage_backend": "inline", "storage_key": None}
+
+    assert artifact_storage.resolve_artifact(row) == {"kind": "rank", "inline_json": {"ranked_items": []}}
+
+
+def test_resolve_artifact_reads_compressed_object(monkeypatch, tmp_path):
+    monkeypatch.setattr(artifact_storage.artifact_store, "fs_root", str(tmp_path))
+    payload = {"product_candidates": [{"sku": "zara-dre-1"}]}
+    key = "artifacts/run-1/brand_search-abc.json.zst"
+    (tmp_path / key).parent.mkdir(parents=True)
+    (tmp_path / key).write_bytes(zstandard.ZstdCompressor().compress(json.dumps(payload).encode("utf-8")))
+
+    resolved = artifact_storage.resolve_artifact(
+        {"kind": "brand_search", "inline_json": None, "storage_backend": "filesystem", "storage_key": key}
+    )
+
+    assert resolved == {"kind": "brand_search", "inline_json": payload}
+
+
+def test_load_json_artifact_rejects_unknown_backend():
+    with pytest.raises(ValueError, match="Unsupported"):
+        artifact_storage.load_json_artifact("tape", "artifacts/x")
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services import drive_listing_cache, drive_service
+
+
+class _DriveServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _SlowDriveHandler(BaseHTTPRequestHandler):
+    delay_seconds = 0.3
+
+    def do_GET(self):  # noqa: N802
+        time.sleep(self.delay_seconds)
+        status = 404 if self.path.startswith("/files/missing") else 200
+        body = json.dumps({"files": [{"id": "f-1", "name": "Outfits"}]}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_args):
+        pass
+
+
+@pytest.fixture
+def slow_drive(monkeypatch):
+    server = _DriveServer(("127.0.0.1", 0), _SlowDriveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(drive_service, "GOOGLE_DRIVE_API", f"http://127.0.0.1:{server.server_port}")
+    monkeypatch.setattr(drive_service, "_http_client", None)
+    yield server
+    server.shutdown()
+
+
+def test_slow_drive_calls_overlap_on_one_event_loop(slow_drive):
+    async def scenario():
+        try:
+            started = time.perf_counter()
+            results = await asyncio.gather(*(drive_service._drive_get("token", "/files") for _ in range(50)))
+            return results, time.perf_counter() - started
+        finally:
+            await drive_service.close_http_client()
+
+    results, elapsed = asyncio.run(scenario())
+
+    assert all(result["files"][0]["id"] == "f-1" for result in results)
+    # Serially this would take 15s; overlapping calls finish in a few delays.
+    assert elapsed < 50 * _SlowDriveHandler.delay_seconds / 3
+
+
+def test_drive_errors_surface_as_runtime_error(slow_drive):
+    async def scenario():
+        try:
+            await drive_service._drive_get("token", "/files/missing")
+        finally:
+            await drive_service.close_http_client()
+
+    with pytest.raises(RuntimeError, match="404"):
+        asyncio.run(scenario())
+
+
+def test_folder_listing_is_cached_and_revalidated_through_changes(monkeypatch):
+    calls = []
+    changes = {"changes": [], "newStartPageToken": "t-2"}
+
+    async def fake_drive_get(_token, path, params=None):
+        calls.append(path)
+        if path == "/changes/startPageToken":
+            return {"startPageToken": "t-1"}
+        if path == "/changes":
+            return changes
+        return {"files": [{"id": "f-1", "name": "Outfits"}], "nextPageToken": "page-2"}
+
+    async def fake_user_id(_email):
+        return "user-1"
+
+    async def fake_token(_user_id):
+        return "token"
+
+    monkeypatch.setattr(drive_listing_cache, "_store", drive_listing_cache._MemoryListingStore())
+    monkeypatch.setattr(drive_service, "_get_user_id_by_email", fake_user_id)
+    monkeypatch.setattr(drive_service, "_ensure_access_token", fake_token)
+    monkeypatch.setattr(drive_service, "_drive_get", fake_drive_get)
+
+    def list_folders():
+        return asyncio.run(drive_service.list_drive_folders("a@example.com", page_size=100))
+
+    first = list_folders()
+    assert first["cache"] == "miss"
+    assert first["next_page_token"] == "page-2"
+    assert calls == ["/changes/startPageToken", "/files"]
+
+    assert list_folders()["cache"] == "hit"
+    assert calls == ["/changes/startPageToken", "/files"]
+
+    monkeypatch.setattr(drive_service, "DRIVE_LISTING_CACHE_TTL_SECONDS", 0)
+    assert list_folders()["cache"] == "revalidated"
+    assert calls[-1] == "/changes"
+
+    changes["changes"] = [{"fileId": "f-9", "file": {"mimeType": drive_service.DRIVE_FOLDER_MIME}}]
+    assert list_folders()["cache"] == "miss"
+    assert calls[-3:] == ["/changes", "/changes/startPageToken", "/files"]
+
+
+def test_photo_changes_outside_the_folder_are_ignored():
+    is_relevant = drive_service._photo_change_filter("folder-1")
+
+    assert is_relevant({"fileId": "x", "removed": True})
+    assert is_relevant({"fileId": "x", "file": {"mimeType": "application/pdf", "parents": ["folder-1"]}})
+    assert is_relevant({"fileId": "x", "file": {"mimeType": "image/jpeg", "parents": ["elsewhere"]}})
+    assert not is_relevant({"fileId": "x", "file": {"mimeType": "application/pdf", "parents": ["elsewhere"]}})
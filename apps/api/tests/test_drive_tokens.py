@@ -0,0 +1,74 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from personal_stylist_common.drive_tokens import AsyncDriveTokenManager
+
+
+class _FakeConnection:
+    def __init__(self, engine):
+        self._engine = engine
+
+    async def execute(self, statement, params):
+        sql = str(statement)
+        if "FOR UPDATE" in sql:
+            self._engine.row_locks += 1
+            await asyncio.sleep(0.01)
+            return SimpleNamespace(first=lambda: self._engine.row)
+        access_token, refresh_token, _expiry = self._engine.row
+        self._engine.row = (params["access_token"], refresh_token, params["token_expiry"])
+        return SimpleNamespace(first=lambda: None)
+
+
+class _FakeEngine:
+    def __init__(self, row):
+        self.row = row
+        self.row_locks = 0
+
+    @asynccontextmanager
+    async def begin(self):
+        yield _FakeConnection(self)
+
+
+class _FakeGoogle:
+    def __init__(self):
+        self.posts = []
+
+    async def post(self, _url, data, timeout):
+        self.posts.append(data["refresh_token"])
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(status_code=200, json=lambda: {"access_token": "fresh", "expires_in": 3600})
+
+
+def test_concurrent_misses_refresh_once_and_hits_stay_off_the_database():
+    expired = datetime.now(timezone.utc) - timedelta(minutes=5)
+    engine = _FakeEngine(("stale", "refresh-1", expired))
+    google = _FakeGoogle()
+    manager = AsyncDriveTokenManager(engine, "client", "secret", http_client=google)
+
+    async def scenario():
+        tokens = await asyncio.gather(*(manager.get_token("u-1") for _ in range(20)))
+        hit = await manager.get_token("u-1")
+        return tokens, hit
+
+    tokens, hit = asyncio.run(scenario())
+
+    assert tokens == ["fresh"] * 20
+    assert hit == "fresh"
+    assert google.posts == ["refresh-1"]
+    # The first caller locks the row and refreshes; its waiters are answered from memory.
+    assert engine.row_locks == 1
+    assert engine.row[0] == "fresh"
+
+
+def test_primed_token_is_served_without_a_row_lock():
+    engine = _FakeEngine(None)
+    manager = AsyncDriveTokenManager(engine, "client", "secret", http_client=_FakeGoogle())
+
+    async def scenario():
+        await manager.prime("u-1", "from-callback", datetime.now(timezone.utc) + timedelta(hours=1))
+        return await manager.get_token("u-1")
+
+    assert asyncio.run(scenario()) == "from-callback"
+    assert engine.row_locks == 0
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+
+from app.api import routes_runs
+
+
+def _get_runs(response, **overrides):
+    params = {"artifacts": None, "fields": None, "if_none_match": None, **overrides}
+    return asyncio.run(routes_runs.get_runs("run-1", response, **params))
+
+
+def _stub_run(monkeypatch, version="abc123"):
+    calls = []
+
+    async def fake_version(_run_id):
+        calls.append("version")
+        return version
+
+    async def fake_full(_run_id, kinds=None, fields=None):
+        calls.append("full")
+        return {"run": {"status": "RUNNING"}, "steps": [], "artifacts": []}, version
+
+    monkeypatch.setattr(routes_runs, "get_run_version", fake_version)
+    monkeypatch.setattr(routes_runs, "get_run_with_version", fake_full)
+    return calls
+
+
+def test_get_run_sets_etag(monkeypatch):
+    calls = _stub_run(monkeypatch)
+    response = Response()
+
+    payload = _get_runs(response)
+
+    assert payload["run"]["status"] == "RUNNING"
+    assert response.headers["ETag"] == '"abc123"'
+    assert calls == ["full"]
+
+
+def test_get_run_answers_304_when_version_unchanged(monkeypatch):
+    calls = _stub_run(monkeypatch)
+
+    result = _get_runs(Response(), if_none_match='W/"zzz", "abc123"')
+
+    assert result.status_code == 304
+    assert result.headers["ETag"] == '"abc123"'
+    assert calls == ["version"]
+
+
+def test_get_run_returns_body_when_version_changed(monkeypatch):
+    calls = _stub_run(monkeypatch)
+    response = Response()
+
+    payload = _get_runs(response, if_none_match='"stale"')
+
+    assert payload["steps"] == []
+    assert calls == ["version", "full"]
+
+
+def test_projected_reads_use_their_own_etag(monkeypatch):
+    captured = {}
+
+    async def fake_version(_run_id):
+        return "abc123"
+
+    async def fake_full(_run_id, kinds=None, fields=None):
+        captured.update(kinds=kinds, fields=fields)
+        return {}, "abc123"
+
+    monkeypatch.setattr(routes_runs, "get_run_version", fake_version)
+    monkeypatch.setattr(routes_runs, "get_run_with_version", fake_full)
+    response = Response()
+
+    _get_runs(response, artifacts="rank", fields="ranked_items.sku,ranked_items.score", if_none_match='"abc123"')
+
+    assert captured == {"kinds": ["rank"], "fields": {"ranked_items": {"sku": {}, "score": {}}}}
+    assert response.headers["ETag"].startswith('"abc123-')
+
+
+def test_rerun_maps_service_errors_to_status_codes(monkeypatch):
+    run_id = "7d8f6a4e-2c1b-4d3e-9f0a-1b2c3d4e5f60"
+    outcomes = {"RANK": "new-run", "TRYON": routes_runs.RerunUnavailable("no rank"), "SHIP": ValueError("bad")}
+
+    async def fake_rerun(_run_id, from_step):
+        outcome = outcomes.get(from_step)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(routes_runs, "create_rerun", fake_rerun)
+
+    assert asyncio.run(routes_runs.post_run_rerun(run_id, from_step=" rank ")) == {
+        "run_id": "new-run",
+        "parent_run_id": run_id,
+        "from": "RANK",
+    }
+    cases = ((run_id, "tryon", 409), (run_id, "ship", 400), (run_id, "other", 404), ("x", "rank", 404))
+    for run, step, status in cases:
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(routes_runs.post_run_rerun(run, from_step=step))
+        assert exc_info.value.status_code == status
+
+
+def test_post_runs_passes_idempotency_key_and_validates_it(monkeypatch):
+    calls = []
+
+    async def fake_create(**kwargs):
+        calls.append(kwargs)
+        return "run-1", False
+
+    monkeypatch.setattr(routes_runs, "create_run_once", fake_create)
+    req = routes_runs.CreateRunReq(email="a@example.com")
+
+    assert asyncio.run(routes_runs.post_runs(req, idempotency_key=" k1 ")) == {"run_id": "run-1", "created": False}
+    assert calls[0]["idempotency_key"] == "k1"
+    assert calls[0]["coalesce"] is routes_runs.RUNS_COALESCE_RUNNING
+    for bad in ("  ", "x" * (routes_runs.IDEMPOTENCY_KEY_MAX_LENGTH + 1)):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(routes_runs.post_runs(req, idempotency_key=bad))
+        assert exc_info.value.status_code == 400
+    assert len(calls) == 1
+
+
+def test_cancel_revokes_queued_tasks(monkeypatch):
+    run_id = "7d8f6a4e-2c1b-4d3e-9f0a-1b2c3d4e5f60"
+    revoked = []
+    canceled = {"run_id": run_id, "status": "CANCELED", "canceled": True, "canceled_steps": ["RANK"]}
+    results = {run_id: {**canceled, "task_ids": ["t"]}}
+
+    async def fake_cancel(target):
+        result = results.get(target)
+        return dict(result) if result else None
+
+    monkeypatch.setattr(routes_runs, "cancel_run", fake_cancel)
+    monkeypatch.setattr(routes_runs, "revoke_step_tasks", lambda task_ids: revoked.extend(task_ids) or True)
+
+    payload = asyncio.run(routes_runs.post_run_cancel(run_id))
+
+    assert payload == {**canceled, "revoked": True}
+    assert revoked == ["t"]
+
+    results[run_id] = {**results[run_id], "status": "SUCCEEDED", "canceled": False, "task_ids": []}
+    for target, status in ((run_id, 409), ("7d8f6a4e-2c1b-4d3e-9f0a-000000000000", 404), ("x", 404)):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(routes_runs.post_run_cancel(target))
+        assert exc_info.value.status_code == status
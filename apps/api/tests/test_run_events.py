@@ -0,0 +1,126 @@
+import asyncio
+import json
+import threading
+import time
+
+from app.services import run_events
+
+
+def _hub(monkeypatch):
+    hub = run_events.RunEventHub("postgresql://unused")
+    monkeypatch.setattr(hub, "_listen_forever", lambda: hub._on_listening(reconnected=False))
+    monkeypatch.setattr(run_events, "run_event_hub", hub)
+    return hub
+
+
+async def _no_reload(_run_id):
+    raise AssertionError("a live stream should not reload the snapshot")
+
+
+def test_hub_fans_out_one_notification_to_every_watcher(monkeypatch):
+    hub = _hub(monkeypatch)
+
+    async def scenario():
+        first = await hub.subscribe("run-1")
+        second = await hub.subscribe("run-1")
+        other = await hub.subscribe("run-2")
+        hub.dispatch(json.dumps({"type": "step", "run_id": "run-1", "step_key": "DEALS", "status": "RUNNING"}))
+        await asyncio.sleep(0)
+        assert hub.watcher_count("run-1") == 2
+        assert (await first.get())["step_key"] == "DEALS"
+        assert (await second.get())["status"] == "RUNNING"
+        assert other.empty()
+        hub.unsubscribe("run-1", first)
+        assert hub.watcher_count("run-1") == 1
+
+    asyncio.run(scenario())
+
+
+def test_stream_ends_after_terminal_run_event(monkeypatch):
+    hub = _hub(monkeypatch)
+
+    async def is_disconnected():
+        return False
+
+    async def scenario():
+        queue = await hub.subscribe("run-1")
+        hub.dispatch(json.dumps({"type": "artifact", "run_id": "run-1", "kind": "checkout_draft"}))
+        hub.dispatch(json.dumps({"type": "run", "run_id": "run-1", "status": "SUCCEEDED"}))
+        snapshot = {"status": "RUNNING", "steps": [], "artifact_kinds": []}
+        stream = run_events.run_event_stream("run-1", queue, snapshot, is_disconnected, _no_reload)
+        return [chunk async for chunk in stream]
+
+    chunks = asyncio.run(scenario())
+
+    assert [chunk.split("\n", 1)[0] for chunk in chunks] == ["event: snapshot", "event: artifact", "event: run"]
+    assert hub.watcher_count("run-1") == 0
+
+
+def test_subscribe_waits_until_listen_is_live(monkeypatch):
+    hub = run_events.RunEventHub("postgresql://unused")
+    listened_at = []
+
+    def slow_listen():
+        time.sleep(0.2)
+        listened_at.append(time.monotonic())
+        hub._on_listening(reconnected=False)
+
+    monkeypatch.setattr(hub, "_listen_forever", slow_listen)
+
+    async def scenario():
+        await hub.subscribe("run-1")
+        return time.monotonic()
+
+    subscribed_at = asyncio.run(scenario())
+
+    assert listened_at and subscribed_at >= listened_at[0]
+
+
+def test_reconnect_resyncs_a_stream_whose_terminal_event_was_missed(monkeypatch):
+    hub = _hub(monkeypatch)
+    reloads = []
+
+    async def is_disconnected():
+        return False
+
+    async def load_snapshot(run_id):
+        reloads.append(run_id)
+        return {"status": "SUCCEEDED", "steps": [], "artifact_kinds": ["checkout_draft"]}
+
+    async def scenario():
+        queue = await hub.subscribe("run-1")
+        # The terminal NOTIFY fell into the reconnect gap and is never dispatched; the new connection resyncs.
+        threading.Thread(target=hub._on_listening, kwargs={"reconnected": True}).start()
+        snapshot = {"status": "RUNNING", "steps": [], "artifact_kinds": []}
+        stream = run_events.run_event_stream("run-1", queue, snapshot, is_disconnected, load_snapshot)
+        return [chunk async for chunk in stream]
+
+    chunks = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+    assert [chunk.split("\n", 1)[0] for chunk in chunks] == ["event: snapshot", "event: snapshot"]
+    assert '"SUCCEEDED"' in chunks[-1]
+    assert reloads == ["run-1"]
+    assert hub.watcher_count("run-1") == 0
+
+
+def test_keepalive_tick_closes_the_stream_once_the_run_is_terminal(monkeypatch):
+    hub = _hub(monkeypatch)
+    monkeypatch.setattr(run_events, "RUN_EVENTS_HEARTBEAT_SECONDS", 0.01)
+    statuses = iter(["RUNNING", "CANCELED"])
+
+    async def is_disconnected():
+        return False
+
+    async def load_snapshot(_run_id):
+        return {"status": next(statuses), "steps": [], "artifact_kinds": []}
+
+    async def scenario():
+        queue = await hub.subscribe("run-1")
+        snapshot = {"status": "RUNNING", "steps": [], "artifact_kinds": []}
+        stream = run_events.run_event_stream("run-1", queue, snapshot, is_disconnected, load_snapshot)
+        return [chunk async for chunk in stream]
+
+    chunks = asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+    assert chunks[1:] == [": keepalive\n\n", chunks[-1]]
+    assert chunks[-1].startswith("event: snapshot") and '"CANCELED"' in chunks[-1]
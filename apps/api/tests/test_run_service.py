@@ -0,0 +1,336 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import run_service
+
+
+class _Result:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self._rows
+
+    def first(self):
+        return self._rows[0] if self._rows else None
+
+
+class _FakeEngine:
+    def __init__(self):
+        self.statements = []
+        self.user_ids = {}
+
+    @asynccontextmanager
+    async def begin(self):
+        yield self
+
+    async def execute(self, statement, params):
+        self.statements.append((str(statement), params))
+        if "INSERT INTO users" in str(statement):
+            rows = [{"id": self.user_ids.setdefault(email, uuid.uuid4()), "email": email} for email in params["emails"]]
+            return _Result(rows)
+        return _Result([])
+
+
+def test_create_runs_uses_three_statements_and_keeps_order(monkeypatch):
+    fake = _FakeEngine()
+    monkeypatch.setattr(run_service, "engine", fake)
+    emails = [f"user{idx}@example.com" for idx in range(50)] + ["user0@example.com"]
+
+    run_ids = asyncio.run(run_service.create_runs(emails, trigger="schedule"))
+
+    assert len(fake.statements) == 3
+    users_params, runs_params, steps_params = (params for _, params in fake.statements)
+    assert users_params["emails"] == emails[:50]
+    assert [str(run_id) for run_id in runs_params["run_ids"]] == run_ids
+    assert len(set(run_ids)) == len(emails)
+    assert runs_params["user_ids"][0] == runs_params["user_ids"][-1] == fake.user_ids["user0@example.com"]
+    assert runs_params["trigger"] == "schedule"
+    assert steps_params["step_keys"] == [step_key for step_key, _ in run_service.LOCKED_STEPS]
+
+
+def test_create_run_is_a_batch_of_one(monkeypatch):
+    fake = _FakeEngine()
+    monkeypatch.setattr(run_service, "engine", fake)
+
+    run_id = asyncio.run(run_service.create_run("solo@example.com"))
+
+    assert uuid.UUID(run_id)
+    assert len(fake.statements) == 3
+
+
+class _RunRowEngine(_FakeEngine):
+    def __init__(self, row):
+        super().__init__()
+        self.row = row
+
+    async def execute(self, statement, params):
+        self.statements.append((str(statement), params))
+        return _Result([self.row])
+
+
+def test_get_run_reads_payloads_through_artifact_blobs(monkeypatch):
+    blob_artifact = {"kind": "deals", "inline_json": {"deals": []}, "storage_backend": "inline", "storage_key": None}
+    legacy_artifact = {"kind": "rank", "inline_json": {"ranked_items": []}, "storage_backend": "inline"}
+    fake = _RunRowEngine(
+        {"run": {"status": "SUCCEEDED"}, "steps": [], "artifacts": [blob_artifact, legacy_artifact], "version": "v1"}
+    )
+    monkeypatch.setattr(run_service, "engine", fake)
+
+    payload, version = asyncio.run(run_service.get_run_with_version("run-1", fields={"deals": {}}))
+
+    _statement, params = fake.statements[0]
+    assert params["pf_0"] == "deals"
+    assert [item["inline_json"] for item in payload["artifacts"]] == [{"deals": []}, {"ranked_items": []}]
+    assert version == "v1"
+
+
+class _ParentRunEngine(_FakeEngine):
+    def __init__(self, parent):
+        super().__init__()
+        self.parent = parent
+
+    async def execute(self, statement, params):
+        self.statements.append((str(statement), params))
+        if "FOR SHARE OF r" in str(statement):
+            return _Result([self.parent] if self.parent else [])
+        return _Result([])
+
+
+def test_rerun_reuses_upstream_artifacts_and_starts_at_the_chosen_step(monkeypatch):
+    user_id = uuid.uuid4()
+    fake = _ParentRunEngine(
+        {
+            "user_id": user_id,
+            "succeeded_steps": ["STYLE_BRIEF", "DEALS", "BRAND_SEARCH"],
+            "kinds": ["style_brief", "deals", "brand_search"],
+        }
+    )
+    monkeypatch.setattr(run_service, "engine", fake)
+
+    new_run_id = asyncio.run(run_service.create_rerun("run-1", "RANK"))
+
+    _parent, (_run_sql, run_params), (_steps_sql, steps_params), (_artifacts_sql, artifacts_params) = fake.statements
+    assert run_params["new_run_id"] == uuid.UUID(new_run_id)
+    assert (run_params["user_id"], run_params["run_id"], run_params["from_step"]) == (user_id, "run-1", "RANK")
+    assert steps_params["from_index"] == 3
+    assert artifacts_params["kinds"] == ["style_brief", "deals", "brand_search"]
+
+
+def test_rerun_requires_succeeded_upstream_steps(monkeypatch):
+    fake = _ParentRunEngine({"user_id": uuid.uuid4(), "succeeded_steps": ["STYLE_BRIEF"], "kinds": ["style_brief"]})
+    monkeypatch.setattr(run_service, "engine", fake)
+
+    with pytest.raises(run_service.RerunUnavailable, match="DEALS, BRAND_SEARCH"):
+        asyncio.run(run_service.create_rerun("run-1", "RANK"))
+    with pytest.raises(ValueError, match="Unknown step"):
+        asyncio.run(run_service.create_rerun("run-1", "SHIP"))
+    assert len(fake.statements) == 1
+
+    fake.parent = None
+    assert asyncio.run(run_service.create_rerun("run-1", "STYLE_BRIEF")) is None
+
+
+class _RunRequestEngine(_FakeEngine):
+    """Users, RUNNING runs and request keys for create_run_once."""
+
+    def __init__(self):
+        super().__init__()
+        self.running: dict = {}
+        self.keys: dict = {}
+        self.folders: dict = {}
+        self.locks = []
+
+    async def execute(self, statement, params):
+        sql = str(statement)
+        self.statements.append((sql, params))
+        if "INSERT INTO users" in sql:
+            return _Result([{"id": self.user_ids.setdefault(params["email"], uuid.uuid4())}])
+        if "pg_advisory_xact_lock" in sql:
+            self.locks.append(params["lock_key"])
+        elif "keyed_run_id" in sql:
+            folder_id = self.folders.get(params["user_id"])
+            run = self.running.get(params["user_id"]) if params["coalesce"] else None
+            if run and (run["trigger"], run["folder_id"]) == (params["trigger"], folder_id):
+                running = run["id"] if run["created_at"] > params["min_created_at"] else None
+            else:
+                running = None
+            keyed = self.keys.get((params["user_id"], params["idempotency_key"]))
+            return _Result([{"keyed_run_id": keyed, "folder_id": folder_id, "running_run_id": running}])
+        elif "INSERT INTO runs" in sql:
+            self.running[params["user_id"]] = {
+                "id": params["run_id"],
+                "trigger": params["trigger"],
+                "folder_id": params["folder_id"],
+                "created_at": datetime.now(timezone.utc),
+            }
+        elif "INSERT INTO run_request_keys" in sql:
+            self.keys[(params["user_id"], params["idempotency_key"])] = params["run_id"]
+        return _Result([])
+
+
+def test_repeated_idempotency_key_returns_the_first_run(monkeypatch):
+    fake = _RunRequestEngine()
+    monkeypatch.setattr(run_service, "engine", fake)
+
+    first = asyncio.run(run_service.create_run_once("a@example.com", idempotency_key="k1"))
+    fake.running.clear()  # the first run finished; the key still points at it
+    replay = asyncio.run(run_service.create_run_once("a@example.com", idempotency_key="k1"))
+    other_key = asyncio.run(run_service.create_run_once("a@example.com", idempotency_key="k2"))
+
+    assert first[1] and other_key[1]
+    assert replay == (first[0], False)
+    assert other_key[0] != first[0]
+    assert len(set(fake.locks)) == 1
+
+
+def test_coalescing_returns_the_running_run_and_records_the_key(monkeypatch):
+    fake = _RunRequestEngine()
+    monkeypatch.setattr(run_service, "engine", fake)
+
+    run_id, created = asyncio.run(run_service.create_run_once("a@example.com", coalesce=True))
+    coalesced = asyncio.run(run_service.create_run_once("a@example.com", idempotency_key="k1", coalesce=True))
+    uncoalesced = asyncio.run(run_service.create_run_once("a@example.com"))
+    other_user = asyncio.run(run_service.create_run_once("b@example.com", coalesce=True))
+
+    assert created
+    assert coalesced == (run_id, False)
+    assert fake.keys[(fake.user_ids["a@example.com"], "k1")] == uuid.UUID(run_id)
+    assert uncoalesced[1] and uncoalesced[0] != run_id
+    assert other_user[1]
+
+
+def test_coalescing_only_joins_a_recent_run_with_the_same_inputs(monkeypatch):
+    fake = _RunRequestEngine()
+    monkeypatch.setattr(run_service, "engine", fake)
+    fake.user_ids["a@example.com"] = user_id = uuid.uuid4()
+    fake.folders[user_id] = "folder-1"
+
+    first, _created = asyncio.run(run_service.create_run_once("a@example.com", coalesce=True))
+    same_inputs = asyncio.run(run_service.create_run_once("a@example.com", coalesce=True))
+    other_trigger = asyncio.run(run_service.create_run_once("a@example.com", trigger="prewarm", coalesce=True))
+    fake.folders[user_id] = "folder-2"
+    new_folder = asyncio.run(run_service.create_run_once("a@example.com", trigger="prewarm", coalesce=True))
+    fake.running[user_id]["created_at"] -= timedelta(seconds=run_service.RUNS_COALESCE_MAX_AGE_SECONDS + 1)
+    stuck = asyncio.run(run_service.create_run_once("a@example.com", trigger="prewarm", coalesce=True))
+
+    assert same_inputs == (first, False)
+    assert other_trigger[1]
+    # STYLE_BRIEF reads the selected folder, so picking another one must start a new run.
+    assert new_folder[1] and new_folder[0] != other_trigger[0]
+    assert fake.running[user_id]["folder_id"] == "folder-2"
+    # A RUNNING run older than the cap (e.g. stuck) no longer absorbs new requests.
+    assert stuck[1] and stuck[0] != new_folder[0]
+
+
+def test_cancel_run_reports_canceled_steps_and_task_ids(monkeypatch):
+    fake = _RunRowEngine(
+        {"previous_status": "RUNNING", "canceled": True, "step_keys": ["BRAND_SEARCH", "RANK"], "task_ids": ["t-1"]}
+    )
+    monkeypatch.setattr(run_service, "engine", fake)
+
+    result = asyncio.run(run_service.cancel_run("run-1"))
+
+    assert result == {
+        "run_id": "run-1",
+        "status": "CANCELED",
+        "canceled": True,
+        "canceled_steps": ["BRAND_SEARCH", "RANK"],
+        "task_ids": ["t-1"],
+    }
+
+    fake.row = {"previous_status": "SUCCEEDED", "canceled": False, "step_keys": [], "task_ids": []}
+    assert asyncio.run(run_service.cancel_run("run-1"))["status"] == "SUCCEEDED"
+
+
+def _rows(db, query: str, **params) -> list[dict]:
+    from sqlalchemy import text
+
+    with db.begin() as conn:
+        return [dict(row) for row in conn.execute(text(query), params).mappings().all()]
+
+
+def _finish_upstream_steps(db, run_id: str) -> None:
+    """Mark STYLE_BRIEF, DEALS and BRAND_SEARCH of ``run_id`` SUCCEEDED, each with a blob-backed artifact."""
+    for step_key in ("STYLE_BRIEF", "DEALS", "BRAND_SEARCH"):
+        kind = step_key.lower()
+        _rows(
+            db,
+            """
+            WITH step AS (
+              UPDATE run_steps SET status = 'SUCCEEDED', finished_at = now()
+              WHERE run_id = :run_id AND step_key = :step_key
+              RETURNING id, run_id
+            ),
+            blob AS (
+              INSERT INTO artifact_blobs (content_hash, storage_backend, inline_json, refcount)
+              VALUES (:kind, 'inline', jsonb_build_object(CAST(:kind AS TEXT), 'payload'), 1)
+              RETURNING content_hash
+            )
+            INSERT INTO artifacts (run_id, run_step_id, user_id, kind, storage_backend, blob_hash)
+            SELECT step.run_id, step.id, r.user_id, CAST(:kind AS TEXT), 'inline', blob.content_hash
+            FROM step JOIN runs r ON r.id = step.run_id, blob
+            RETURNING id
+            """,
+            run_id=run_id,
+            step_key=step_key,
+            kind=kind,
+        )
+
+
+def _refcounts(db) -> dict[str, int]:
+    rows = _rows(db, "SELECT content_hash, refcount FROM artifact_blobs")
+    return {row["content_hash"]: row["refcount"] for row in rows}
+
+
+def test_rerun_refcounts_balance_across_reruns_and_run_deletes(postgres):
+    parent_id = asyncio.run(run_service.create_run("rerun@example.com"))
+    _finish_upstream_steps(postgres, parent_id)
+
+    rerun_id = asyncio.run(run_service.create_rerun(parent_id, "RANK"))
+
+    assert _refcounts(postgres) == {"style_brief": 2, "deals": 2, "brand_search": 2}
+    rerun = _rows(postgres, "SELECT parent_run_id, rerun_from, status FROM runs WHERE id = :id", id=rerun_id)[0]
+    assert (str(rerun["parent_run_id"]), rerun["rerun_from"], rerun["status"]) == (parent_id, "RANK", "RUNNING")
+    steps_sql = "SELECT step_key, status FROM run_steps WHERE run_id = :id ORDER BY step_index"
+    steps = _rows(postgres, steps_sql, id=rerun_id)
+    assert [step["status"] for step in steps] == ["SUCCEEDED"] * 3 + ["PENDING"] * (len(steps) - 3)
+    payload = asyncio.run(run_service.get_run(rerun_id))
+    assert sorted((item["kind"], item["inline_json"]) for item in payload["artifacts"]) == [
+        ("brand_search", {"brand_search": "payload"}),
+        ("deals", {"deals": "payload"}),
+        ("style_brief", {"style_brief": "payload"}),
+    ]
+
+    _rows(postgres, "DELETE FROM runs WHERE id = :id RETURNING id", id=parent_id)
+    assert _refcounts(postgres) == {"style_brief": 1, "deals": 1, "brand_search": 1}
+    assert asyncio.run(run_service.get_run(rerun_id))["artifacts"]
+
+    _rows(postgres, "DELETE FROM runs WHERE id = :id RETURNING id", id=rerun_id)
+    assert _refcounts(postgres) == {"style_brief": 0, "deals": 0, "brand_search": 0}
+    assert _rows(postgres, "SELECT id FROM artifacts") == []
+
+
+def test_cancel_run_cancels_only_unfinished_steps(postgres):
+    run_id = asyncio.run(run_service.create_run("cancel@example.com"))
+    _finish_upstream_steps(postgres, run_id)
+    _rows(
+        postgres,
+        "UPDATE run_steps SET status = 'QUEUED', task_id = 't-1' WHERE run_id = :id AND step_key = 'RANK' RETURNING id",
+        id=run_id,
+    )
+
+    result = asyncio.run(run_service.cancel_run(run_id))
+
+    steps = _rows(postgres, "SELECT step_key, status FROM run_steps WHERE run_id = :id ORDER BY step_index", id=run_id)
+    assert result["canceled"] and result["task_ids"] == ["t-1"]
+    assert sorted(result["canceled_steps"]) == sorted(step["step_key"] for step in steps[3:])
+    assert [step["status"] for step in steps] == ["SUCCEEDED"] * 3 + ["CANCELED"] * (len(steps) - 3)
+    assert asyncio.run(run_service.cancel_run(run_id))["canceled"] is False
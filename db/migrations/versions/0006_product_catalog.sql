@@ -0,0 +1,39 @@
+-- Every normalized product BRAND_SEARCH has seen, keyed by the same sku the step emits. Prices are stored as listed;
+-- run-specific adjustments (palette color, deal hint, budget filter) are applied when candidates are built.
+CREATE TABLE IF NOT EXISTS product_catalog (
+  sku TEXT PRIMARY KEY,
+  brand TEXT NOT NULL,
+  brand_key TEXT NOT NULL,
+  category TEXT NOT NULL,
+  gender TEXT NOT NULL DEFAULT '',
+  color TEXT NOT NULL,
+  price_band SMALLINT NOT NULL,
+  title TEXT NOT NULL,
+  product_url TEXT,
+  image_url TEXT,
+  source TEXT,
+  sale_price NUMERIC(10, 2) NOT NULL,
+  old_price NUMERIC(10, 2) NOT NULL DEFAULT 0,
+  listed_discount_pct NUMERIC(5, 2) NOT NULL DEFAULT 0,
+  position SMALLINT NOT NULL DEFAULT 0,
+  first_seen_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  last_seen_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_product_catalog_segment ON product_catalog(brand_key, category, gender, position);
+CREATE INDEX IF NOT EXISTS idx_product_catalog_category ON product_catalog(category);
+CREATE INDEX IF NOT EXISTS idx_product_catalog_color ON product_catalog(color);
+CREATE INDEX IF NOT EXISTS idx_product_catalog_gender ON product_catalog(gender);
+CREATE INDEX IF NOT EXISTS idx_product_catalog_price_band ON product_catalog(price_band);
+
+-- One row per provider query (brand x category x gender). refreshed_at says how fresh the catalog is for that query,
+-- including queries that returned nothing, so empty results are not re-fetched on every run.
+CREATE TABLE IF NOT EXISTS product_catalog_segments (
+  brand_key TEXT NOT NULL,
+  category TEXT NOT NULL,
+  gender TEXT NOT NULL DEFAULT '',
+  query TEXT NOT NULL,
+  result_count INT NOT NULL DEFAULT 0,
+  refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (brand_key, category, gender)
+);
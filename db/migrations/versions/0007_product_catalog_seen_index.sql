@@ -0,0 +1,2 @@
+-- The style index is rebuilt incrementally from the rows seen since its last watermark.
+CREATE INDEX IF NOT EXISTS idx_product_catalog_last_seen ON product_catalog(last_seen_at);
@@ -0,0 +1,3 @@
+-- Attributes extracted from the product title at ingestion: category, gender, materials and sizes.
+-- The color guess keeps its own indexed column.
+ALTER TABLE product_catalog ADD COLUMN IF NOT EXISTS attributes JSONB NOT NULL DEFAULT '{}'::jsonb;
@@ -0,0 +1,39 @@
+-- Artifact payloads stored once per content hash (sha256 of the canonical JSON). artifacts rows reference a blob
+-- through blob_hash; rows written before this migration keep their own inline_json/storage_key and are read as
+-- before. refcount counts referencing artifacts: the step commit increments it, deleting an artifact decrements
+-- it, and the background GC removes blobs that have been unreferenced for a grace period.
+CREATE TABLE IF NOT EXISTS artifact_blobs (
+  content_hash TEXT PRIMARY KEY,
+  storage_backend TEXT NOT NULL DEFAULT 'inline',
+  storage_key TEXT,
+  inline_json JSONB,
+  size_bytes INT NOT NULL DEFAULT 0,
+  refcount INT NOT NULL DEFAULT 0,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  last_referenced_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_artifact_blobs_unreferenced
+  ON artifact_blobs(last_referenced_at) WHERE refcount <= 0;
+
+ALTER TABLE artifacts ADD COLUMN IF NOT EXISTS blob_hash TEXT REFERENCES artifact_blobs(content_hash);
+CREATE INDEX IF NOT EXISTS idx_artifacts_blob_hash ON artifacts(blob_hash);
+
+-- Memoized steps point at the blob of their artifact instead of carrying a copy of it.
+ALTER TABLE step_memo ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+CREATE OR REPLACE FUNCTION release_artifact_blob() RETURNS trigger AS $$
+BEGIN
+  IF OLD.blob_hash IS NOT NULL THEN
+    UPDATE artifact_blobs
+    SET refcount = refcount - 1, last_referenced_at = now()
+    WHERE content_hash = OLD.blob_hash;
+  END IF;
+  RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS artifacts_release_blob ON artifacts;
+CREATE TRIGGER artifacts_release_blob
+  AFTER DELETE ON artifacts
+  FOR EACH ROW EXECUTE FUNCTION release_artifact_blob();
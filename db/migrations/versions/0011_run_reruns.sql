@@ -0,0 +1,6 @@
+-- A rerun starts from one step of an earlier run: the steps before it are recorded as SUCCEEDED and their artifacts
+-- reference the parent run's payloads (the same artifact_blobs rows, with their refcount bumped).
+ALTER TABLE runs ADD COLUMN IF NOT EXISTS parent_run_id UUID REFERENCES runs(id) ON DELETE SET NULL;
+ALTER TABLE runs ADD COLUMN IF NOT EXISTS rerun_from TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_runs_parent_run_id ON runs(parent_run_id) WHERE parent_run_id IS NOT NULL;
@@ -0,0 +1,14 @@
+-- Idempotency keys sent with POST /api/runs, scoped per user. A repeated key returns the run it first created (or
+-- was coalesced into) instead of starting another pipeline.
+CREATE TABLE IF NOT EXISTS run_request_keys (
+  user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  idempotency_key TEXT NOT NULL,
+  run_id UUID NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (user_id, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_run_request_keys_run_id ON run_request_keys(run_id);
+
+-- Coalescing looks up a user's RUNNING run on every create.
+CREATE INDEX IF NOT EXISTS idx_runs_user_running ON runs(user_id, created_at) WHERE status = 'RUNNING';
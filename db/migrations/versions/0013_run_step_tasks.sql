@@ -0,0 +1,2 @@
+-- Celery task id of a step's latest queued attempt, so cancelling a run can revoke tasks still waiting in the queue.
+ALTER TABLE run_steps ADD COLUMN IF NOT EXISTS task_id TEXT;
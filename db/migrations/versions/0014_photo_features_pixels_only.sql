@@ -0,0 +1,4 @@
+-- Filename tokens come from the live Drive listing (a rename keeps the md5), and rows without a checksum could never
+-- be invalidated; photo_features keeps only pixel-derived features under a real checksum.
+ALTER TABLE photo_features DROP COLUMN IF EXISTS filename_tokens;
+DELETE FROM photo_features WHERE checksum = '';
@@ -0,0 +1,3 @@
+-- Coalescing only joins a RUNNING run with the same inputs. STYLE_BRIEF reads the selected Drive folder, so a run
+-- records the folder that was selected when it was created; a POST after picking another folder starts a new run.
+ALTER TABLE runs ADD COLUMN IF NOT EXISTS folder_id TEXT;
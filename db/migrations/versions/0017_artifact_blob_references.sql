@@ -0,0 +1,15 @@
+-- Deleting a run set its artifacts' run_id to NULL, so they kept their blob references forever and the blob GC
+-- could never collect them. Artifacts now go with their run; the artifacts_release_blob trigger releases the blobs.
+DELETE FROM artifacts WHERE run_id IS NULL AND blob_hash IS NOT NULL;
+ALTER TABLE artifacts DROP CONSTRAINT IF EXISTS artifacts_run_id_fkey;
+ALTER TABLE artifacts ADD CONSTRAINT artifacts_run_id_fkey FOREIGN KEY (run_id) REFERENCES runs(id) ON DELETE CASCADE;
+
+-- step_memo rows reference blobs by content_hash without holding a ref; the GC skips hashes a memo can still serve
+-- and deletes memos past their TTL. Memos from before 0010 carried their own payload and are simply recomputed.
+DELETE FROM step_memo WHERE content_hash IS NULL;
+ALTER TABLE step_memo
+  DROP COLUMN IF EXISTS storage_backend,
+  DROP COLUMN IF EXISTS storage_key,
+  DROP COLUMN IF EXISTS inline_json,
+  ALTER COLUMN content_hash SET NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_step_memo_content_hash ON step_memo(content_hash);
@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS provider_files (
+  provider TEXT NOT NULL,
+  digest TEXT NOT NULL,
+  file_uri TEXT NOT NULL,
+  mime_type TEXT,
+  byte_size INT,
+  expires_at TIMESTAMPTZ,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (provider, digest)
+);
+
+CREATE INDEX IF NOT EXISTS idx_provider_files_expires_at ON provider_files(expires_at);
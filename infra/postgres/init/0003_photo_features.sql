@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS photo_features (
+  file_id TEXT NOT NULL,
+  checksum TEXT NOT NULL,
+  width INT,
+  height INT,
+  mean_rgb SMALLINT[],
+  color_histogram BYTEA,
+  phash BIGINT,
+  sharpness REAL,
+  filename_tokens TEXT[],
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (file_id, checksum)
+);
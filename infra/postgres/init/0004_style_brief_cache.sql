@@ -0,0 +1,8 @@
+CREATE TABLE IF NOT EXISTS style_brief_cache (
+  user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  folder_id TEXT NOT NULL,
+  fingerprint TEXT NOT NULL,
+  payload JSONB NOT NULL,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (user_id, folder_id)
+);
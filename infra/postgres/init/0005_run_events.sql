@@ -0,0 +1,60 @@
+-- Publish run progress on the run_events channel so the API can stream it (GET /api/runs/{id}/events)
+-- without polling. Payloads are small JSON objects; NOTIFY delivers them when the writing transaction commits.
+
+CREATE OR REPLACE FUNCTION notify_run_step_event() RETURNS trigger AS $$
+BEGIN
+  IF NEW.status IS DISTINCT FROM OLD.status THEN
+    PERFORM pg_notify(
+      'run_events',
+      json_build_object(
+        'type', 'step',
+        'run_id', NEW.run_id,
+        'step_key', NEW.step_key,
+        'status', NEW.status,
+        'attempt', NEW.attempt,
+        'error', left(NEW.error, 500)
+      )::text
+    );
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_run_status_event() RETURNS trigger AS $$
+BEGIN
+  IF NEW.status IS DISTINCT FROM OLD.status THEN
+    PERFORM pg_notify(
+      'run_events',
+      json_build_object('type', 'run', 'run_id', NEW.id, 'status', NEW.status)::text
+    );
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_artifact_event() RETURNS trigger AS $$
+BEGIN
+  IF NEW.run_id IS NOT NULL THEN
+    PERFORM pg_notify(
+      'run_events',
+      json_build_object('type', 'artifact', 'run_id', NEW.run_id, 'kind', NEW.kind)::text
+    );
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS run_steps_notify ON run_steps;
+CREATE TRIGGER run_steps_notify
+  AFTER UPDATE OF status ON run_steps
+  FOR EACH ROW EXECUTE FUNCTION notify_run_step_event();
+
+DROP TRIGGER IF EXISTS runs_notify ON runs;
+CREATE TRIGGER runs_notify
+  AFTER UPDATE OF status ON runs
+  FOR EACH ROW EXECUTE FUNCTION notify_run_status_event();
+
+DROP TRIGGER IF EXISTS artifacts_notify ON artifacts;
+CREATE TRIGGER artifacts_notify
+  AFTER INSERT ON artifacts
+  FOR EACH ROW EXECUTE FUNCTION notify_artifact_event();
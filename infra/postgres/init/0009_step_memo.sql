@@ -0,0 +1,12 @@
+-- Artifacts of deterministic steps keyed by a digest of the step's declared inputs (plus a code version), so a run
+-- whose inputs match an earlier one commits the earlier artifact instead of recomputing it. The TTL is per step
+-- and applied on read.
+CREATE TABLE IF NOT EXISTS step_memo (
+  step_key TEXT NOT NULL,
+  memo_key TEXT NOT NULL,
+  storage_backend TEXT NOT NULL DEFAULT 'inline',
+  storage_key TEXT,
+  inline_json JSONB,
+  created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (step_key, memo_key)
+);
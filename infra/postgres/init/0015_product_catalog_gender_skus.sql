@@ -0,0 +1,11 @@
+-- Catalog skus now include the gender segment. Rows upserted under the old skus stayed with the first segment that
+-- saw them, so other segments refreshed since then are short of their rows; expire those segments so the next
+-- BRAND_SEARCH refetches them under the new skus.
+UPDATE product_catalog_segments s
+SET refreshed_at = 'epoch'
+WHERE s.result_count > (
+  SELECT count(*)
+  FROM product_catalog c
+  WHERE c.brand_key = s.brand_key AND c.category = s.category AND c.gender = s.gender
+    AND c.last_seen_at >= s.refreshed_at
+);
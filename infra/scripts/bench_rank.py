@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Per-run RANK cost: the original Python scoring loop + full sort vs the NumPy scorer with top-k selection.
+
+No services needed:
+
+    python infra/scripts/bench_rank.py --candidates 10000 --runs 20
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "services/workers"))
+
+from workers.common.ranking import (  # noqa: E402
+    DEFAULT_RANK_WEIGHTS,
+    build_inputs,
+    rank_batch,
+    rank_candidates,
+    score_columns,
+    top_k,
+)
+
+
+def _legacy_rank(candidates: list[dict], style: dict) -> list[dict]:
+    palette = {str(color).lower() for color in (style.get("palette") or [])}
+    budget_max = float(style.get("budget_max") or 150)
+    ranked_items = []
+    for candidate in candidates:
+        sale_price = float(candidate.get("sale_price", candidate.get("price", 0)))
+        discount_pct = float(candidate.get("discount_pct", 0))
+        palette_bonus = 0.1 if str(candidate.get("color", "")).lower() in palette else 0.0
+        budget_score = max(0.0, 1.0 - (sale_price / max(budget_max, 1.0)))
+        deal_score = min(discount_pct / 50.0, 1.0)
+        score = round((budget_score * 0.45) + (deal_score * 0.45) + palette_bonus, 4)
+        ranked_items.append({**candidate, "score": score})
+    ranked_items.sort(key=lambda item: item["score"], reverse=True)
+    return ranked_items[:10]
+
+
+def _run(seed: int, count: int) -> tuple[list[dict], dict]:
+    rng = random.Random(seed)
+    candidates = [
+        {
+            "sku": f"sku-{seed}-{idx}",
+            "brand": rng.choice(["Zara", "H&M", "Mango", "COS", "Uniqlo"]),
+            "category": rng.choice(["dress", "top", "bottom", "outerwear"]),
+            "color": rng.choice(["navy", "black", "cream", "olive", "red", "white"]),
+            "sale_price": round(rng.uniform(10, 400), 2),
+            "discount_pct": round(rng.uniform(0, 70), 2),
+        }
+        for idx in range(count)
+    ]
+    return candidates, {"palette": ["navy", "cream"], "budget_max": rng.choice([80, 150, 300])}
+
+
+def _time(label: str, fn, runs: int) -> float:
+    started = time.perf_counter()
+    fn()
+    per_run = (time.perf_counter() - started) * 1000 / runs
+    print(f"{label:<34} {per_run:8.2f} ms/run")
+    return per_run
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--candidates", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    runs = [_run(seed, args.candidates) for seed in range(args.runs)]
+    for candidates, style in runs:
+        assert rank_candidates(candidates, style, DEFAULT_RANK_WEIGHTS) == _legacy_rank(candidates, style)
+
+    print(f"{args.runs} runs x {args.candidates} candidates")
+    legacy = _time("python loop + full sort", lambda: [_legacy_rank(c, s) for c, s in runs], args.runs)
+    single = _time(
+        "numpy, one run at a time", lambda: [rank_candidates(c, s, DEFAULT_RANK_WEIGHTS) for c, s in runs], args.runs
+    )
+    batch = _time("numpy, all runs in one batch", lambda: rank_batch(runs, DEFAULT_RANK_WEIGHTS), args.runs)
+    # Columnarizing the candidate dicts dominates; this is the cost once candidates already live in arrays.
+    columns, prefs = build_inputs(runs)
+    _time(
+        "numpy, scoring + top-k only",
+        lambda: [
+            top_k(scores[idx * args.candidates : (idx + 1) * args.candidates], 10)
+            for scores in [score_columns(columns, prefs, DEFAULT_RANK_WEIGHTS)]
+            for idx in range(args.runs)
+        ],
+        args.runs,
+    )
+    print(f"speedup: {legacy / single:.1f}x per run, {legacy / batch:.1f}x batched")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Style index cost: build time, incremental update time, and query latency / recall of the IVF search vs brute force.
+
+No services needed:
+
+    python infra/scripts/bench_style_index.py --products 200000 --queries 200
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "services/workers"))
+
+import numpy as np  # noqa: E402
+
+from workers.common.style_index import (  # noqa: E402
+    encode_style,
+    load_style_index,
+    update_style_index,
+)
+
+WORDS = [
+    "linen", "wool", "cropped", "oversized", "pleated", "ribbed", "satin", "denim", "knit", "tailored", "midi", "maxi",
+    "wrap", "relaxed", "slim", "belted", "quilted", "striped", "floral", "utility", "cargo", "boxy", "cashmere", "silk",
+]
+CATEGORIES = ["dress", "top", "bottom", "blazer", "outerwear", "knitwear", "shoes", "bag"]
+COLORS = ["navy", "black", "cream", "olive", "red", "white", "camel", "grey"]
+BRANDS = ["zara", "mango", "cos", "uniqlo", "arket", "hm", "massimodutti", "everlane"]
+
+
+def _rows(rng: random.Random, start: int, count: int) -> list[dict]:
+    return [
+        {
+            "sku": f"sku-{idx}",
+            "brand_key": rng.choice(BRANDS),
+            "category": rng.choice(CATEGORIES),
+            "color": rng.choice(COLORS),
+            "title": " ".join(rng.sample(WORDS, 4)),
+        }
+        for idx in range(start, start + count)
+    ]
+
+
+def _style(rng: random.Random) -> dict:
+    return {
+        "inferred_vibes": rng.sample(WORDS, 2),
+        "palette": rng.sample(COLORS, 2),
+        "recommended_categories": rng.sample(CATEGORIES, 2),
+        "recommended_brands": rng.sample(BRANDS, 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--nprobe", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    rows = _rows(rng, 0, args.products)
+    root = tempfile.mkdtemp(prefix="style-index-")
+
+    started = time.perf_counter()
+    update_style_index(root, rows, watermark=None)
+    print(f"full build, {args.products} products: {time.perf_counter() - started:8.2f} s")
+    started = time.perf_counter()
+    result = update_style_index(root, _rows(rng, args.products, 1000), watermark=None)
+    print(f"incremental update, 1000 products: {time.perf_counter() - started:8.2f} s (retrained={result['retrained']})")
+
+    index = load_style_index(root)
+    vectors = np.asarray(index.vectors, dtype=np.float32)
+    queries = [encode_style(_style(rng)) for _ in range(args.queries)]
+
+    started = time.perf_counter()
+    results = [index.search(query, args.k, args.nprobe) for query in queries]
+    ivf_ms = (time.perf_counter() - started) * 1000 / args.queries
+    started = time.perf_counter()
+    exact = [np.sort(vectors @ query)[::-1][args.k - 1] for query in queries]
+    exact_ms = (time.perf_counter() - started) * 1000 / args.queries
+
+    # Scores tie heavily, so a hit counts when it is at least as good as the exact k-th best (float16 tolerance).
+    recall = np.mean([np.mean([score >= kth - 1e-3 for _sku, score in hits]) for hits, kth in zip(results, exact)])
+    print(f"ivf search (nlist={index.meta['nlist']}, nprobe={args.nprobe}): {ivf_ms:8.2f} ms/query")
+    print(f"brute force over {len(index)} vectors: {exact_ms:8.2f} ms/query")
+    print(f"recall@{args.k}: {recall:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
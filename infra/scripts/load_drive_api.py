@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""Load-test Drive-backed API routes against a fake, slow Google Drive.
+
+Starts a local Drive stand-in that answers after --delay seconds, then either:
+
+* ``--api-url`` given: seeds a bench user with a Drive connection (needs DATABASE_URL), fires --requests
+  concurrent GET /api/drive/folders calls at a running API and reports throughput. Start the API with
+  GOOGLE_DRIVE_API_BASE=http://<this host>:<--drive-port> so its Drive calls land on the stand-in. Run it once
+  against an image built from the sync stack and once against the current one to compare.
+* no ``--api-url``: compares the two call patterns in-process, a 40-thread pool (FastAPI's default threadpool
+  for sync routes) issuing blocking requests vs one event loop issuing them through httpx.AsyncClient.
+
+    python infra/scripts/load_drive_api.py --requests 1000 --delay 1
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+SYNC_THREADPOOL_SIZE = 40
+
+
+def _start_fake_drive(port: int, delay: float) -> ThreadingHTTPServer:
+    body = json.dumps({"files": [{"id": f"folder-{idx}", "name": f"Folder {idx}"} for idx in range(20)]}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):  # noqa: N802
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *_args):
+            pass
+
+    ThreadingHTTPServer.request_queue_size = 4096
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _report(label: str, requests: int, failures: int, elapsed: float) -> None:
+    print(f"{label:<28} {requests} requests ({failures} failed) in {elapsed:.2f}s  {requests / elapsed:8.1f} req/s")
+
+
+def _sync_call(url: str) -> bool:
+    try:
+        with urllib.request.urlopen(url, timeout=60) as resp:
+            resp.read()
+        return True
+    except Exception:
+        return False
+
+
+def _run_sync(url: str, requests: int) -> None:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=SYNC_THREADPOOL_SIZE) as pool:
+        results = list(pool.map(_sync_call, [url] * requests))
+    _report(f"sync, {SYNC_THREADPOOL_SIZE} threads", requests, results.count(False), time.perf_counter() - started)
+
+
+async def _run_async(label: str, url: str, requests: int) -> None:
+    limits = httpx.Limits(max_connections=requests, max_keepalive_connections=100)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+
+        async def call() -> bool:
+            try:
+                response = await client.get(url)
+                return response.status_code < 400
+            except httpx.HTTPError:
+                return False
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(call() for _ in range(requests)))
+    _report(label, requests, results.count(False), time.perf_counter() - started)
+
+
+def _seed_bench_user() -> tuple[str, str]:
+    import psycopg
+
+    dsn = os.environ["DATABASE_URL"].replace("postgresql+psycopg://", "postgresql://", 1)
+    email = f"load-{uuid.uuid4().hex[:8]}@example.com"
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        user_id = conn.execute("INSERT INTO users (email) VALUES (%s) RETURNING id", (email,)).fetchone()[0]
+        conn.execute(
+            "INSERT INTO drive_connections (user_id, access_token, token_expiry) VALUES (%s, 'load-test', %s)",
+            (user_id, datetime.now(timezone.utc) + timedelta(hours=1)),
+        )
+    return email, dsn
+
+
+def _cleanup_bench_user(email: str, dsn: str) -> None:
+    import psycopg
+
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        conn.execute("DELETE FROM users WHERE email = %s", (email,))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--delay", type=float, default=1.0, help="Seconds the fake Drive waits before answering.")
+    parser.add_argument("--drive-port", type=int, default=8765)
+    parser.add_argument("--api-url", default="", help="Base URL of a running API, e.g. http://localhost:8000")
+    parser.add_argument("--label", default="api")
+    args = parser.parse_args()
+
+    server = _start_fake_drive(args.drive_port, args.delay)
+    try:
+        if not args.api_url:
+            drive_url = f"http://127.0.0.1:{args.drive_port}/files"
+            _run_sync(drive_url, args.requests)
+            asyncio.run(_run_async("async, one event loop", drive_url, args.requests))
+            return 0
+
+        email, dsn = _seed_bench_user()
+        try:
+            url = f"{args.api_url.rstrip('/')}/api/drive/folders?email={email}"
+            asyncio.run(_run_async(args.label, url, args.requests))
+        finally:
+            _cleanup_bench_user(email, dsn)
+    finally:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
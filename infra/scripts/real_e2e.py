@@ -26,6 +26,22 @@ def _request_json(method: str, url: str, body: dict | None = None) -> dict:
         raise RuntimeError(f"Connection failed for {url}: {exc}") from exc
 
 
+def _get_json_if_changed(url: str, etag: str | None) -> tuple[dict | None, str | None]:
+    """GET with If-None-Match; returns (None, etag) when the server answers 304 Not Modified."""
+    headers = {"if-none-match": etag} if etag else {}
+    req = urllib.request.Request(url=url, method="GET", headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=25) as resp:
+            return json.loads(resp.read().decode("utf-8")), resp.headers.get("etag")
+    except urllib.error.HTTPError as exc:
+        if exc.code == 304:
+            return None, etag
+        detail = exc.read().decode("utf-8", errors="replace")
+        raise RuntimeError(f"HTTP {exc.code} {url}: {detail}") from exc
+    except urllib.error.URLError as exc:
+        raise RuntimeError(f"Connection failed for {url}: {exc}") from exc
+
+
 def _print_step_summary(payload: dict) -> None:
     run = payload.get("run") or {}
     steps = payload.get("steps") or []
@@ -126,8 +142,12 @@ def main() -> int:
     deadline = time.time() + max(15, args.wait_seconds)
     last_status = None
     final_payload: dict | None = None
+    payload: dict = {}
+    etag: str | None = None
     while time.time() < deadline:
-        payload = _request_json("GET", f"{base_url}/api/runs/{run_id}")
+        changed, etag = _get_json_if_changed(f"{base_url}/api/runs/{run_id}", etag)
+        if changed is not None:
+            payload = changed
         status = (payload.get("run") or {}).get("status")
         if status != last_status:
             print(f"RUN STATUS: {status}")
@@ -0,0 +1,111 @@
+import json
+import os
+import uuid
+from io import BytesIO
+from pathlib import Path
+
+
+def blob_storage_key(content_hash: str) -> str:
+    """Object key of a content-addressed artifact payload."""
+    return f"blobs/{content_hash[:2]}/{content_hash}.json.zst"
+
+
+class ArtifactStore:
+    """zstd-compressed JSON artifact payloads in MinIO or under a filesystem root.
+
+    The workers write, read and delete through it; the API only reads. Keys and encoding live here so both sides
+    agree on them. ``backend`` is where new payloads are written; reads dispatch on the backend stored with the row.
+    """
+
+    def __init__(
+        self,
+        fs_root: str,
+        minio_endpoint: str,
+        minio_access_key: str,
+        minio_secret_key: str,
+        minio_bucket: str,
+        minio_secure: bool = False,
+        backend: str = "minio",
+        zstd_level: int = 3,
+        create_bucket: bool = False,
+    ):
+        self.backend = backend
+        self.fs_root = fs_root
+        self._minio_endpoint = minio_endpoint
+        self._minio_access_key = minio_access_key
+        self._minio_secret_key = minio_secret_key
+        self._minio_bucket = minio_bucket
+        self._minio_secure = minio_secure
+        self._zstd_level = zstd_level
+        self._create_bucket = create_bucket
+        self._minio_client = None
+
+    def _minio(self):
+        if self._minio_client is None:
+            from minio import Minio
+
+            client = Minio(
+                self._minio_endpoint,
+                access_key=self._minio_access_key,
+                secret_key=self._minio_secret_key,
+                secure=self._minio_secure,
+            )
+            if self._create_bucket and not client.bucket_exists(self._minio_bucket):
+                client.make_bucket(self._minio_bucket)
+            self._minio_client = client
+        return self._minio_client
+
+    def _fs_path(self, key: str) -> Path:
+        root = Path(self.fs_root).resolve()
+        path = (root / key).resolve()
+        if root not in path.parents:
+            raise ValueError(f"Artifact key escapes storage root: {key}")
+        return path
+
+    def put_json(self, key: str, payload_json: str) -> str:
+        """Write a JSON document to ``backend`` and return its storage key."""
+        import zstandard
+
+        data = zstandard.ZstdCompressor(level=self._zstd_level).compress(payload_json.encode("utf-8"))
+        if self.backend == "filesystem":
+            path = self._fs_path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+            return key
+
+        self._minio().put_object(
+            self._minio_bucket,
+            key,
+            BytesIO(data),
+            length=len(data),
+            content_type="application/zstd",
+        )
+        return key
+
+    def get_json(self, storage_backend: str, key: str) -> dict:
+        import zstandard
+
+        if storage_backend == "filesystem":
+            data = self._fs_path(key).read_bytes()
+        elif storage_backend == "minio":
+            response = self._minio().get_object(self._minio_bucket, key)
+            try:
+                data = response.read()
+            finally:
+                response.close()
+                response.release_conn()
+        else:
+            raise ValueError(f"Unsupported artifact storage backend: {storage_backend}")
+
+        parsed = json.loads(zstandard.ZstdDecompressor().decompress(data))
+        return parsed if isinstance(parsed, dict) else {}
+
+    def delete(self, storage_backend: str, key: str) -> None:
+        if storage_backend == "filesystem":
+            self._fs_path(key).unlink(missing_ok=True)
+        elif storage_backend == "minio":
+            self._minio().remove_object(self._minio_bucket, key)
+        else:
+            raise ValueError(f"Unsupported artifact storage backend: {storage_backend}")
@@ -0,0 +1,140 @@
+import json
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+DRIVE_BATCH_URL = "https://www.googleapis.com/batch/drive/v3"
+DRIVE_BATCH_API_PATH = "/drive/v3"
+# Google rejects batches of more than 100 calls.
+DRIVE_BATCH_MAX_PARTS = 100
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DriveBatchError(RuntimeError):
+    """One part of a batch failed; the other parts are unaffected."""
+
+    def __init__(self, file_id: str, status: int, detail: str = ""):
+        super().__init__(f"Drive metadata for {file_id} failed: {status} {detail[:200]}".rstrip())
+        self.file_id = file_id
+        self.status = status
+
+
+def build_batch_body(file_ids: list[str], fields: str, boundary: str, api_path: str = DRIVE_BATCH_API_PATH) -> bytes:
+    query = urllib.parse.urlencode({"fields": fields, "supportsAllDrives": "true"})
+    parts = []
+    for idx, file_id in enumerate(file_ids):
+        parts.append(
+            f"--{boundary}\r\n"
+            "Content-Type: application/http\r\n"
+            f"Content-ID: <item-{idx}>\r\n"
+            "\r\n"
+            f"GET {api_path}/files/{urllib.parse.quote(file_id, safe='')}?{query}\r\n"
+            "\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n")
+    return "".join(parts).encode("utf-8")
+
+
+def _split_head(block: str) -> tuple[str, str]:
+    for separator in ("\r\n\r\n", "\n\n"):
+        head, found, rest = block.partition(separator)
+        if found:
+            return head, rest
+    return block, ""
+
+
+def _boundary_from(content_type: str) -> str:
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary":
+            return value.strip('"')
+    raise RuntimeError(f"Drive batch response has no multipart boundary: {content_type[:120]}")
+
+
+def parse_batch_response(content_type: str, body: bytes) -> dict[int, tuple[int, str]]:
+    """Map each part's index (from its ``Content-ID``) to the embedded HTTP status and body."""
+    boundary = _boundary_from(content_type)
+    results: dict[int, tuple[int, str]] = {}
+    for raw_part in body.decode("utf-8", errors="replace").split(f"--{boundary}")[1:]:
+        if raw_part.startswith("--"):
+            break
+        part_head, http_response = _split_head(raw_part.lstrip("\r\n"))
+        content_id = ""
+        for line in part_head.splitlines():
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-id":
+                content_id = value.strip().strip("<>")
+        status_head, part_body = _split_head(http_response)
+        status_line = status_head.splitlines()[0] if status_head else ""
+        try:
+            status = int(status_line.split()[1])
+            idx = int(content_id.rsplit("-", 1)[-1])
+        except (IndexError, ValueError):
+            continue
+        results[idx] = (status, part_body.strip())
+    return results
+
+
+class DriveBatchClient:
+    """Fetch metadata for many Drive files through the multipart batch endpoint, 100 files per HTTP call."""
+
+    def __init__(self, batch_url: str = DRIVE_BATCH_URL, api_path: str = DRIVE_BATCH_API_PATH, timeout: float = 30):
+        self._batch_url = batch_url
+        self._api_path = api_path
+        self._timeout = timeout
+
+    def get_files_metadata(
+        self, access_token: str, file_ids: list[str], fields: str, max_retries: int = 1
+    ) -> dict[str, dict | DriveBatchError]:
+        """Return metadata per file id; failed parts map to a DriveBatchError instead of failing the call.
+
+        Parts answered with 429/5xx are re-sent (only those) up to ``max_retries`` times.
+        """
+        results: dict[str, dict | DriveBatchError] = {}
+        pending = list(dict.fromkeys(str(file_id) for file_id in file_ids))
+        for attempt in range(max_retries + 1):
+            retry: list[str] = []
+            for start in range(0, len(pending), DRIVE_BATCH_MAX_PARTS):
+                chunk = pending[start : start + DRIVE_BATCH_MAX_PARTS]
+                for file_id, outcome in self._send(access_token, chunk, fields).items():
+                    results[file_id] = outcome
+                    if isinstance(outcome, DriveBatchError) and outcome.status in RETRYABLE_STATUSES:
+                        retry.append(file_id)
+            if not retry or attempt == max_retries:
+                break
+            pending = retry
+            time.sleep(0.5 * (2**attempt))
+        return results
+
+    def _send(self, access_token: str, file_ids: list[str], fields: str) -> dict[str, dict | DriveBatchError]:
+        boundary = f"batch_{uuid.uuid4().hex}"
+        request = urllib.request.Request(
+            self._batch_url,
+            data=build_batch_body(file_ids, fields, boundary, self._api_path),
+            method="POST",
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": f"multipart/mixed; boundary={boundary}",
+            },
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self._timeout) as response:
+                parts = parse_batch_response(response.headers.get("Content-Type", ""), response.read())
+        except urllib.error.HTTPError as exc:
+            # The whole batch was rejected (bad auth, malformed body): every part shares that status.
+            detail = exc.read().decode("utf-8", errors="replace")
+            return {file_id: DriveBatchError(file_id, exc.code, detail) for file_id in file_ids}
+
+        results: dict[str, dict | DriveBatchError] = {}
+        for idx, file_id in enumerate(file_ids):
+            status, body = parts.get(idx, (502, "missing from batch response"))
+            if status >= 400:
+                results[file_id] = DriveBatchError(file_id, status, body)
+                continue
+            try:
+                results[file_id] = json.loads(body)
+            except json.JSONDecodeError:
+                results[file_id] = DriveBatchError(file_id, 502, "invalid JSON in batch part")
+        return results
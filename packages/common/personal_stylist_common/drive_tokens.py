@@ -0,0 +1,417 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
+
+logger = logging.getLogger(__name__)
+
+_SELECT_FOR_UPDATE_SQL = """
+SELECT access_token, refresh_token, token_expiry
+FROM drive_connections
+WHERE user_id = :user_id
+FOR UPDATE
+"""
+_UPDATE_TOKEN_SQL = """
+UPDATE drive_connections
+SET access_token = :access_token, token_expiry = :token_expiry, updated_at = :updated_at
+WHERE user_id = :user_id
+"""
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class _DriveTokenCache:
+    """Cache policy shared by the sync and asyncio managers; neither I/O style lives here."""
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        redis_url: str = "",
+        token_url: str = GOOGLE_TOKEN_URL,
+        expiry_skew_seconds: int = 60,
+        refresh_ahead_seconds: int = 300,
+        unrefreshable_ttl_seconds: float = 60,
+    ):
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._redis_url = redis_url
+        self._redis = None
+        self._token_url = token_url
+        self._skew = timedelta(seconds=expiry_skew_seconds)
+        self._refresh_ahead = timedelta(seconds=refresh_ahead_seconds)
+        self._unrefreshable_ttl = unrefreshable_ttl_seconds
+        self._tokens: dict[str, tuple[str, datetime | None]] = {}
+        self._unrefreshable_until: dict[str, float] = {}
+        self._refreshing: set[str] = set()
+
+    def _usable(self, token_expiry: datetime | None) -> bool:
+        return token_expiry is not None and token_expiry > _utcnow() + self._skew
+
+    def _due_for_refresh(self, token_expiry: datetime | None) -> bool:
+        return token_expiry is not None and token_expiry <= _utcnow() + self._refresh_ahead
+
+    def _refreshable(self, key: str) -> bool:
+        return self._unrefreshable_until.get(key, 0.0) <= time.monotonic()
+
+    def _servable(self, key: str, token_expiry: datetime | None) -> bool:
+        return self._usable(token_expiry) or not self._refreshable(key)
+
+    def _remember(self, key: str, access_token: str, token_expiry: datetime | None) -> None:
+        self._tokens[key] = (access_token, token_expiry)
+        self._unrefreshable_until.pop(key, None)
+
+    def _forget(self, key: str) -> None:
+        self._tokens.pop(key, None)
+        self._unrefreshable_until.pop(key, None)
+
+    def _hold_unrefreshable(self, key: str, access_token: str, token_expiry: datetime | None) -> None:
+        # The stored token is the best there is (callers surface Drive's 401); serve it from memory for a while
+        # instead of locking the row again on every call.
+        self._remember(key, access_token, token_expiry if self._usable(token_expiry) else None)
+        self._unrefreshable_until[key] = time.monotonic() + self._unrefreshable_ttl
+
+    def _refresh_form(self, refresh_token: str) -> dict:
+        if not self._client_id or not self._client_secret:
+            raise RuntimeError("Google OAuth client credentials are not configured")
+        return {
+            "client_id": self._client_id,
+            "client_secret": self._client_secret,
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+        }
+
+    @staticmethod
+    def _parse_token_response(payload: dict) -> tuple[str, datetime]:
+        access_token = payload.get("access_token")
+        if not access_token:
+            raise RuntimeError("Token refresh response missing access_token")
+        expires_in = int(payload.get("expires_in", 3600))
+        return access_token, _utcnow() + timedelta(seconds=max(0, expires_in - 30))
+
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f"drive-token:{key}"
+
+    @staticmethod
+    def _decode_cached(raw) -> tuple[str, datetime] | None:
+        if not raw:
+            return None
+        item = json.loads(raw)
+        return item["access_token"], datetime.fromisoformat(item["token_expiry"])
+
+    def _encode_cached(self, access_token: str, token_expiry: datetime | None) -> tuple[str, int] | None:
+        """Redis value and TTL, or None when the token should not be shared."""
+        if token_expiry is None:
+            return None
+        ttl = int((token_expiry - _utcnow() - self._skew).total_seconds())
+        if ttl <= 0:
+            return None
+        return json.dumps({"access_token": access_token, "token_expiry": token_expiry.isoformat()}), ttl
+
+
+class DriveTokenManager(_DriveTokenCache):
+    """Hand out valid Google Drive access tokens per user without touching Postgres on the hot path.
+
+    Lookups go process memory -> Redis (when configured) -> drive_connections. Refreshes are single-flight:
+    one thread per process takes the user's lock, and across processes the drive_connections row is locked
+    FOR UPDATE while the refresh runs, so a waiting process re-reads the token its peer just stored instead of
+    refreshing again. Tokens inside the refresh-ahead window are returned immediately and renewed in the
+    background. A stored token that cannot be refreshed (no refresh token) is served as is for
+    ``unrefreshable_ttl_seconds`` before the row is read again.
+    """
+
+    def __init__(self, database_url: str, client_id: str, client_secret: str, **policy):
+        super().__init__(client_id, client_secret, **policy)
+        self._database_url = database_url
+        self._engine = None
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="drive-token-refresh")
+
+    def get_token(self, user_id) -> str | None:
+        """Return a usable access token, or None when the user has no Drive connection."""
+        key = str(user_id)
+        cached = self._tokens.get(key) or self._redis_get(key)
+        if cached and self._servable(key, cached[1]):
+            self._tokens[key] = cached
+            if self._due_for_refresh(cached[1]) and self._refreshable(key):
+                self._schedule_refresh(key)
+            return cached[0]
+
+        with self._user_lock(key):
+            cached = self._tokens.get(key)
+            if cached and self._servable(key, cached[1]):
+                return cached[0]
+            return self._refresh(key, force=False)
+
+    def prime(self, user_id, access_token: str, token_expiry: datetime | None) -> None:
+        """Record a token obtained elsewhere (e.g. the OAuth callback) so the next lookup is a cache hit."""
+        key = str(user_id)
+        self._remember(key, access_token, token_expiry)
+        self._redis_set(key, access_token, token_expiry)
+
+    def invalidate(self, user_id) -> None:
+        key = str(user_id)
+        self._forget(key)
+        client = self._redis_client()
+        if client is not None:
+            try:
+                client.delete(self._redis_key(key))
+            except Exception:
+                logger.warning("drive token cache delete failed", exc_info=True)
+
+    def _db(self):
+        # One small pool per manager; refreshes are rare, but each must not pay for a new connection.
+        if self._engine is None:
+            from sqlalchemy import create_engine
+
+            self._engine = create_engine(self._database_url, pool_pre_ping=True, pool_size=2, max_overflow=2)
+        return self._engine
+
+    def _user_lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _schedule_refresh(self, key: str) -> None:
+        with self._locks_guard:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run() -> None:
+            try:
+                with self._user_lock(key):
+                    self._refresh(key, force=True)
+            except Exception:
+                logger.warning("background drive token refresh failed for %s", key, exc_info=True)
+            finally:
+                with self._locks_guard:
+                    self._refreshing.discard(key)
+
+        self._background.submit(run)
+
+    def _refresh(self, key: str, force: bool) -> str | None:
+        """Load the row under FOR UPDATE; refresh through Google only if it is still stale (or ``force``)."""
+        from sqlalchemy import text
+
+        with self._db().begin() as conn:
+            row = conn.execute(text(_SELECT_FOR_UPDATE_SQL), {"user_id": key}).first()
+            if not row:
+                self._forget(key)
+                return None
+
+            access_token, refresh_token, token_expiry = row
+            fresh = self._usable(token_expiry) and not (force and self._due_for_refresh(token_expiry))
+            if fresh:
+                self.prime(key, access_token, token_expiry)
+                return access_token
+            if not refresh_token:
+                self._hold_unrefreshable(key, access_token, token_expiry)
+                return access_token
+
+            access_token, token_expiry = self._request_token(refresh_token)
+            conn.execute(
+                text(_UPDATE_TOKEN_SQL),
+                {"access_token": access_token, "token_expiry": token_expiry, "updated_at": _utcnow(), "user_id": key},
+            )
+
+        self.prime(key, access_token, token_expiry)
+        return access_token
+
+    def _request_token(self, refresh_token: str) -> tuple[str, datetime]:
+        body = urllib.parse.urlencode(self._refresh_form(refresh_token)).encode("utf-8")
+        request = urllib.request.Request(self._token_url, data=body, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=20) as response:
+                payload = json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as exc:
+            detail = exc.read().decode("utf-8", errors="replace")[:200]
+            raise RuntimeError(f"Unable to refresh Drive access token: {detail}") from exc
+        except urllib.error.URLError as exc:
+            raise RuntimeError(f"Unable to refresh Drive access token: {exc}") from exc
+        return self._parse_token_response(payload)
+
+    def _redis_client(self):
+        if not self._redis_url:
+            return None
+        if self._redis is None:
+            import redis
+
+            self._redis = redis.Redis.from_url(self._redis_url)
+        return self._redis
+
+    def _redis_get(self, key: str) -> tuple[str, datetime] | None:
+        client = self._redis_client()
+        if client is None:
+            return None
+        try:
+            raw = client.get(self._redis_key(key))
+        except Exception:
+            logger.warning("drive token cache read failed", exc_info=True)
+            return None
+        return self._decode_cached(raw)
+
+    def _redis_set(self, key: str, access_token: str, token_expiry: datetime | None) -> None:
+        client = self._redis_client()
+        encoded = self._encode_cached(access_token, token_expiry)
+        if client is None or encoded is None:
+            return
+        try:
+            client.set(self._redis_key(key), encoded[0], ex=encoded[1])
+        except Exception:
+            logger.warning("drive token cache write failed", exc_info=True)
+
+
+class AsyncDriveTokenManager(_DriveTokenCache):
+    """The same cache for asyncio callers (the API), without threads on the request path.
+
+    Memory hits return without awaiting anything. Misses read Redis through redis.asyncio and lock the
+    drive_connections row through the caller's pooled async engine; the Google refresh POST goes through httpx.
+    Single-flight within the process is an asyncio.Lock per user; across processes it is the row lock, as in
+    DriveTokenManager.
+    """
+
+    def __init__(self, engine, client_id: str, client_secret: str, http_client=None, **policy):
+        super().__init__(client_id, client_secret, **policy)
+        self._engine = engine
+        self._http_client = http_client
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._background: set[asyncio.Task] = set()
+
+    async def get_token(self, user_id) -> str | None:
+        """Return a usable access token, or None when the user has no Drive connection."""
+        key = str(user_id)
+        cached = self._tokens.get(key)
+        if cached is None:
+            cached = await self._redis_get(key)
+        if cached and self._servable(key, cached[1]):
+            self._tokens[key] = cached
+            if self._due_for_refresh(cached[1]) and self._refreshable(key):
+                self._schedule_refresh(key)
+            return cached[0]
+
+        async with self._user_lock(key):
+            cached = self._tokens.get(key)
+            if cached and self._servable(key, cached[1]):
+                return cached[0]
+            return await self._refresh(key, force=False)
+
+    async def prime(self, user_id, access_token: str, token_expiry: datetime | None) -> None:
+        """Record a token obtained elsewhere (e.g. the OAuth callback) so the next lookup is a cache hit."""
+        key = str(user_id)
+        self._remember(key, access_token, token_expiry)
+        await self._redis_set(key, access_token, token_expiry)
+
+    async def invalidate(self, user_id) -> None:
+        key = str(user_id)
+        self._forget(key)
+        client = self._redis_client()
+        if client is not None:
+            try:
+                await client.delete(self._redis_key(key))
+            except Exception:
+                logger.warning("drive token cache delete failed", exc_info=True)
+
+    def _user_lock(self, key: str) -> asyncio.Lock:
+        return self._locks.setdefault(key, asyncio.Lock())
+
+    def _schedule_refresh(self, key: str) -> None:
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        async def run() -> None:
+            try:
+                async with self._user_lock(key):
+                    await self._refresh(key, force=True)
+            except Exception:
+                logger.warning("background drive token refresh failed for %s", key, exc_info=True)
+            finally:
+                self._refreshing.discard(key)
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _refresh(self, key: str, force: bool) -> str | None:
+        """Load the row under FOR UPDATE; refresh through Google only if it is still stale (or ``force``)."""
+        from sqlalchemy import text
+
+        async with self._engine.begin() as conn:
+            row = (await conn.execute(text(_SELECT_FOR_UPDATE_SQL), {"user_id": key})).first()
+            if not row:
+                self._forget(key)
+                return None
+
+            access_token, refresh_token, token_expiry = row
+            fresh = self._usable(token_expiry) and not (force and self._due_for_refresh(token_expiry))
+            if fresh:
+                await self.prime(key, access_token, token_expiry)
+                return access_token
+            if not refresh_token:
+                self._hold_unrefreshable(key, access_token, token_expiry)
+                return access_token
+
+            access_token, token_expiry = await self._request_token(refresh_token)
+            await conn.execute(
+                text(_UPDATE_TOKEN_SQL),
+                {"access_token": access_token, "token_expiry": token_expiry, "updated_at": _utcnow(), "user_id": key},
+            )
+
+        await self.prime(key, access_token, token_expiry)
+        return access_token
+
+    async def _request_token(self, refresh_token: str) -> tuple[str, datetime]:
+        import httpx
+
+        form = self._refresh_form(refresh_token)
+        if self._http_client is None:
+            self._http_client = httpx.AsyncClient()
+        try:
+            response = await self._http_client.post(self._token_url, data=form, timeout=20)
+        except httpx.HTTPError as exc:
+            raise RuntimeError(f"Unable to refresh Drive access token: {exc}") from exc
+        if response.status_code >= 400:
+            raise RuntimeError(f"Unable to refresh Drive access token: {response.text[:200]}")
+        return self._parse_token_response(response.json())
+
+    def _redis_client(self):
+        if not self._redis_url:
+            return None
+        if self._redis is None:
+            from redis import asyncio as redis_asyncio
+
+            self._redis = redis_asyncio.from_url(self._redis_url)
+        return self._redis
+
+    async def _redis_get(self, key: str) -> tuple[str, datetime] | None:
+        client = self._redis_client()
+        if client is None:
+            return None
+        try:
+            raw = await client.get(self._redis_key(key))
+        except Exception:
+            logger.warning("drive token cache read failed", exc_info=True)
+            return None
+        return self._decode_cached(raw)
+
+    async def _redis_set(self, key: str, access_token: str, token_expiry: datetime | None) -> None:
+        client = self._redis_client()
+        encoded = self._encode_cached(access_token, token_expiry)
+        if client is None or encoded is None:
+            return
+        try:
+            await client.set(self._redis_key(key), encoded[0], ex=encoded[1])
+        except Exception:
+            logger.warning("drive token cache write failed", exc_info=True)
@@ -41,19 +41,39 @@ def list_drive_photos(folder_id: str, photos: list[dict] | None = None, limit: i
     ]
 
 
-def select_analysis_photos(photos: list[dict], max_images: int = 4) -> list[dict]:
-    """Pick up to max_images photos to send to the multimodal model."""
+def _phash_value(photo: dict) -> int | None:
+    raw = photo.get("phash")
+    if isinstance(raw, int):
+        return raw
+    if isinstance(raw, str) and raw:
+        try:
+            return int(raw, 16)
+        except ValueError:
+            return None
+    return None
+
+
+def select_analysis_photos(photos: list[dict], max_images: int = 4, duplicate_distance: int = 6) -> list[dict]:
+    """Pick up to max_images photos to send to the multimodal model, skipping near-duplicate perceptual hashes."""
     selected: list[dict] = []
+    seen_hashes: list[int] = []
     for photo in photos:
         photo_id = photo.get("id") or photo.get("photo_id")
         if not photo_id:
             continue
+        phash = _phash_value(photo)
+        if phash is not None:
+            if any(bin(phash ^ seen).count("1") <= duplicate_distance for seen in seen_hashes):
+                continue
+            seen_hashes.append(phash)
         selected.append(
             {
                 "id": str(photo_id),
                 "name": str(photo.get("name", "")),
                 "data_uri": photo.get("data_uri"),
+                "file_uri": photo.get("file_uri"),
                 "image_uri": photo.get("image_uri") or photo.get("webViewLink"),
+                "phash": photo.get("phash"),
             }
         )
         if len(selected) >= max(1, max_images):
@@ -65,7 +85,7 @@ def build_multimodal_messages(prompt: str, analysis_photos: list[dict]) -> list[
     """Build Gemini-compatible multimodal user content blocks."""
     content: list[dict] = [{"type": "text", "text": prompt}]
     for photo in analysis_photos:
-        image_url = photo.get("data_uri") or photo.get("image_uri")
+        image_url = photo.get("file_uri") or photo.get("data_uri") or photo.get("image_uri")
         if not image_url:
             continue
         content.append(
@@ -1,5 +1,6 @@
 import os
 import time
+import uuid
 from datetime import datetime, timezone
 
 from celery import Celery
@@ -9,15 +10,20 @@ DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+psycopg://stylist:stylist@l
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/1")
 POLL_INTERVAL_SECONDS = float(os.getenv("ORCHESTRATOR_POLL_INTERVAL_SECONDS", "2"))
+DRIVE_CHANGE_SWEEP_SECONDS = float(os.getenv("DRIVE_CHANGE_SWEEP_SECONDS", "900"))
+PRODUCT_CATALOG_SNAPSHOT_SECONDS = float(os.getenv("PRODUCT_CATALOG_SNAPSHOT_SECONDS", "300"))
+ARTIFACT_BLOB_GC_SECONDS = float(os.getenv("ARTIFACT_BLOB_GC_SECONDS", "3600"))
+BACKGROUND_QUEUE = "background"
 
 engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 celery_app = Celery("orchestrator", broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
 
 
 def _update_run_status(run_id, status: str):
+    # Only a run that is still RUNNING is finished here; a cancel that landed after the steps were read wins.
     with engine.begin() as conn:
         conn.execute(
-            text("UPDATE runs SET status=:status, finished_at=:finished_at WHERE id=:run_id"),
+            text("UPDATE runs SET status=:status, finished_at=:finished_at WHERE id=:run_id AND status='RUNNING'"),
             {
                 "status": status,
                 "finished_at": datetime.now(timezone.utc),
@@ -27,22 +33,25 @@ def _update_run_status(run_id, status: str):
 
 
 def _queue_step(step_id, run_id, step_key):
+    # The task id is recorded before sending so a cancel can revoke the task while it is still queued.
+    task_id = str(uuid.uuid4())
     with engine.begin() as conn:
         updated = conn.execute(
             text(
                 """
                 UPDATE run_steps
-                SET status='QUEUED', attempt=attempt+1
+                SET status='QUEUED', attempt=attempt+1, task_id=:task_id
                 WHERE id=:step_id AND status='PENDING'
                 """
             ),
-            {"step_id": step_id},
+            {"step_id": step_id, "task_id": task_id},
         ).rowcount
 
     if updated:
         celery_app.send_task(
             "workers.worker.execute_step",
             args=[str(step_id), str(run_id), step_key],
+            task_id=task_id,
         )
 
 
@@ -97,13 +106,59 @@ def process_once() -> None:
             )
 
 
+def enqueue_drive_change_checks() -> int:
+    """Queue a STYLE_BRIEF pre-warm per connected user; unchanged folders are a cheap cache hit in the worker."""
+    with engine.begin() as conn:
+        user_ids = conn.execute(
+            text(
+                """
+                SELECT DISTINCT f.user_id
+                FROM drive_folders f
+                JOIN drive_connections c ON c.user_id = f.user_id
+                WHERE f.is_selected = TRUE
+                """
+            )
+        ).scalars().all()
+
+    for user_id in user_ids:
+        celery_app.send_task(
+            "workers.worker.prewarm_style_brief",
+            args=[str(user_id)],
+            queue=BACKGROUND_QUEUE,
+        )
+    return len(user_ids)
+
+
+def enqueue_catalog_rebuilds() -> None:
+    celery_app.send_task("workers.worker.rebuild_product_catalog_snapshot", queue=BACKGROUND_QUEUE)
+    celery_app.send_task("workers.worker.rebuild_product_style_index", queue=BACKGROUND_QUEUE)
+
+
+def enqueue_artifact_blob_gc() -> None:
+    celery_app.send_task("workers.worker.collect_artifact_blobs", queue=BACKGROUND_QUEUE)
+
+
 def main() -> None:
     run_once = os.getenv("ORCHESTRATOR_RUN_ONCE") == "1"
+    last_sweep = time.monotonic()
+    last_snapshot = None
+    last_blob_gc = time.monotonic()
 
     while True:
         process_once()
         if run_once:
             return
+        if DRIVE_CHANGE_SWEEP_SECONDS > 0 and time.monotonic() - last_sweep >= DRIVE_CHANGE_SWEEP_SECONDS:
+            enqueue_drive_change_checks()
+            last_sweep = time.monotonic()
+        if PRODUCT_CATALOG_SNAPSHOT_SECONDS > 0 and (
+            last_snapshot is None or time.monotonic() - last_snapshot >= PRODUCT_CATALOG_SNAPSHOT_SECONDS
+        ):
+            enqueue_catalog_rebuilds()
+            last_snapshot = time.monotonic()
+        if ARTIFACT_BLOB_GC_SECONDS > 0 and time.monotonic() - last_blob_gc >= ARTIFACT_BLOB_GC_SECONDS:
+            enqueue_artifact_blob_gc()
+            last_blob_gc = time.monotonic()
         time.sleep(POLL_INTERVAL_SECONDS)
 
 
@@ -0,0 +1,59 @@
+from sqlalchemy import create_engine, text
+
+from orchestrator import runner
+
+
+class _CancelBeforeWrite:
+    """Cancels the run right before the n-th transaction, i.e. between process_once reading steps and writing."""
+
+    def __init__(self, engine, cancel_on: int):
+        self._engine = engine
+        self._cancel_on = cancel_on
+        self._calls = 0
+
+    def begin(self):
+        self._calls += 1
+        if self._calls == self._cancel_on:
+            with self._engine.begin() as conn:
+                conn.execute(text("UPDATE runs SET status='CANCELED' WHERE id='run-1'"))
+        return self._engine.begin()
+
+
+def _engine_with_run(tmp_path, step_statuses: list[str]):
+    engine = create_engine(f"sqlite:///{tmp_path / 'runs.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE runs (id TEXT PRIMARY KEY, status TEXT, finished_at TEXT, created_at TEXT)"))
+        conn.execute(
+            text("CREATE TABLE run_steps (id TEXT, run_id TEXT, step_index INT, step_key TEXT, status TEXT)")
+        )
+        conn.execute(text("INSERT INTO runs VALUES ('run-1', 'RUNNING', NULL, '2026-01-01')"))
+        for index, status in enumerate(step_statuses):
+            conn.execute(
+                text("INSERT INTO run_steps VALUES (:id, 'run-1', :index, 'RANK', :status)"),
+                {"id": f"step-{index}", "index": index, "status": status},
+            )
+    return engine
+
+
+def _run_status(engine) -> str:
+    with engine.begin() as conn:
+        return conn.execute(text("SELECT status FROM runs WHERE id='run-1'")).scalar_one()
+
+
+def test_cancel_between_step_read_and_status_write_is_kept(monkeypatch, tmp_path):
+    engine = _engine_with_run(tmp_path, ["SUCCEEDED", "SUCCEEDED"])
+    # 1: running runs, 2: their steps, 3: the status write.
+    monkeypatch.setattr(runner, "engine", _CancelBeforeWrite(engine, cancel_on=3))
+
+    runner.process_once()
+
+    assert _run_status(engine) == "CANCELED"
+
+
+def test_finished_steps_finish_a_running_run(monkeypatch, tmp_path):
+    engine = _engine_with_run(tmp_path, ["SUCCEEDED", "FAILED"])
+    monkeypatch.setattr(runner, "engine", engine)
+
+    runner.process_once()
+
+    assert _run_status(engine) == "FAILED"
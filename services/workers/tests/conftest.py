@@ -0,0 +1,71 @@
+from contextlib import nullcontext
+import importlib.util
+import os
+from pathlib import Path
+import sys
+import types
+import uuid
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / "packages" / "common"))
+
+try:
+    import PIL.Image  # noqa: F401
+except ImportError:
+    pil_module = types.ModuleType("PIL")
+    pil_module.Image = types.SimpleNamespace(Image=object, open=lambda *_args, **_kwargs: None)
+    pil_module.ImageFilter = types.SimpleNamespace(FIND_EDGES=None)
+    pil_module.ImageStat = types.SimpleNamespace(Stat=None)
+    sys.modules["PIL"] = pil_module
+
+if "workers.common.db" not in sys.modules:
+    db_module = types.ModuleType("workers.common.db")
+    db_module.exec_one = lambda *_args, **_kwargs: None
+    db_module.exec_all = lambda *_args, **_kwargs: []
+    db_module.exec_many = lambda *_args, **_kwargs: None
+    db_module.exec_write = lambda *_args, **_kwargs: 0
+    db_module.transaction = lambda *_args, **_kwargs: nullcontext(None)
+    sys.modules["workers.common.db"] = db_module
+
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[3] / "infra" / "postgres" / "init"
+REAL_DB_MODULE = Path(__file__).resolve().parents[1] / "workers" / "common" / "db.py"
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    """The real workers.common.db against a throwaway schema of TEST_DATABASE_URL (e.g. the compose Postgres).
+
+    Every migration is applied to the schema, and the executor's db helpers are pointed at it for the test.
+    """
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from sqlalchemy import create_engine
+
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = create_engine(url)
+    with admin.begin() as conn:
+        conn.exec_driver_sql(f"CREATE SCHEMA {schema}")
+    scoped_url = f"{url}{'&' if '?' in url else '?'}options=-csearch_path%3D{schema},public"
+    monkeypatch.setenv("DATABASE_URL", scoped_url)
+    spec = importlib.util.spec_from_file_location(f"pg_db_{schema}", REAL_DB_MODULE)
+    db = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(db)
+    try:
+        with db.engine.begin() as conn:
+            for migration in sorted(MIGRATIONS_DIR.glob("*.sql")):
+                conn.exec_driver_sql(migration.read_text())
+
+        from workers.executors import crewai_step_executor as executor
+
+        for name in ("exec_one", "exec_all", "exec_write", "exec_many", "transaction"):
+            monkeypatch.setattr(executor, name, getattr(db, name))
+        yield db
+    finally:
+        db.engine.dispose()
+        with admin.begin() as conn:
+            conn.exec_driver_sql(f"DROP SCHEMA {schema} CASCADE")
+        admin.dispose()
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from workers.common import storage
+from workers.executors import crewai_step_executor as executor
+
+
+def _use_filesystem(monkeypatch, tmp_path, inline_max_bytes: int = 0):
+    monkeypatch.setattr(storage.artifact_store, "backend", "filesystem")
+    monkeypatch.setattr(storage.artifact_store, "fs_root", str(tmp_path))
+    monkeypatch.setattr(storage, "ARTIFACT_INLINE_MAX_BYTES", inline_max_bytes)
+
+
+def test_equal_payloads_share_one_content_address(monkeypatch, tmp_path):
+    _use_filesystem(monkeypatch, tmp_path)
+    uploads = []
+    put = storage.put_json_artifact
+    monkeypatch.setattr(storage, "put_json_artifact", lambda key, data: uploads.append(key) or put(key, data))
+    stored: set[str] = set()
+
+    first = storage.place_artifact({"deals": [{"brand": "Zara"}], "data_mode": "mock"}, stored.__contains__)
+    stored.add(first["content_hash"])
+    second = storage.place_artifact({"data_mode": "mock", "deals": [{"brand": "Zara"}]}, stored.__contains__)
+    other = storage.place_artifact({"data_mode": "mock", "deals": [{"brand": "Mango"}]}, stored.__contains__)
+
+    assert second == first
+    assert other["content_hash"] != first["content_hash"]
+    assert uploads == [first["storage_key"], other["storage_key"]]
+    assert storage.get_json_artifact("filesystem", second["storage_key"]) == {
+        "data_mode": "mock",
+        "deals": [{"brand": "Zara"}],
+    }
+
+
+def test_gc_deletes_unreferenced_blobs_and_their_objects(monkeypatch, tmp_path):
+    _use_filesystem(monkeypatch, tmp_path)
+    monkeypatch.setattr(executor, "ARTIFACT_BLOB_GC_BATCH", 2)
+    placements = [storage.place_artifact({"idx": idx}) for idx in range(3)]
+    batches = [
+        [{"storage_backend": "filesystem", "storage_key": item["storage_key"]} for item in placements[:2]],
+        [
+            {"storage_backend": "filesystem", "storage_key": placements[2]["storage_key"]},
+            {"storage_backend": "inline", "storage_key": None},
+        ],
+        [],
+    ]
+    cutoffs = []
+
+    def fake_exec_all(_query, params):
+        cutoffs.append(params["cutoff"])
+        return batches.pop(0)
+
+    monkeypatch.setattr(executor, "exec_all", fake_exec_all)
+
+    result = executor.collect_artifact_blobs_impl()
+
+    assert result == {"status": "COLLECTED", "memos": 0, "blobs": 4, "objects": 3}
+    assert not any((tmp_path / item["storage_key"]).exists() for item in placements)
+    assert executor._utcnow() - cutoffs[0] >= timedelta(hours=executor.ARTIFACT_BLOB_GC_GRACE_HOURS)
+
@@ -0,0 +1,91 @@
+import json
+import uuid
+
+import pytest
+import zstandard
+
+from workers.common import storage
+from workers.executors import crewai_step_executor as executor
+
+
+def _use_filesystem(monkeypatch, tmp_path, inline_max_bytes: int = 256):
+    monkeypatch.setattr(storage.artifact_store, "backend", "filesystem")
+    monkeypatch.setattr(storage.artifact_store, "fs_root", str(tmp_path))
+    monkeypatch.setattr(storage, "ARTIFACT_INLINE_MAX_BYTES", inline_max_bytes)
+
+
+def test_small_payload_stays_inline(monkeypatch, tmp_path):
+    _use_filesystem(monkeypatch, tmp_path)
+
+    placement = storage.place_artifact({"ranked_items": []})
+
+    assert placement["storage_backend"] == "inline"
+    assert placement["storage_key"] is None
+    assert json.loads(placement["inline_json"]) == {"ranked_items": []}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_large_payload_is_compressed_to_object_storage(monkeypatch, tmp_path):
+    _use_filesystem(monkeypatch, tmp_path)
+    payload = {"product_candidates": [{"sku": f"zara-dre-{idx}", "title": "Zara Navy Midi Dress"} for idx in range(200)]}
+
+    placement = storage.place_artifact(payload)
+
+    assert placement["storage_backend"] == "filesystem"
+    assert placement["inline_json"] is None
+    assert placement["storage_key"] == f"blobs/{placement['content_hash'][:2]}/{placement['content_hash']}.json.zst"
+    stored = (tmp_path / placement["storage_key"]).read_bytes()
+    assert len(stored) < len(json.dumps(payload)) / 5
+    assert json.loads(zstandard.ZstdDecompressor().decompress(stored)) == payload
+    assert storage.get_json_artifact("filesystem", placement["storage_key"]) == payload
+
+
+def test_get_artifact_reads_through_external_storage(monkeypatch, tmp_path):
+    _use_filesystem(monkeypatch, tmp_path, inline_max_bytes=0)
+    payload = {"ranked_items": [{"sku": "zara-dre-1", "score": 0.9}]}
+    placement = storage.place_artifact(payload)
+    monkeypatch.setattr(executor, "exec_one", lambda _query, _params: {**placement, "inline_json": None})
+
+    assert executor._get_artifact(uuid.uuid4(), "rank") == payload
+
+
+def test_run_context_loads_inputs_in_one_query(monkeypatch, tmp_path):
+    _use_filesystem(monkeypatch, tmp_path, inline_max_bytes=0)
+    user_id = uuid.uuid4()
+    brand_search = {"product_candidates": [{"sku": "zara-dre-1"}]}
+    placement = storage.place_artifact(brand_search)
+    queries = []
+
+    def fake_exec_one(query, params):
+        queries.append(params)
+        return {
+            "run_id": params["run_id"],
+            "user_id": user_id,
+            "user_email": "a@example.com",
+            "folder_id": "folder-1",
+            "folder_name": "Outfits",
+            "artifacts": json.dumps(
+                {
+                    "style_brief": {"inline_json": {"palette": ["navy"]}, "storage_backend": "inline"},
+                    "brand_search": {**placement, "inline_json": None},
+                }
+            ),
+        }
+
+    monkeypatch.setattr(executor, "exec_one", fake_exec_one)
+
+    ctx = executor._load_run_context(uuid.uuid4(), "RANK")
+
+    assert len(queries) == 1
+    assert queries[0]["kinds"] == ["style_brief", "brand_search"]
+    assert ctx.user_id == user_id
+    assert ctx.folder == {"folder_id": "folder-1", "folder_name": "Outfits"}
+    assert ctx.artifact("style_brief") == {"palette": ["navy"]}
+    assert ctx.artifact("brand_search") == brand_search
+    assert ctx.artifact("deals") == {}
+
+
+def test_filesystem_keys_cannot_escape_root(monkeypatch, tmp_path):
+    _use_filesystem(monkeypatch, tmp_path)
+    with pytest.raises(ValueError, match="escapes"):
+        storage.get_json_artifact("filesystem", "../outside.json.zst")
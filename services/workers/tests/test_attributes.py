@@ -0,0 +1,57 @@
+import random
+import re
+
+from workers.common.attributes import COLORS, TitleAttributes, extract_attributes, guess_color
+from workers.executors import crewai_step_executor as executor
+
+
+def _legacy_guess_color(title: str, palette: list[str]) -> str:
+    text = (title or "").lower()
+    palette_norm = [str(color).strip().lower() for color in palette if str(color).strip()]
+    for color in palette_norm:
+        if color and color in text:
+            return color
+    for color in COLORS:
+        if re.search(rf"\b{re.escape(color)}\b", text):
+            return color
+    return palette_norm[0] if palette_norm else "neutral"
+
+
+def test_one_pass_extracts_every_attribute():
+    attributes = extract_attributes("Zara Women's Navy Linen Midi Shirt Dress - Size 8, Petite")
+
+    assert attributes == TitleAttributes(
+        colors=("navy",), category="dress", gender="women", materials=("linen",), sizes=("8", "petite")
+    )
+    assert extract_attributes("MEN'S Black/Olive Faux Leather Bomber Jacket XL") == TitleAttributes(
+        colors=("black", "olive"), category="outerwear", gender="men", materials=("faux leather",), sizes=("xl",)
+    )
+    # Whole words only: no "men" inside "women", no "tan" inside "tank", no "red" inside "tailored".
+    assert extract_attributes("Tailored Womenswear Tank").colors == ()
+    assert extract_attributes("Tailored Womenswear Tank").gender == ""
+    assert extract_attributes("") == TitleAttributes()
+
+
+def test_color_guess_matches_the_previous_regex_loop():
+    rng = random.Random(5)
+    words = ["Navy", "dark-navy", "Bluetooth", "red", "tailored", "Grey", "off", "white", "cream", "linen", "dress"]
+    palettes = [[], ["navy"], ["Red", "black"], ["tailored"], [" ", "cream"]]
+    for _ in range(2000):
+        title = " ".join(rng.choice(words) for _ in range(rng.randint(0, 5)))
+        palette = rng.choice(palettes)
+        assert guess_color(title, palette) == _legacy_guess_color(title, palette)
+
+
+def test_catalog_rows_carry_title_attributes():
+    row = executor._catalog_row(
+        "COS",
+        "top",
+        "women",
+        0,
+        {"title": "Ribbed Cotton Tank Top in Cream", "link": "https://example.com/tank", "extracted_price": 25.0},
+    )
+    candidate = executor._catalog_candidate(row, "COS", "top", "COS top women", ["navy"], 100, 0.0)
+
+    assert row["color"] == "cream"
+    assert row["attributes"] == {"category": "top", "gender": "", "materials": ["knit", "cotton"], "sizes": []}
+    assert candidate["attributes"] == row["attributes"]
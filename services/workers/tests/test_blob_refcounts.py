@@ -0,0 +1,176 @@
+"""Blob refcounts, memos and the GC against a real Postgres (skipped unless TEST_DATABASE_URL is set)."""
+
+import uuid
+
+from workers.common import storage
+from workers.executors import crewai_step_executor as executor
+
+PAYLOAD = {"ranked_items": [{"sku": f"sku-{idx}", "title": "Navy Midi Dress"} for idx in range(40)]}
+
+
+def _new_run(db) -> str:
+    user = db.exec_one(
+        "INSERT INTO users (email) VALUES (:email) RETURNING id", {"email": f"{uuid.uuid4().hex}@example.com"}
+    )
+    run = db.exec_one(
+        "INSERT INTO runs (user_id, trigger) VALUES (:user_id, 'manual') RETURNING id", {"user_id": user["id"]}
+    )
+    return str(run["id"])
+
+
+def _run_rank(db, run_id: str) -> dict:
+    step = db.exec_one(
+        """
+        INSERT INTO run_steps (run_id, step_index, step_key, agent_key, status)
+        VALUES (:run_id, 3, 'RANK', 'ranker', 'QUEUED')
+        RETURNING id
+        """,
+        {"run_id": run_id},
+    )
+    return executor.execute_step_impl(str(step["id"]), run_id, "RANK")
+
+
+def _blob(db) -> dict | None:
+    return db.exec_one("SELECT refcount, storage_key FROM artifact_blobs", {})
+
+
+def _use_storage(monkeypatch, tmp_path, computed: list):
+    monkeypatch.setattr(storage.artifact_store, "backend", "filesystem")
+    monkeypatch.setattr(storage.artifact_store, "fs_root", str(tmp_path))
+    monkeypatch.setattr(storage, "ARTIFACT_INLINE_MAX_BYTES", 0)
+    monkeypatch.setattr(executor, "ARTIFACT_BLOB_GC_GRACE_HOURS", 0)
+    monkeypatch.setattr(executor, "_step_memo_key", lambda _step_key, _ctx: "memo-1")
+    monkeypatch.setattr(executor, "_artifact_payload", lambda step_key, _ctx: computed.append(step_key) or PAYLOAD)
+
+
+def test_refcount_follows_commits_and_run_deletes(postgres, monkeypatch, tmp_path):
+    computed = []
+    _use_storage(monkeypatch, tmp_path, computed)
+    monkeypatch.setattr(executor, "_step_memo_key", lambda _step_key, _ctx: None)
+    first, second = _new_run(postgres), _new_run(postgres)
+
+    assert _run_rank(postgres, first)["status"] == "SUCCEEDED"
+    assert _run_rank(postgres, second)["status"] == "SUCCEEDED"
+    assert computed == ["RANK", "RANK"]
+    assert _blob(postgres)["refcount"] == 2
+
+    postgres.exec_write("DELETE FROM runs WHERE id=:run_id", {"run_id": first})
+    assert _blob(postgres)["refcount"] == 1
+    assert executor.collect_artifact_blobs_impl()["blobs"] == 0
+
+    postgres.exec_write("DELETE FROM runs WHERE id=:run_id", {"run_id": second})
+    storage_key = _blob(postgres)["storage_key"]
+    assert _blob(postgres)["refcount"] == 0
+    assert executor.collect_artifact_blobs_impl()["objects"] == 1
+    assert _blob(postgres) is None
+    assert not (tmp_path / storage_key).exists()
+
+
+def test_memo_keeps_its_blob_through_gc_until_it_expires(postgres, monkeypatch, tmp_path):
+    computed = []
+    _use_storage(monkeypatch, tmp_path, computed)
+    first = _new_run(postgres)
+    assert _run_rank(postgres, first)["memo"] == "MISS"
+    postgres.exec_write("DELETE FROM runs WHERE id=:run_id", {"run_id": first})
+
+    assert executor.collect_artifact_blobs_impl()["blobs"] == 0
+
+    second = _new_run(postgres)
+    result = _run_rank(postgres, second)
+    assert (result["status"], result["memo"]) == ("SUCCEEDED", "HIT")
+    assert computed == ["RANK"]
+    assert _blob(postgres)["refcount"] == 1
+    assert storage.get_json_artifact("filesystem", _blob(postgres)["storage_key"]) == PAYLOAD
+
+    postgres.exec_write("DELETE FROM runs WHERE id=:run_id", {"run_id": second})
+    postgres.exec_write("UPDATE step_memo SET created_at = created_at - INTERVAL '1000 hours'", {})
+    collected = executor.collect_artifact_blobs_impl()
+    assert (collected["memos"], collected["blobs"], collected["objects"]) == (1, 1, 1)
+
+
+def test_losing_commit_leaves_no_memo_and_its_upload_is_collected(postgres, monkeypatch, tmp_path):
+    computed = []
+    _use_storage(monkeypatch, tmp_path, computed)
+    run_id = _new_run(postgres)
+    monkeypatch.setattr(executor, "_claim_step", lambda _sid, _rid: True)
+
+    result = _run_rank(postgres, run_id)  # the step is still QUEUED, so the success commit matches nothing
+
+    assert result["status"] == "SKIPPED"
+    assert postgres.exec_one("SELECT count(*) AS n FROM step_memo", {})["n"] == 0
+    assert _blob(postgres)["refcount"] == 0
+    assert executor.collect_artifact_blobs_impl()["objects"] == 1
+
+
+def test_commit_references_the_blob_instead_of_copying_the_payload(postgres, monkeypatch, tmp_path):
+    computed = []
+    _use_storage(monkeypatch, tmp_path, computed)
+    run_id = _new_run(postgres)
+
+    _run_rank(postgres, run_id)
+
+    blob = postgres.exec_one("SELECT * FROM artifact_blobs", {})
+    artifact = postgres.exec_one("SELECT * FROM artifacts WHERE run_id=:run_id", {"run_id": run_id})
+    memo = postgres.exec_one("SELECT * FROM step_memo", {})
+    assert (blob["refcount"], blob["storage_backend"], blob["inline_json"]) == (1, "filesystem", None)
+    assert (artifact["kind"], artifact["blob_hash"]) == ("rank", blob["content_hash"])
+    assert artifact["inline_json"] is None and artifact["storage_key"] is None
+    assert (memo["step_key"], memo["memo_key"], memo["content_hash"]) == ("RANK", "memo-1", blob["content_hash"])
+    assert storage.get_json_artifact("filesystem", blob["storage_key"]) == PAYLOAD
+
+
+def test_rerun_bypasses_the_memo_and_refcounts_balance_after_gc(postgres, monkeypatch, tmp_path):
+    computed = []
+    _use_storage(monkeypatch, tmp_path, computed)
+    first, rerun = _new_run(postgres), _new_run(postgres)
+    postgres.exec_write(
+        "UPDATE runs SET rerun_from='RANK', parent_run_id=:first WHERE id=:rerun", {"first": first, "rerun": rerun}
+    )
+
+    assert _run_rank(postgres, first)["memo"] == "MISS"
+    assert _run_rank(postgres, rerun)["memo"] == "BYPASS"
+
+    assert computed == ["RANK", "RANK"]
+    assert _blob(postgres)["refcount"] == 2
+    assert postgres.exec_one("SELECT count(*) AS n FROM step_memo", {})["n"] == 1
+
+    postgres.exec_write("DELETE FROM runs WHERE id IN (:first, :rerun)", {"first": first, "rerun": rerun})
+    assert _blob(postgres)["refcount"] == 0
+    assert executor.collect_artifact_blobs_impl()["blobs"] == 0
+
+    third = _new_run(postgres)
+    assert _run_rank(postgres, third)["memo"] == "HIT"
+    assert computed == ["RANK", "RANK"]
+    assert _blob(postgres)["refcount"] == 1
+
+
+def test_gc_between_existence_check_and_commit_keeps_the_object(postgres, monkeypatch, tmp_path):
+    computed = []
+    _use_storage(monkeypatch, tmp_path, computed)
+    monkeypatch.setattr(executor, "_step_memo_key", lambda _step_key, _ctx: None)
+    monkeypatch.setattr(executor, "ARTIFACT_BLOB_GC_GRACE_HOURS", 1)
+    stored = storage.place_artifact(PAYLOAD)
+    postgres.exec_write(
+        """
+        INSERT INTO artifact_blobs (content_hash, storage_backend, storage_key, refcount, last_referenced_at)
+        VALUES (:content_hash, :storage_backend, :storage_key, 0, now() - INTERVAL '2 hours')
+        """,
+        stored,
+    )
+    run_id = _new_run(postgres)
+    step = postgres.exec_one(
+        """
+        INSERT INTO run_steps (run_id, step_index, step_key, agent_key, status)
+        VALUES (:run_id, 3, 'RANK', 'ranker', 'RUNNING')
+        RETURNING id
+        """,
+        {"run_id": run_id},
+    )
+
+    placement = storage.place_artifact(PAYLOAD, executor._artifact_blob_exists)
+    collected = executor.collect_artifact_blobs_impl()
+    assert executor._commit_step_success(str(step["id"]), run_id, "rank", placement)
+
+    assert collected["blobs"] == 0
+    assert _blob(postgres)["refcount"] == 1
+    assert storage.get_json_artifact("filesystem", placement["storage_key"]) == PAYLOAD
@@ -0,0 +1,127 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import urllib.parse
+
+import pytest
+
+from personal_stylist_common.drive_batch import (
+    DriveBatchClient,
+    DriveBatchError,
+    build_batch_body,
+    parse_batch_response,
+)
+from workers.executors import crewai_step_executor as executor
+
+
+class _FakeBatchServer:
+    """Answers Drive multipart batches: ids starting with ``missing`` get 404, ``flaky`` ids 503 on first sight."""
+
+    def __init__(self):
+        self.batches: list[list[str]] = []
+        self.seen: set[str] = set()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):  # noqa: N802
+                boundary = self.headers["Content-Type"].split("boundary=", 1)[1]
+                body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+                requests = []
+                for part in body.split(f"--{boundary}")[1:]:
+                    if part.startswith("--"):
+                        break
+                    head, _, request_line = part.strip().partition("\r\n\r\n")
+                    content_id = next(line for line in head.splitlines() if line.startswith("Content-ID"))
+                    path = request_line.split()[1]
+                    file_id = urllib.parse.unquote(path.split("?", 1)[0].rsplit("/", 1)[1])
+                    requests.append((content_id.split(":", 1)[1].strip().strip("<>"), file_id))
+                server.batches.append([file_id for _, file_id in requests])
+
+                out_boundary = "batch_response"
+                chunks = []
+                for content_id, file_id in requests:
+                    if file_id.startswith("missing"):
+                        status, payload = "404 Not Found", {"error": {"code": 404, "message": "File not found"}}
+                    elif file_id.startswith("flaky") and file_id not in server.seen:
+                        status, payload = "503 Service Unavailable", {"error": {"code": 503}}
+                    else:
+                        status, payload = "200 OK", {"id": file_id, "md5Checksum": f"md5-{file_id}"}
+                    server.seen.add(file_id)
+                    chunks.append(
+                        f"--{out_boundary}\r\nContent-Type: application/http\r\n"
+                        f"Content-ID: <response-{content_id}>\r\n\r\n"
+                        f"HTTP/1.1 {status}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                        f"{json.dumps(payload)}\r\n"
+                    )
+                chunks.append(f"--{out_boundary}--\r\n")
+                data = "".join(chunks).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/mixed; boundary={out_boundary}")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *_args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/batch/drive/v3"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._server.shutdown()
+
+
+@pytest.fixture
+def batch_server():
+    server = _FakeBatchServer()
+    yield server
+    server.close()
+
+
+def test_batches_group_up_to_100_files_per_call(batch_server):
+    client = DriveBatchClient(batch_server.url)
+    file_ids = [f"file-{idx}" for idx in range(250)]
+
+    results = client.get_files_metadata("token", file_ids, "id,md5Checksum")
+
+    assert [len(batch) for batch in batch_server.batches] == [100, 100, 50]
+    assert results["file-249"] == {"id": "file-249", "md5Checksum": "md5-file-249"}
+    assert set(results) == set(file_ids)
+
+
+def test_failed_parts_do_not_fail_the_batch(batch_server):
+    client = DriveBatchClient(batch_server.url)
+
+    results = client.get_files_metadata("token", ["file-1", "missing-1", "flaky-1"], "id,md5Checksum")
+
+    assert results["file-1"]["md5Checksum"] == "md5-file-1"
+    assert isinstance(results["missing-1"], DriveBatchError)
+    assert results["missing-1"].status == 404
+    # The 503 part is retried alone; the 404 is final.
+    assert batch_server.batches == [["file-1", "missing-1", "flaky-1"], ["flaky-1"]]
+    assert results["flaky-1"]["md5Checksum"] == "md5-flaky-1"
+
+
+def test_batch_body_round_trips_through_parser():
+    body = build_batch_body(["a/b", "c"], "id", "xyz").decode()
+
+    assert "GET /drive/v3/files/a%2Fb?fields=id&supportsAllDrives=true" in body
+    assert body.endswith("--xyz--\r\n")
+    parsed = parse_batch_response(
+        'multipart/mixed; boundary="r"',
+        b"--r\nContent-ID: <response-item-1>\n\nHTTP/1.1 200 OK\n\n{\"id\": \"c\"}\n--r--\n",
+    )
+    assert parsed == {1: (200, '{"id": "c"}')}
+
+
+def test_photos_without_checksums_are_backfilled_in_one_batch(monkeypatch, batch_server):
+    monkeypatch.setattr(executor, "drive_batch", DriveBatchClient(batch_server.url))
+    monkeypatch.setattr(executor, "_load_photo_features", lambda _photos: {})
+    monkeypatch.setattr(executor, "_download_drive_image", lambda _token, _file_id: None)
+    photos = [{"id": f"p-{idx}"} for idx in range(3)] + [{"id": "p-known", "md5Checksum": "abc"}]
+
+    executor._attach_photo_features("token", photos)
+
+    assert batch_server.batches == [["p-0", "p-1", "p-2"]]
+    assert [executor._photo_checksum(photo) for photo in photos] == ["md5-p-0", "md5-p-1", "md5-p-2", "abc"]
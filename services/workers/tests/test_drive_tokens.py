@@ -0,0 +1,146 @@
+from contextlib import contextmanager
+from datetime import timedelta
+import threading
+import time
+import types
+import uuid
+
+from personal_stylist_common import drive_tokens as module
+from personal_stylist_common.drive_tokens import DriveTokenManager
+
+
+class _FakeStore:
+    """Stands in for drive_connections: `_refresh` is replaced by a version that reads and writes this row."""
+
+    def __init__(self, access_token, token_expiry, refresh_token="refresh-1"):
+        self.row = {"access_token": access_token, "token_expiry": token_expiry, "refresh_token": refresh_token}
+        self.reads = 0
+        self.google_calls = 0
+        self.lock = threading.Lock()
+
+
+def _manager(store: _FakeStore, google_delay: float = 0.0, **kwargs) -> DriveTokenManager:
+    manager = DriveTokenManager("postgresql+psycopg://unused", "client", "secret", **kwargs)
+
+    def request_token(_refresh_token):
+        with store.lock:
+            store.google_calls += 1
+            calls = store.google_calls
+        time.sleep(google_delay)
+        return f"token-{calls}", module._utcnow() + timedelta(hours=1)
+
+    def refresh(key, force):
+        with store.lock:
+            store.reads += 1
+            row = dict(store.row)
+        fresh = manager._usable(row["token_expiry"]) and not (force and manager._due_for_refresh(row["token_expiry"]))
+        if fresh:
+            manager.prime(key, row["access_token"], row["token_expiry"])
+            return row["access_token"]
+        access_token, token_expiry = manager._request_token(row["refresh_token"])
+        with store.lock:
+            store.row.update(access_token=access_token, token_expiry=token_expiry)
+        manager.prime(key, access_token, token_expiry)
+        return access_token
+
+    manager._request_token = request_token
+    manager._refresh = refresh
+    return manager
+
+
+def test_concurrent_lookups_on_expired_token_refresh_once():
+    store = _FakeStore("stale", module._utcnow() - timedelta(minutes=5))
+    manager = _manager(store, google_delay=0.2)
+    user_id = uuid.uuid4()
+    results = []
+    barrier = threading.Barrier(10)
+
+    def lookup():
+        barrier.wait()
+        results.append(manager.get_token(user_id))
+
+    threads = [threading.Thread(target=lookup) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store.google_calls == 1
+    assert store.reads == 1
+    assert results == ["token-1"] * 10
+
+
+def test_cached_token_skips_database():
+    store = _FakeStore("valid", module._utcnow() + timedelta(hours=1))
+    manager = _manager(store)
+    user_id = uuid.uuid4()
+
+    assert [manager.get_token(user_id) for _ in range(5)] == ["valid"] * 5
+    assert store.reads == 1
+    assert store.google_calls == 0
+
+
+def test_primed_token_is_served_without_lookup():
+    store = _FakeStore("db-token", module._utcnow() + timedelta(hours=1))
+    manager = _manager(store)
+    user_id = uuid.uuid4()
+
+    manager.prime(user_id, "from-callback", module._utcnow() + timedelta(hours=1))
+
+    assert manager.get_token(user_id) == "from-callback"
+    assert store.reads == 0
+
+
+def test_token_near_expiry_is_returned_and_refreshed_in_background():
+    expiry = module._utcnow() + timedelta(minutes=2)
+    store = _FakeStore("soon-expiring", expiry)
+    manager = _manager(store, refresh_ahead_seconds=300)
+    user_id = uuid.uuid4()
+    manager.prime(user_id, "soon-expiring", expiry)
+
+    assert manager.get_token(user_id) == "soon-expiring"
+
+    deadline = time.monotonic() + 2
+    while manager._tokens[str(user_id)][0] != "token-1" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert manager.get_token(user_id) == "token-1"
+    assert store.google_calls == 1
+
+
+def test_unknown_user_returns_none(monkeypatch):
+    manager = DriveTokenManager("postgresql+psycopg://unused", "client", "secret")
+    monkeypatch.setattr(manager, "_refresh", lambda _key, force: None)
+
+    assert manager.get_token(uuid.uuid4()) is None
+
+
+class _FakeEngine:
+    """A pooled engine over one drive_connections row; counts the row-locking reads."""
+
+    def __init__(self, row):
+        self.row = row
+        self.locked_reads = 0
+
+    @contextmanager
+    def begin(self):
+        yield self
+
+    def execute(self, statement, _params):
+        if "FOR UPDATE" in str(statement):
+            self.locked_reads += 1
+        return types.SimpleNamespace(first=lambda: self.row)
+
+
+def test_unrefreshable_token_is_held_instead_of_relocking_the_row(monkeypatch):
+    engine = _FakeEngine(("stale", None, module._utcnow() - timedelta(minutes=5)))
+    manager = DriveTokenManager("postgresql+psycopg://unused", "client", "secret", unrefreshable_ttl_seconds=60)
+    manager._engine = engine
+    user_id = uuid.uuid4()
+
+    assert [manager.get_token(user_id) for _ in range(5)] == ["stale"] * 5
+    assert engine.locked_reads == 1
+
+    later = time.monotonic() + 61
+    monkeypatch.setattr(module.time, "monotonic", lambda: later)
+    assert manager.get_token(user_id) == "stale"
+    assert engine.locked_reads == 2
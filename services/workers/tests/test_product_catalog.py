@@ -0,0 +1,166 @@
+from datetime import timedelta
+import time
+
+import pytest
+
+from workers.common import catalog_snapshot
+from workers.executors import crewai_step_executor as executor
+
+STYLE = {"recommended_categories": ["dress"], "palette": ["navy"], "budget_max": 100}
+DEALS = {"deals": [{"brand": "Zara", "discount_pct": 15}, {"brand": "Mango", "discount_pct": 0}]}
+
+
+def _provider_rows(query: str) -> list[dict]:
+    brand = query.split()[0]
+    return [
+        {
+            "title": f"{brand} Navy Midi Dress - 20% off",
+            "link": f"https://example.com/{brand.lower()}-midi",
+            "source": brand,
+            "extracted_price": 80.0,
+            "extracted_old_price": 100.0,
+        },
+        {"title": f"{brand} Slip Dress", "link": f"https://example.com/{brand.lower()}-slip", "extracted_price": 45.0},
+        {"title": f"{brand} Gown", "link": f"https://example.com/{brand.lower()}-gown", "extracted_price": 900.0},
+        {"title": "", "link": "", "extracted_price": 10.0},
+    ]
+
+
+class _CatalogTables:
+    """In-memory product_catalog + product_catalog_segments behind the executor's two catalog queries."""
+
+    def __init__(self):
+        self.segments: dict[tuple, dict] = {}
+
+    def load(self, keys, fresh_after):
+        return {
+            key: [dict(item) for item in self.segments[key]["items"]]
+            for key in keys
+            if key in self.segments and self.segments[key]["refreshed_at"] > fresh_after
+        }
+
+    def store(self, fetched):
+        for key, query, items in fetched:
+            self.segments[key] = {"query": query, "items": items, "refreshed_at": executor._utcnow()}
+
+
+def _use_catalog(monkeypatch, tmp_path):
+    tables = _CatalogTables()
+    provider_queries = []
+    monkeypatch.setattr(executor, "PRODUCT_CATALOG_SNAPSHOT_PATH", str(tmp_path / "catalog.snap"))
+    monkeypatch.setattr(executor, "_load_catalog_segments", tables.load)
+    monkeypatch.setattr(executor, "_store_catalog_segments", tables.store)
+    monkeypatch.setattr(
+        executor,
+        "_serpapi_shopping_search",
+        lambda query, num=20: provider_queries.append(query) or _provider_rows(query),
+    )
+    return tables, provider_queries
+
+
+def test_repeat_brand_search_is_answered_from_catalog(monkeypatch, tmp_path):
+    tables, provider_queries = _use_catalog(monkeypatch, tmp_path)
+
+    live = executor._real_brand_search_payload(STYLE, DEALS)
+    cached = executor._real_brand_search_payload(STYLE, DEALS)
+
+    assert provider_queries == ["Zara dress", "Mango dress"]
+    assert live["catalog"] == {"segments": 2, "provider_queries": 2}
+    assert cached["catalog"] == {"segments": 2, "provider_queries": 0}
+    assert cached["product_candidates"] == live["product_candidates"]
+    # Over-budget and unusable rows are filtered per run, not dropped from the catalog.
+    assert [item["title"] for item in tables.segments[("zara", "dress", "")]["items"]] == [
+        "Zara Navy Midi Dress - 20% off",
+        "Zara Slip Dress",
+        "Zara Gown",
+    ]
+    slip = next(item for item in cached["product_candidates"] if item["title"] == "Zara Slip Dress")
+    assert slip["discount_pct"] == 15.0  # the run's deal hint, applied at read time
+    assert slip["color"] == "navy"
+
+
+def test_only_stale_segments_go_to_the_provider(monkeypatch, tmp_path):
+    tables, provider_queries = _use_catalog(monkeypatch, tmp_path)
+    executor._real_brand_search_payload(STYLE, DEALS)
+    tables.segments[("mango", "dress", "")]["refreshed_at"] -= timedelta(hours=executor.PRODUCT_CATALOG_TTL_HOURS + 1)
+    provider_queries.clear()
+
+    payload = executor._real_brand_search_payload(STYLE, DEALS)
+
+    assert provider_queries == ["Mango dress"]
+    assert payload["catalog"]["provider_queries"] == 1
+
+
+def test_each_gender_segment_keeps_its_own_catalog_rows(monkeypatch, tmp_path):
+    tables, _provider_queries = _use_catalog(monkeypatch, tmp_path)
+
+    executor._real_brand_search_payload({**STYLE, "gender": "female"}, DEALS)
+    executor._real_brand_search_payload({**STYLE, "gender": "male"}, DEALS)
+
+    women = {item["sku"] for item in tables.segments[("zara", "dress", "women")]["items"]}
+    men = {item["sku"] for item in tables.segments[("zara", "dress", "men")]["items"]}
+    # product_catalog upserts on sku; a shared sku would leave the men segment pointing at the women rows.
+    assert len(women) == len(men) == 3
+    assert not women & men
+
+
+def test_snapshot_serves_segments_without_postgres(monkeypatch, tmp_path):
+    tables, provider_queries = _use_catalog(monkeypatch, tmp_path)
+    executor._real_brand_search_payload(STYLE, DEALS)
+    rows = [
+        {key: item[key] for key in item if key not in {"brand"}}
+        for segment in tables.segments.values()
+        for item in segment["items"]
+    ]
+    segments = [
+        {"brand_key": key[0], "category": key[1], "gender": key[2], "refreshed_at": segment["refreshed_at"]}
+        for key, segment in tables.segments.items()
+    ]
+    catalog_snapshot.write_snapshot(executor.PRODUCT_CATALOG_SNAPSHOT_PATH, rows, segments)
+
+    def no_postgres(*_args):
+        raise AssertionError("snapshot hits must not query Postgres")
+
+    monkeypatch.setattr(executor, "_load_catalog_segments", no_postgres)
+    provider_queries.clear()
+
+    started = time.perf_counter()
+    found = executor._fresh_catalog_segments([("zara", "dress", ""), ("mango", "dress", "")], max_price=220)
+    elapsed = time.perf_counter() - started
+
+    assert provider_queries == []
+    assert [item["title"] for item in found[("zara", "dress", "")]] == [
+        "Zara Navy Midi Dress - 20% off",
+        "Zara Slip Dress",
+    ]
+    assert elapsed < 0.05
+
+
+def test_snapshot_inverted_indexes_intersect(tmp_path):
+    path = str(tmp_path / "catalog.snap")
+    rows = [
+        {"sku": "a", "brand_key": "zara", "category": "dress", "color": "navy", "gender": "", "price_band": 3},
+        {"sku": "b", "brand_key": "zara", "category": "top", "color": "navy", "gender": "", "price_band": 1},
+        {"sku": "c", "brand_key": "mango", "category": "dress", "color": "black", "gender": "women", "price_band": 1},
+    ]
+    catalog_snapshot.write_snapshot(path, rows, [])
+
+    snapshot = catalog_snapshot.load_snapshot(path)
+
+    assert [row["sku"] for row in snapshot.find(color="navy")] == ["a", "b"]
+    assert [row["sku"] for row in snapshot.find(category="dress", price_band=range(2))] == ["c"]
+    assert snapshot.find(brand_key="zara", gender="women") == []
+    assert catalog_snapshot.load_snapshot(path) is snapshot
+    catalog_snapshot.write_snapshot(path, rows[:1], [])
+    assert len(catalog_snapshot.load_snapshot(path)) == 1
+
+
+def test_canceled_run_stops_before_the_next_provider_call(monkeypatch, tmp_path):
+    _tables, provider_queries = _use_catalog(monkeypatch, tmp_path)
+    statuses = iter(["RUNNING", "CANCELED"])
+    monkeypatch.setattr(executor, "exec_one", lambda _query, _params: {"status": next(statuses)})
+
+    with pytest.raises(executor.RunCanceled):
+        executor._real_brand_search_payload(STYLE, DEALS, run_id="run-1")
+
+    assert provider_queries == ["Zara dress"]
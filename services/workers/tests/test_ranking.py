@@ -0,0 +1,88 @@
+import random
+import uuid
+
+import numpy as np
+import pytest
+
+from workers.common import ranking
+from workers.executors import crewai_step_executor as executor
+
+
+def _legacy_rank(candidates: list[dict], style: dict) -> list[dict]:
+    palette = {str(color).lower() for color in (style.get("palette") or [])}
+    budget_max = float(style.get("budget_max") or 150)
+    ranked_items = []
+    for candidate in candidates:
+        sale_price = float(candidate.get("sale_price", candidate.get("price", 0)))
+        discount_pct = float(candidate.get("discount_pct", 0))
+        palette_bonus = 0.1 if str(candidate.get("color", "")).lower() in palette else 0.0
+        budget_score = max(0.0, 1.0 - (sale_price / max(budget_max, 1.0)))
+        deal_score = min(discount_pct / 50.0, 1.0)
+        score = round((budget_score * 0.45) + (deal_score * 0.45) + palette_bonus, 4)
+        ranked_items.append({**candidate, "score": score})
+    ranked_items.sort(key=lambda item: item["score"], reverse=True)
+    return ranked_items[:10]
+
+
+def _candidates(count: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "sku": f"sku-{idx}",
+            "brand": rng.choice(["Zara", "Mango", "COS"]),
+            "category": rng.choice(["dress", "top", "bottom"]),
+            "color": rng.choice(["Navy", "black", "cream", "red"]),
+            # Coarse values so many candidates tie and tie-breaking is exercised.
+            "sale_price": float(rng.choice([20, 45, 80, 120, 200])),
+            "discount_pct": float(rng.choice([0, 10, 25, 50, 70])),
+        }
+        for idx in range(count)
+    ]
+
+
+def test_default_weights_match_the_original_loop():
+    style = {"palette": ["navy", "cream"], "budget_max": 120}
+    candidates = _candidates(2000)
+
+    assert ranking.rank_candidates(candidates, style, ranking.DEFAULT_RANK_WEIGHTS) == _legacy_rank(candidates, style)
+
+
+def test_rank_payload_uses_the_scorer(monkeypatch, tmp_path):
+    monkeypatch.setattr(executor, "PRODUCT_STYLE_INDEX_PATH", str(tmp_path / "no-index"))
+    style = {"palette": ["navy"], "budget_max": 100}
+    candidates = _candidates(50)
+    ctx = executor.RunContext(
+        run_id=uuid.uuid4(),
+        user_id=uuid.uuid4(),
+        artifacts={"style_brief": style, "brand_search": {"product_candidates": candidates}},
+    )
+
+    assert executor._rank_payload(ctx) == {"ranked_items": _legacy_rank(candidates, style)}
+
+
+def test_top_k_keeps_input_order_on_ties():
+    scores = np.array([0.5, 0.9, 0.5, 0.9, 0.1, 0.5])
+
+    assert ranking.top_k(scores, 3).tolist() == [1, 3, 0]
+    assert ranking.top_k(scores, 10).tolist() == [1, 3, 0, 2, 5, 4]
+    assert ranking.top_k(scores, 0).tolist() == []
+
+
+def test_batch_scoring_matches_per_run_scoring():
+    runs = [
+        (_candidates(300, seed=1), {"palette": ["red"], "budget_max": 60, "recommended_brands": ["Mango"]}),
+        ([], {"palette": ["navy"]}),
+        (_candidates(300, seed=2), {"palette": ["black"], "budget_max": 250, "recommended_categories": ["top"]}),
+    ]
+    weights = ranking.parse_weights("budget=0.3,discount=0.3,palette=0.1,brand_affinity=0.2,category=0.1")
+
+    batched = ranking.rank_batch(runs, weights, k=5)
+
+    assert batched == [ranking.rank_candidates(candidates, style, weights, k=5) for candidates, style in runs]
+    assert all(item["brand"] == "Mango" for item in batched[0][:3])
+    assert batched[1] == []
+
+
+def test_unknown_weight_is_rejected():
+    with pytest.raises(ValueError, match="Unknown rank feature"):
+        ranking.parse_weights("vibes=1")
@@ -0,0 +1,101 @@
+import uuid
+
+from workers.executors import crewai_step_executor as executor
+
+
+def _stub_step(monkeypatch, claimed=True, committed=True, placement=None):
+    calls = []
+    placement = placement or {"content_hash": "h", "storage_backend": "inline", "inline_json": "{}"}
+    monkeypatch.setattr(executor, "_claim_step", lambda _sid, _rid: calls.append("claim") or claimed)
+    monkeypatch.setattr(
+        executor,
+        "_load_run_context",
+        lambda rid, _step_key: calls.append("context") or executor.RunContext(run_id=rid, user_id=uuid.uuid4()),
+    )
+    monkeypatch.setattr(executor, "_artifact_payload", lambda _step_key, _ctx: {"ranked_items": []})
+    monkeypatch.setattr(
+        executor,
+        "place_artifact",
+        lambda payload, _blob_exists: placement,
+    )
+    monkeypatch.setattr(
+        executor,
+        "_commit_step_success",
+        lambda _sid, _rid, kind, _placement, _memo=None: calls.append(f"commit:{kind}") or committed,
+    )
+    monkeypatch.setattr(executor, "exec_write", lambda _query, _params: calls.append("write") or 1)
+    return calls
+
+
+def test_step_commits_artifact_and_status_together(monkeypatch):
+    calls = _stub_step(monkeypatch)
+
+    result = executor.execute_step_impl(str(uuid.uuid4()), str(uuid.uuid4()), "RANK")
+
+    assert result["status"] == "SUCCEEDED"
+    assert calls == ["claim", "context", "commit:rank"]
+
+
+def test_step_skips_when_claim_fails(monkeypatch):
+    calls = _stub_step(monkeypatch, claimed=False)
+
+    result = executor.execute_step_impl(str(uuid.uuid4()), str(uuid.uuid4()), "RANK")
+
+    assert result["status"] == "SKIPPED"
+    assert calls == ["claim"]
+
+
+def test_step_discards_result_when_another_attempt_finished_first(monkeypatch):
+    calls = _stub_step(monkeypatch, committed=False)
+
+    result = executor.execute_step_impl(str(uuid.uuid4()), str(uuid.uuid4()), "RANK")
+
+    assert result["status"] == "SKIPPED"
+    assert "write" not in calls
+
+
+def test_uncommitted_upload_is_handed_to_the_blob_gc(monkeypatch):
+    placement = {
+        "content_hash": "h",
+        "size_bytes": 40000,
+        "storage_backend": "minio",
+        "storage_key": "blobs/h/h.json.zst",
+        "inline_json": None,
+    }
+    _stub_step(monkeypatch, committed=False, placement=placement)
+    released = []
+    monkeypatch.setattr(executor, "exec_write", lambda query, params: released.append((query, params)) or 1)
+
+    result = executor.execute_step_impl(str(uuid.uuid4()), str(uuid.uuid4()), "RANK")
+
+    assert result["status"] == "SKIPPED"
+    # No artifact references the object, so it is registered unreferenced for the GC instead of leaking.
+    [(_query, params)] = released
+    assert params["storage_key"] == "blobs/h/h.json.zst"
+
+
+def test_step_of_a_canceled_run_stops_without_failing(monkeypatch):
+    calls = _stub_step(monkeypatch)
+
+    def canceled(_step_key, _ctx):
+        raise executor.RunCanceled("run was canceled")
+
+    monkeypatch.setattr(executor, "_artifact_payload", canceled)
+
+    result = executor.execute_step_impl(str(uuid.uuid4()), str(uuid.uuid4()), "BRAND_SEARCH")
+
+    assert result["status"] == "CANCELED"
+    assert calls == ["claim", "context"]
+
+
+def test_step_canceled_after_computing_skips_the_upload(monkeypatch):
+    calls = _stub_step(monkeypatch)
+    monkeypatch.setattr(
+        executor, "exec_one", lambda query, _params: {"status": "CANCELED"} if "FROM runs" in query else None
+    )
+    monkeypatch.setattr(executor, "place_artifact", lambda _payload, _blob_exists: calls.append("upload"))
+
+    result = executor.execute_step_impl(str(uuid.uuid4()), str(uuid.uuid4()), "RANK")
+
+    assert result["status"] == "CANCELED"
+    assert calls == ["claim", "context"]
@@ -0,0 +1,153 @@
+from datetime import timedelta
+import json
+import uuid
+
+from workers.executors import crewai_step_executor as executor
+
+STYLE = {"recommended_brands": ["Zara", "Mango"], "recommended_categories": ["dress"], "palette": ["navy"]}
+
+
+class _MemoTable:
+    """step_memo joined to artifact_blobs; blobs appear when a step commits its placement."""
+
+    def __init__(self):
+        self.rows: dict[tuple, dict] = {}
+        self.blobs: dict[str, dict] = {}
+
+    def exec_one(self, query, params):
+        if "FROM runs" in query:
+            return {"status": "RUNNING"}
+        row = self.rows.get((params["step_key"], params["memo_key"]))
+        if row and row["created_at"] > params["min_created_at"] and row["content_hash"] in self.blobs:
+            blob = self.blobs[row["content_hash"]]
+            return {**blob, "inline_json": json.loads(blob["inline_json"])}
+        return None
+
+    def commit(self, placement, memo):
+        self.blobs.setdefault(placement["content_hash"], placement)
+        if memo:
+            self.rows[memo] = {"content_hash": placement["content_hash"], "created_at": executor._utcnow()}
+
+
+def _run_step(
+    monkeypatch, step_key: str, artifacts: dict, finished: bool = True, rerun_from: str | None = None
+) -> tuple[dict, list]:
+    computed, committed = [], []
+    payload_fn = executor._artifact_payload
+    table = executor.exec_one.__self__
+    monkeypatch.setattr(executor, "_claim_step", lambda _sid, _rid: True)
+    monkeypatch.setattr(
+        executor,
+        "_load_run_context",
+        lambda rid, _step_key: executor.RunContext(
+            run_id=rid, user_id=uuid.uuid4(), artifacts=artifacts, rerun_from=rerun_from
+        ),
+    )
+    monkeypatch.setattr(executor, "_artifact_payload", lambda key, ctx: computed.append(key) or payload_fn(key, ctx))
+
+    def commit(_sid, _rid, _kind, placement, memo=None):
+        if not finished:
+            return False
+        table.commit(placement, memo)
+        committed.append(placement)
+        return True
+
+    monkeypatch.setattr(executor, "_commit_step_success", commit)
+    result = executor.execute_step_impl(str(uuid.uuid4()), str(uuid.uuid4()), step_key)
+    return result, computed + committed
+
+
+def _use_memo(monkeypatch) -> _MemoTable:
+    table = _MemoTable()
+    monkeypatch.setattr(executor, "exec_one", table.exec_one)
+    monkeypatch.setattr(executor, "exec_write", lambda _query, _params: 1)
+    monkeypatch.setattr(executor, "PRODUCT_DATA_MODE", "mock")
+    return table
+
+
+def test_identical_inputs_reuse_the_artifact_across_runs(monkeypatch):
+    _use_memo(monkeypatch)
+    rank = {"ranked_items": [{"sku": "a", "brand": "Zara", "title": "Dress", "sale_price": 40.0}]}
+
+    first, first_calls = _run_step(monkeypatch, "CHECKOUT_DRAFT", {"rank": rank})
+    second, second_calls = _run_step(monkeypatch, "CHECKOUT_DRAFT", {"rank": rank})
+    changed, changed_calls = _run_step(monkeypatch, "CHECKOUT_DRAFT", {"rank": {"ranked_items": []}})
+
+    assert (first["memo"], second["memo"], changed["memo"]) == ("MISS", "HIT", "MISS")
+    assert first_calls[0] == "CHECKOUT_DRAFT"
+    assert "CHECKOUT_DRAFT" not in second_calls
+    assert second_calls[0]["content_hash"] == first_calls[1]["content_hash"]
+    assert json.loads(second_calls[0]["inline_json"]) == json.loads(first_calls[1]["inline_json"])
+    assert changed_calls[0] == "CHECKOUT_DRAFT"
+
+
+def test_deals_memo_expires_after_its_ttl(monkeypatch):
+    table = _use_memo(monkeypatch)
+    _run_step(monkeypatch, "DEALS", {"style_brief": STYLE})
+    assert _run_step(monkeypatch, "DEALS", {"style_brief": {**STYLE, "palette": ["red"]}})[0]["memo"] == "HIT"
+
+    for row in table.rows.values():
+        row["created_at"] -= timedelta(hours=executor.STEP_MEMO_TTL_HOURS["DEALS"] + 1)
+
+    assert _run_step(monkeypatch, "DEALS", {"style_brief": STYLE})[0]["memo"] == "MISS"
+
+
+def test_provider_fallbacks_and_unmemoized_steps_are_not_stored(monkeypatch):
+    table = _use_memo(monkeypatch)
+    monkeypatch.setattr(executor, "_deals_payload", lambda _ctx: {"deals": [], "data_mode": "mock_fallback"})
+
+    deals, _calls = _run_step(monkeypatch, "DEALS", {"style_brief": STYLE})
+    search, _calls = _run_step(monkeypatch, "BRAND_SEARCH", {"style_brief": STYLE, "deals": {}})
+
+    assert deals["memo"] == "MISS"
+    assert "memo" not in search
+    assert table.rows == {}
+
+
+def test_memo_is_recorded_only_when_the_artifact_commits(monkeypatch):
+    table = _use_memo(monkeypatch)
+    rank = {"ranked_items": []}
+
+    skipped, _calls = _run_step(monkeypatch, "TRYON", {"rank": rank}, finished=False)
+    committed, _calls = _run_step(monkeypatch, "TRYON", {"rank": rank})
+
+    assert skipped["status"] == "SKIPPED"
+    assert committed["memo"] == "MISS"
+    assert len(table.rows) == 1
+
+
+def test_memo_key_depends_on_inputs_and_version(monkeypatch):
+    ctx = executor.RunContext(run_id=uuid.uuid4(), user_id=uuid.uuid4(), artifacts={"rank": {"ranked_items": []}})
+    other_run = executor.RunContext(run_id=uuid.uuid4(), user_id=uuid.uuid4(), artifacts=ctx.artifacts)
+
+    key = executor._step_memo_key("TRYON", ctx)
+
+    assert key == executor._step_memo_key("TRYON", other_run)
+    assert key != executor._step_memo_key("CHECKOUT_DRAFT", ctx)
+    assert executor._step_memo_key("STYLE_BRIEF", ctx) is None
+    monkeypatch.setattr(executor, "STEP_MEMO_VERSION", "2")
+    assert executor._step_memo_key("TRYON", ctx) != key
+
+
+def test_code_changes_invalidate_memo_keys(monkeypatch):
+    ctx = executor.RunContext(run_id=uuid.uuid4(), user_id=uuid.uuid4(), artifacts={"rank": {"ranked_items": []}})
+    key = executor._step_memo_key("TRYON", ctx)
+    assert executor.STEP_MEMO_CODE_VERSION.startswith(executor._source_digest(executor.STEP_MEMO_CODE_MODULES))
+
+    monkeypatch.setattr(executor, "STEP_MEMO_CODE_VERSION", "deploy-2")
+
+    assert executor._step_memo_key("TRYON", ctx) != key
+
+
+def test_rerun_recomputes_and_refreshes_the_memo(monkeypatch):
+    table = _use_memo(monkeypatch)
+    rank = {"ranked_items": []}
+    _run_step(monkeypatch, "TRYON", {"rank": rank})
+
+    rerun, calls = _run_step(monkeypatch, "TRYON", {"rank": rank}, rerun_from="TRYON")
+    after, after_calls = _run_step(monkeypatch, "TRYON", {"rank": rank})
+
+    assert rerun["memo"] == "BYPASS"
+    assert calls[0] == "TRYON"
+    assert after["memo"] == "HIT" and "TRYON" not in after_calls
+    assert len(table.rows) == 1
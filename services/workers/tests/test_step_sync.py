@@ -29,3 +29,18 @@ def test_locked_step_definitions_are_synced():
 
     assert api_steps == orchestrator_steps == common_steps
     assert [step_key for step_key, _ in api_steps] == runtime_task_keys
+
+
+def test_executor_step_inputs_match_task_specs():
+    tree = ast.parse((ROOT / "packages/crewai_runtime/personal_stylist_crewai/tasks.py").read_text())
+    runtime_inputs = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and getattr(node.func, "id", None) == "TaskSpec":
+            kwargs = {kw.arg: ast.literal_eval(kw.value) for kw in node.keywords if kw.arg in {"key", "requires_inputs"}}
+            runtime_inputs[kwargs["key"]] = kwargs.get("requires_inputs", ())
+
+    executor_inputs = _load_assignment(
+        ROOT / "services/workers/workers/executors/crewai_step_executor.py", "STEP_REQUIRES_INPUTS"
+    )
+
+    assert executor_inputs == runtime_inputs
@@ -1,32 +1,40 @@
-from pathlib import Path
-import sys
-import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
 import uuid
 
 import pytest
 
-sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from workers.executors import crewai_step_executor as executor
 
-if "PIL" not in sys.modules:
-    pil_module = types.ModuleType("PIL")
-    pil_module.Image = types.SimpleNamespace(Image=object, open=lambda *_args, **_kwargs: None)
-    sys.modules["PIL"] = pil_module
 
-if "workers.common.db" not in sys.modules:
-    db_module = types.ModuleType("workers.common.db")
-    db_module.exec_one = lambda *_args, **_kwargs: None
-    db_module.exec_write = lambda *_args, **_kwargs: 0
-    sys.modules["workers.common.db"] = db_module
+OUTFITS_FOLDER = {"folder_id": "folder-1", "folder_name": "Outfits"}
 
-from workers.executors import crewai_step_executor as executor  # noqa: E402
 
+class _FakeDriveTokens:
+    def __init__(self):
+        self.tokens = {}
 
-def test_style_brief_onboarding_when_drive_not_connected(monkeypatch):
-    monkeypatch.setattr(executor, "_get_run_user", lambda _run_id: uuid.uuid4())
-    monkeypatch.setattr(executor, "_ensure_drive_access_token", lambda _user_id: None)
-    monkeypatch.setattr(executor, "_get_selected_drive_folder", lambda _user_id: None)
+    def get_token(self, user_id):
+        return self.tokens.get(user_id)
+
+
+@pytest.fixture(autouse=True)
+def drive_tokens(monkeypatch):
+    fake = _FakeDriveTokens()
+    monkeypatch.setattr(executor, "drive_tokens", fake)
+    return fake
+
+
+def _run_context(user_id=None, access_token=None, folder=None, artifacts=None):
+    ctx = executor.RunContext(run_id=uuid.uuid4(), user_id=user_id or uuid.uuid4(), folder=folder, artifacts=artifacts or {})
+    if access_token:
+        executor.drive_tokens.tokens[ctx.user_id] = access_token
+    return ctx
 
-    payload = executor._style_brief_payload(uuid.uuid4())
+
+def test_style_brief_onboarding_when_drive_not_connected(monkeypatch):
+    payload = executor._style_brief_payload(_run_context())
 
     assert payload["analysis_method"] == "none"
     assert payload["requires_drive_connection"] is True
@@ -56,27 +64,21 @@ def test_style_brief_uses_multimodal_path(monkeypatch):
     }
     captured = {}
 
-    monkeypatch.setattr(executor, "_get_run_user", lambda _run_id: user_id)
-    monkeypatch.setattr(executor, "_ensure_drive_access_token", lambda _user_id: "token-123")
-    monkeypatch.setattr(
-        executor,
-        "_get_selected_drive_folder",
-        lambda _user_id: {"folder_id": "folder-1", "folder_name": "Outfits"},
-    )
     monkeypatch.setattr(executor, "_drive_list_images", lambda _token, _folder_id, limit=40: photos)
+    monkeypatch.setattr(executor, "_attach_photo_features", lambda _token, _photos: {})
     monkeypatch.setattr(
         executor,
         "_prepare_images_for_multimodal_analysis",
-        lambda _token, _photos, max_images=4: prepared,
+        lambda _token, _photos, max_images=4, downloaded=None: prepared,
     )
 
-    def fake_llm(images):
+    def fake_llm(images, deadline=None):
         captured["images"] = images
         return llm_style
 
     monkeypatch.setattr(executor, "_call_multimodal_style_agent", fake_llm)
 
-    payload = executor._style_brief_payload(uuid.uuid4())
+    payload = executor._style_brief_payload(_run_context(user_id, "token-123", OUTFITS_FOLDER))
 
     assert payload["analysis_method"] == "multimodal_llm"
     assert payload["source"] == "google_drive"
@@ -90,26 +92,20 @@ def test_style_brief_falls_back_when_multimodal_errors(monkeypatch):
     photos = [{"id": "p-1", "name": "look-1.jpg"}]
     prepared = [{"id": "p-1", "name": "look-1.jpg", "data_uri": "data:image/jpeg;base64,AAAA"}]
 
-    monkeypatch.setattr(executor, "_get_run_user", lambda _run_id: user_id)
-    monkeypatch.setattr(executor, "_ensure_drive_access_token", lambda _user_id: "token-123")
-    monkeypatch.setattr(
-        executor,
-        "_get_selected_drive_folder",
-        lambda _user_id: {"folder_id": "folder-1", "folder_name": "Outfits"},
-    )
     monkeypatch.setattr(executor, "_drive_list_images", lambda _token, _folder_id, limit=40: photos)
+    monkeypatch.setattr(executor, "_attach_photo_features", lambda _token, _photos: {})
     monkeypatch.setattr(
         executor,
         "_prepare_images_for_multimodal_analysis",
-        lambda _token, _photos, max_images=4: prepared,
+        lambda _token, _photos, max_images=4, downloaded=None: prepared,
     )
     monkeypatch.setattr(
         executor,
         "_call_multimodal_style_agent",
-        lambda _images: (_ for _ in ()).throw(RuntimeError("vision-model-unavailable")),
+        lambda _images, deadline=None: (_ for _ in ()).throw(RuntimeError("vision-model-unavailable")),
     )
 
-    def fake_fallback(access_token, folder, photos, reason):
+    def fake_fallback(access_token, folder, photos, reason, signals=None):
         return {
             "analysis_method": "heuristic_fallback",
             "photo_count": len(photos),
@@ -120,7 +116,7 @@ def test_style_brief_falls_back_when_multimodal_errors(monkeypatch):
 
     monkeypatch.setattr(executor, "_style_brief_fallback", fake_fallback)
 
-    payload = executor._style_brief_payload(uuid.uuid4())
+    payload = executor._style_brief_payload(_run_context(user_id, "token-123", OUTFITS_FOLDER))
 
     assert payload["analysis_method"] == "heuristic_fallback"
     assert payload["photo_count"] == 1
@@ -129,6 +125,125 @@ def test_style_brief_falls_back_when_multimodal_errors(monkeypatch):
     assert "vision-model-unavailable" in payload["reason"]
 
 
+def test_style_brief_returns_speculative_fallback_at_llm_deadline(monkeypatch):
+    release = threading.Event()
+    heuristic_calls = []
+    photos = [{"id": "p-1", "name": "party-night.jpg"}]
+    prepared = [{"id": "p-1", "name": "party-night.jpg", "data_uri": "data:image/jpeg;base64,AAAA"}]
+
+    monkeypatch.setattr(executor, "STYLE_BRIEF_LLM_DEADLINE_SECONDS", 0.3)
+    monkeypatch.setattr(executor, "_drive_list_images", lambda _token, _folder_id, limit=40: photos)
+    monkeypatch.setattr(executor, "_attach_photo_features", lambda _token, _photos: {})
+    monkeypatch.setattr(
+        executor,
+        "_prepare_images_for_multimodal_analysis",
+        lambda _token, _photos, max_images=4, downloaded=None: prepared,
+    )
+    monkeypatch.setattr(
+        executor, "_call_multimodal_style_agent", lambda _images, deadline=None: release.wait(5) or {}
+    )
+    monkeypatch.setattr(executor, "_extract_palette", lambda _token, _photos: heuristic_calls.append(1) or ["black"])
+
+    started = executor.time.monotonic()
+    try:
+        payload = executor._style_brief_payload(_run_context(access_token="token-123", folder=OUTFITS_FOLDER))
+    finally:
+        release.set()
+    elapsed = executor.time.monotonic() - started
+
+    assert elapsed < 2
+    assert heuristic_calls == [1]
+    assert payload["analysis_method"] == "heuristic_fallback"
+    assert payload["inferred_vibes"] == ["party"]
+    assert payload["palette"] == ["black"]
+    assert "deadline" in payload["multimodal_error"]
+
+
+@pytest.mark.parametrize(
+    ("running_checks", "reached"),
+    [(0, []), (1, ["download"]), (2, ["download", "prepare"]), (3, ["download", "prepare"])],
+)
+def test_canceled_style_brief_stops_between_downloads_and_the_model(monkeypatch, running_checks, reached):
+    calls = []
+    photos = [{"id": "p-1", "name": "look-1.jpg"}]
+    prepared = [{"id": "p-1", "name": "look-1.jpg", "data_uri": "data:image/jpeg;base64,AAAA"}]
+    statuses = iter(["RUNNING"] * running_checks + ["CANCELED"])
+
+    monkeypatch.setattr(executor, "exec_one", lambda _query, _params: {"status": next(statuses)})
+    monkeypatch.setattr(executor, "_get_cached_style_brief", lambda _user_id, _folder_id, _fingerprint: None)
+    monkeypatch.setattr(executor, "_drive_list_images", lambda _token, _folder_id, limit=40: photos)
+    monkeypatch.setattr(executor, "_attach_photo_features", lambda _token, _photos: calls.append("download") or {})
+    monkeypatch.setattr(
+        executor,
+        "_prepare_images_for_multimodal_analysis",
+        lambda _token, _photos, max_images=4, downloaded=None: calls.append("prepare") or prepared,
+    )
+    monkeypatch.setattr(
+        executor, "_call_multimodal_style_agent", lambda _images, deadline=None: calls.append("model") or {}
+    )
+    monkeypatch.setattr(executor, "_heuristic_style_signals", lambda _token, _photos: None)
+
+    with pytest.raises(executor.RunCanceled):
+        executor._style_brief_payload(_run_context(access_token="token-123", folder=OUTFITS_FOLDER))
+
+    executor.style_brief_llm_pool.submit(lambda: None).result()  # let a submitted model call settle
+    if running_checks < 3:
+        assert calls == reached
+    else:
+        # Canceled while the model call was in flight: it was submitted, and is dropped if it had not started.
+        assert calls in (reached, reached + ["model"])
+
+
+def test_prewarm_populates_cache_and_next_run_hits_it(monkeypatch, drive_tokens):
+    user_id = uuid.uuid4()
+    photos = [{"id": "p-1", "name": "look-1.jpg", "md5Checksum": "abc"}]
+    prepared = [{"id": "p-1", "name": "look-1.jpg", "data_uri": "data:image/jpeg;base64,AAAA"}]
+    cache: dict = {}
+    llm_calls = []
+
+    drive_tokens.tokens[user_id] = "token-123"
+    monkeypatch.setattr(
+        executor,
+        "_get_selected_drive_folder",
+        lambda _user_id: {"folder_id": "folder-1", "folder_name": "Outfits"},
+    )
+    monkeypatch.setattr(executor, "_drive_list_images", lambda _token, _folder_id, limit=40: [dict(p) for p in photos])
+    monkeypatch.setattr(executor, "_attach_photo_features", lambda _token, _photos: {})
+    monkeypatch.setattr(
+        executor,
+        "_prepare_images_for_multimodal_analysis",
+        lambda _token, _photos, max_images=4, downloaded=None: prepared,
+    )
+    monkeypatch.setattr(
+        executor,
+        "_call_multimodal_style_agent",
+        lambda _images, deadline=None: llm_calls.append(1) or {"style_summary": "Sharp tailoring."},
+    )
+    monkeypatch.setattr(
+        executor,
+        "_get_cached_style_brief",
+        lambda uid, folder_id, fingerprint: cache.get((uid, folder_id, fingerprint)),
+    )
+    monkeypatch.setattr(
+        executor,
+        "_store_style_brief_cache",
+        lambda uid, folder_id, fingerprint, payload: cache.__setitem__((uid, folder_id, fingerprint), payload),
+    )
+
+    warmed = executor.prewarm_style_brief_impl(str(user_id))
+    assert warmed["status"] == "WARMED"
+    assert executor.prewarm_style_brief_impl(str(user_id))["status"] == "UNCHANGED"
+
+    payload = executor._style_brief_payload(_run_context(user_id, "token-123", OUTFITS_FOLDER))
+    assert llm_calls == [1]
+    assert payload["style_brief_cache"] == "hit"
+    assert payload["style_summary"] == "Sharp tailoring."
+
+    photos[0]["md5Checksum"] = "changed"
+    assert executor.prewarm_style_brief_impl(str(user_id))["status"] == "WARMED"
+    assert llm_calls == [1, 1]
+
+
 def test_call_multimodal_style_agent_requires_api_key(monkeypatch):
     monkeypatch.setattr(executor, "GEMINI_API_KEY", "")
     with pytest.raises(RuntimeError, match="GEMINI_API_KEY"):
@@ -137,16 +252,264 @@ def test_call_multimodal_style_agent_requires_api_key(monkeypatch):
         )
 
 
-def test_deals_payload_mock_mode(monkeypatch):
-    monkeypatch.setattr(executor, "PRODUCT_DATA_MODE", "mock")
-    monkeypatch.setattr(executor, "SERPAPI_API_KEY", "")
+def test_model_call_is_bounded_by_the_style_brief_deadline(monkeypatch):
+    timeouts = []
+
+    class _Response:
+        status_code = 200
+
+        def json(self):
+            return {"choices": [{"message": {"content": json.dumps({"style_summary": "Clean minimal."})}}]}
+
+    monkeypatch.setattr(executor, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(executor, "GEMINI_IMAGE_TRANSPORT", "inline")
+    monkeypatch.setattr(
+        executor.requests, "post", lambda *_args, timeout, **_kwargs: timeouts.append(timeout) or _Response()
+    )
+    prepared = [{"id": "p-1", "name": "look-1.jpg", "data_uri": "data:image/jpeg;base64,AAAA"}]
+
+    executor._call_multimodal_style_agent(prepared, deadline=executor.time.monotonic() + 5)
+    with pytest.raises(TimeoutError):
+        executor._call_multimodal_style_agent(prepared, deadline=executor.time.monotonic() - 1)
+
+    assert len(timeouts) == 1
+    assert 0 < timeouts[0] <= 5
+    assert executor.style_brief_llm_pool._max_workers == executor.STYLE_BRIEF_LLM_MAX_CONCURRENCY
+
+
+@pytest.fixture
+def fake_gemini_server():
+    state = {"uploads": [], "chat_bodies": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *_args):
+            return
+
+        def _reply(self, payload: dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+            if self.path.startswith("/upload/v1beta/files"):
+                state["uploads"].append(raw)
+                name = f"files/f{len(state['uploads'])}"
+                self._reply(
+                    {
+                        "file": {
+                            "name": name,
+                            "uri": f"http://{self.headers['Host']}/v1beta/{name}",
+                            "mimeType": self.headers.get("Content-Type"),
+                            "expirationTime": "2099-01-01T00:00:00.123456789Z",
+                        }
+                    }
+                )
+                return
+            state["chat_bodies"].append(raw)
+            self._reply({"choices": [{"message": {"content": json.dumps({"style_summary": "Clean minimal."})}}]})
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["base_url"] = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_file_api_transport_uploads_each_image_once(monkeypatch, fake_gemini_server):
+    base_url = fake_gemini_server["base_url"]
+    file_cache: dict[str, str] = {}
+    monkeypatch.setattr(executor, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(executor, "GEMINI_API_BASE", f"{base_url}/v1beta/openai")
+    monkeypatch.setattr(executor, "GEMINI_UPLOAD_BASE", f"{base_url}/upload/v1beta")
+    monkeypatch.setattr(executor, "GEMINI_IMAGE_TRANSPORT", "file_api")
+    monkeypatch.setattr(
+        executor,
+        "_lookup_provider_files",
+        lambda _provider, digests: {d: file_cache[d] for d in digests if d in file_cache},
+    )
+    monkeypatch.setattr(
+        executor,
+        "_store_provider_file",
+        lambda _provider, digest, file_uri, *_args: file_cache.__setitem__(digest, file_uri),
+    )
+    prepared = [
+        {"id": "p-1", "name": "look-1.jpg", "digest": "d-1", "jpeg_bytes": b"\xff\xd8jpeg-one"},
+        {"id": "p-2", "name": "look-2.jpg", "digest": "d-2", "jpeg_bytes": b"\xff\xd8jpeg-two" * 500},
+    ]
+
+    first = executor._call_multimodal_style_agent(prepared)
+    second = executor._call_multimodal_style_agent(prepared)
+
+    assert first["style_summary"] == second["style_summary"] == "Clean minimal."
+    assert len(fake_gemini_server["uploads"]) == 2
+    assert len(fake_gemini_server["chat_bodies"]) == 2
+    for raw in fake_gemini_server["chat_bodies"]:
+        urls = [
+            block["image_url"]["url"]
+            for block in json.loads(raw)["messages"][1]["content"]
+            if block["type"] == "image_url"
+        ]
+        assert urls == [file_cache["d-1"], file_cache["d-2"]]
+        assert b"base64" not in raw
+        assert len(raw) < 4096
+
+
+def test_parse_rfc3339_handles_nanoseconds():
+    parsed = executor._parse_rfc3339("2099-01-01T00:00:00.123456789Z")
+    assert parsed is not None
+    assert parsed.microsecond == 123456
+    assert parsed.utcoffset().total_seconds() == 0
+    assert executor._parse_rfc3339("not-a-date") is None
+
+
+def _gradient_image(flip: bool = False, lift: int = 0, blur: float = 0.0):
+    from PIL import Image, ImageFilter
+
+    ramp = Image.linear_gradient("L").rotate(90).resize((900, 900))
+    if flip:
+        ramp = ramp.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    ramp = ramp.point(lambda value: min(255, value + lift))
+    noise = Image.effect_noise((900, 900), 40).convert("L")
+    image = Image.merge("RGB", (ramp, ramp, noise))
+    return image.filter(ImageFilter.GaussianBlur(blur)) if blur else image
+
+
+def test_prepare_images_drops_near_duplicates_and_fits_budget(monkeypatch):
+    pytest.importorskip("PIL.Image")
+    burst_a = _gradient_image()
+    burst_b = _gradient_image(lift=4, blur=3)
+    distinct = _gradient_image(flip=True)
+    downloads = {"p-1": burst_a, "p-2": burst_b, "p-3": distinct}
+    photos = [{"id": photo_id, "name": f"{photo_id}.jpg"} for photo_id in downloads]
+
+    monkeypatch.setattr(executor, "_download_drive_image", lambda _token, file_id: downloads[file_id])
+    monkeypatch.setattr(executor, "GEMINI_IMAGE_TRANSPORT", "inline")
+    monkeypatch.setattr(executor, "STYLE_BRIEF_IMAGE_TOKEN_BUDGET", 600)
+    monkeypatch.setattr(executor, "STYLE_BRIEF_IMAGE_BYTE_BUDGET", 400_000)
+
+    prepared = executor._prepare_images_for_multimodal_analysis("token", photos, max_images=4)
+
+    assert [image["id"] for image in prepared] == ["p-1", "p-3"]
+    summary = executor._image_budget_summary(prepared)
+    assert summary["image_count"] == 2
+    assert summary["estimated_image_tokens"] <= 600
+    assert summary["payload_bytes"] <= 400_000
+    assert summary["max_edge_px"] <= 768
+    assert all(image["data_uri"].startswith("data:image/jpeg;base64,") for image in prepared)
+
+
+def test_photo_features_are_computed_once_and_feed_fallback(monkeypatch):
+    pytest.importorskip("PIL.Image")
+    feature_store: dict[tuple[str, str], dict] = {}
+    downloads: list[str] = []
+    images = {"p-1": _gradient_image(), "p-2": _gradient_image(flip=True)}
+    photos = [
+        {"id": "p-1", "name": "office-blazer.jpg", "md5Checksum": "aaa"},
+        {"id": "p-2", "name": "beach-dress.jpg", "md5Checksum": "bbb"},
+    ]
+
+    def fake_download(_token, file_id):
+        downloads.append(file_id)
+        return images[file_id].copy()
+
+    monkeypatch.setattr(executor, "_download_drive_image", fake_download)
+    monkeypatch.setattr(
+        executor,
+        "_load_photo_features",
+        lambda wanted: {
+            key: feature_store[key]
+            for key in ((p["id"], executor._photo_checksum(p)) for p in wanted)
+            if key in feature_store
+        },
+    )
+    monkeypatch.setattr(
+        executor,
+        "_store_photo_features",
+        lambda rows: feature_store.update({(row["file_id"], row["checksum"]): row for row in rows}),
+    )
+
+    downloaded = executor._attach_photo_features("token", photos)
+    assert sorted(downloaded) == ["p-1", "p-2"]
+    assert sorted(feature_store) == [("p-1", "aaa"), ("p-2", "bbb")]
+    assert feature_store[("p-1", "aaa")]["width"] == 900
+    assert len(feature_store[("p-1", "aaa")]["color_histogram"]) == 64
+
+    downloads.clear()
+    rerun_photos = [dict(photo) for photo in photos]
+    assert executor._attach_photo_features("token", rerun_photos) == {}
+    fallback = executor._style_brief_fallback("token", {"folder_id": "f-1"}, rerun_photos, reason="timeout")
+
+    assert downloads == []
+    assert fallback["analysis_method"] == "heuristic_fallback"
+    assert fallback["palette"]
+    assert set(fallback["inferred_vibes"]) == {"formal", "beach"}
+    assert set(fallback["recommended_categories"]) >= {"dress", "outerwear"}
+
+
+def test_renamed_and_checksumless_photos_do_not_reuse_stale_rows(monkeypatch):
+    pytest.importorskip("PIL.Image")
+    stored_rows: list[dict] = []
+    monkeypatch.setattr(executor, "_download_drive_image", lambda _token, _file_id: _gradient_image())
+    monkeypatch.setattr(executor, "_drive_files_metadata", lambda _token, _ids: {})
+    monkeypatch.setattr(executor, "_store_photo_features", stored_rows.extend)
     monkeypatch.setattr(
         executor,
-        "_get_artifact",
-        lambda _run_id, kind: {"recommended_brands": ["Zara", "H&M"]} if kind == "style_brief" else {},
+        "_load_photo_features",
+        lambda wanted: {("p-1", "aaa"): {"file_id": "p-1", "checksum": "aaa", "mean_rgb": [0, 0, 0]}},
+    )
+    photos = [
+        {"id": "p-1", "name": "gym-shorts.jpg", "md5Checksum": "aaa"},
+        {"id": "p-2", "name": "party-dress.jpg"},
+    ]
+
+    executor._attach_photo_features("token", photos)
+
+    assert "filename_tokens" not in photos[1]["features"]
+    assert stored_rows == []
+    assert set(executor._infer_vibes(photos)) == {"sporty", "party"}
+
+
+def test_style_brief_records_image_budget_and_token_usage(monkeypatch):
+    prepared = [
+        {"id": "p-1", "name": "look-1.jpg", "data_uri": "data:image/jpeg;base64,AAAA", "byte_size": 3,
+         "estimated_tokens": 258, "width": 384, "height": 288, "quality": 70, "phash": "00ff00ff00ff00ff"},
+    ]
+    monkeypatch.setattr(executor, "_drive_list_images", lambda _token, _folder_id, limit=40: [{"id": "p-1"}])
+    monkeypatch.setattr(executor, "_attach_photo_features", lambda _token, _photos: {})
+    monkeypatch.setattr(
+        executor,
+        "_prepare_images_for_multimodal_analysis",
+        lambda _token, _photos, max_images=4, downloaded=None: prepared,
+    )
+    monkeypatch.setattr(
+        executor,
+        "_call_multimodal_style_agent",
+        lambda _images, deadline=None: {
+            "style_summary": "Soft neutrals.",
+            "token_usage": {"prompt_tokens": 612, "total_tokens": 700},
+        },
     )
 
-    payload = executor._deals_payload(uuid.uuid4())
+    payload = executor._style_brief_payload(_run_context(access_token="token-123", folder=OUTFITS_FOLDER))
+
+    assert payload["image_budget"]["payload_bytes"] == 3
+    assert payload["image_budget"]["estimated_image_tokens"] == 258
+    assert payload["image_budget"]["phashes"] == ["00ff00ff00ff00ff"]
+    assert payload["token_usage"]["prompt_tokens"] == 612
+
+
+def test_deals_payload_mock_mode(monkeypatch):
+    monkeypatch.setattr(executor, "PRODUCT_DATA_MODE", "mock")
+    monkeypatch.setattr(executor, "SERPAPI_API_KEY", "")
+    ctx = _run_context(artifacts={"style_brief": {"recommended_brands": ["Zara", "H&M"]}})
+
+    payload = executor._deals_payload(ctx)
 
     assert payload["data_mode"] == "mock"
     assert payload["provider"] == "synthetic"
@@ -156,19 +519,16 @@ def test_deals_payload_mock_mode(monkeypatch):
 def test_brand_search_payload_real_mode(monkeypatch):
     monkeypatch.setattr(executor, "PRODUCT_DATA_MODE", "auto")
     monkeypatch.setattr(executor, "SERPAPI_API_KEY", "test-key")
-    monkeypatch.setattr(
-        executor,
-        "_get_artifact",
-        lambda _run_id, kind: (
-            {
+    ctx = _run_context(
+        artifacts={
+            "style_brief": {
                 "recommended_brands": ["Zara"],
                 "recommended_categories": ["dress"],
                 "palette": ["navy", "cream"],
                 "budget_max": 200,
-            }
-            if kind == "style_brief"
-            else {"deals": [{"brand": "Zara", "discount_pct": 20}]}
-        ),
+            },
+            "deals": {"deals": [{"brand": "Zara", "discount_pct": 20}]},
+        }
     )
     monkeypatch.setattr(
         executor,
@@ -185,7 +545,7 @@ def test_brand_search_payload_real_mode(monkeypatch):
         ],
     )
 
-    payload = executor._brand_search_payload(uuid.uuid4())
+    payload = executor._brand_search_payload(ctx)
 
     assert payload["data_mode"] == "serpapi"
     assert payload["provider"] == "serpapi_google_shopping"
@@ -196,24 +556,24 @@ def test_brand_search_payload_real_mode(monkeypatch):
     assert candidate["data_source"] == "serpapi"
 
 
-def test_checkout_prefers_product_url(monkeypatch):
-    monkeypatch.setattr(
-        executor,
-        "_get_artifact",
-        lambda _run_id, _kind: {
-            "ranked_items": [
-                {
-                    "sku": "zara-dre-123",
-                    "title": "Zara Navy Dress",
-                    "brand": "Zara",
-                    "sale_price": 79.99,
-                    "source": "Zara",
-                    "product_url": "https://example.com/zara-dress",
-                }
-            ]
-        },
+def test_checkout_prefers_product_url():
+    ctx = _run_context(
+        artifacts={
+            "rank": {
+                "ranked_items": [
+                    {
+                        "sku": "zara-dre-123",
+                        "title": "Zara Navy Dress",
+                        "brand": "Zara",
+                        "sale_price": 79.99,
+                        "source": "Zara",
+                        "product_url": "https://example.com/zara-dress",
+                    }
+                ]
+            }
+        }
     )
 
-    payload = executor._checkout_payload(uuid.uuid4())
+    payload = executor._checkout_payload(ctx)
     checkout_item = payload["checkout_draft"]["items"][0]
     assert checkout_item["checkout_url"] == "https://example.com/zara-dress"
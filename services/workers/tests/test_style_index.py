@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta, timezone
+import random
+import uuid
+
+import numpy as np
+
+from workers.common import style_index
+from workers.executors import crewai_step_executor as executor
+
+STYLE = {
+    "inferred_vibes": ["minimal", "tailored"],
+    "palette": ["navy"],
+    "recommended_categories": ["blazer"],
+    "budget_max": 200,
+}
+
+
+def _catalog(count: int, seed: int = 3) -> list[dict]:
+    rng = random.Random(seed)
+    words = ["linen", "wool", "cropped", "oversized", "pleated", "ribbed", "satin", "denim", "knit", "tailored"]
+    return [
+        {
+            "sku": f"sku-{idx}",
+            "brand_key": rng.choice(["zara", "mango", "cos", "uniqlo"]),
+            "category": rng.choice(["dress", "top", "bottom", "blazer", "outerwear"]),
+            "color": rng.choice(["navy", "black", "cream", "olive", "red"]),
+            "title": " ".join(rng.sample(words, 3)),
+        }
+        for idx in range(count)
+    ]
+
+
+def test_encoder_puts_matching_products_near_the_brief():
+    query = style_index.encode_style(STYLE)
+    vectors = style_index.encode_products(
+        [
+            {"title": "Tailored Navy Blazer", "brand_key": "cos", "category": "blazer", "color": "navy"},
+            {"title": "Chunky Running Sneaker", "brand_key": "nike", "category": "shoes", "color": "white"},
+        ]
+    )
+
+    match, miss = vectors @ query
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert match > 0.5 > miss
+
+
+def test_ivf_search_finds_what_brute_force_finds(tmp_path):
+    root = str(tmp_path / "index")
+    rows = _catalog(4000)
+    style_index.update_style_index(root, rows, watermark=None)
+    index = style_index.load_style_index(root)
+    query = style_index.encode_style(STYLE)
+
+    exact = np.sort(style_index.encode_products(rows) @ query)[::-1]
+    hits = index.search(query, 20, nprobe=8)
+
+    assert len(index) == 4000
+    assert index.meta["nlist"] == 63
+    # Many products tie on score, so recall is measured against the exact 20th-best score (float16 tolerance).
+    assert all(score >= exact[19] - 1e-3 for _sku, score in hits)
+    assert [score for _sku, score in hits] == sorted((score for _sku, score in hits), reverse=True)
+
+
+def test_incremental_update_reuses_centroids_and_replaces_changed_rows(tmp_path):
+    root = str(tmp_path / "index")
+    rows = _catalog(1000)
+    style_index.update_style_index(root, rows, watermark="t1")
+    first = style_index.load_style_index(root)
+    changed = {**rows[0], "title": "tailored wool blazer", "category": "blazer", "color": "navy"}
+
+    result = style_index.update_style_index(root, [changed], watermark="t2")
+    second = style_index.load_style_index(root)
+
+    assert result == {"version": result["version"], "count": 1000, "added": 1, "retrained": False}
+    assert second is not first and style_index.load_style_index(root) is second
+    assert np.array_equal(second.centroids, first.centroids)
+    assert second.meta["watermark"] == "t2"
+    assert second.skus.tolist().count(b"sku-0") == 1
+    # The first version stays on disk for readers that still have it mapped.
+    assert len(first) == 1000 and first.search(style_index.encode_style(STYLE), 1)
+
+
+def test_rank_pulls_style_matches_from_the_catalog(monkeypatch, tmp_path):
+    root = str(tmp_path / "index")
+    seen_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    catalog = {
+        "sku-blazer": {
+            "sku": "sku-blazer",
+            "brand": "COS",
+            "brand_key": "cos",
+            "category": "blazer",
+            "color": "navy",
+            "title": "Tailored Navy Blazer",
+            "product_url": "https://example.com/blazer",
+            "image_url": None,
+            "source": "COS",
+            "sale_price": 120,
+            "old_price": 160,
+            "listed_discount_pct": 25,
+            "last_seen_at": seen_at,
+        }
+    }
+    for row in _catalog(300):
+        catalog[row["sku"]] = {
+            **row,
+            "brand": row["brand_key"].title(),
+            "product_url": f"https://example.com/{row['sku']}",
+            "image_url": None,
+            "source": "web",
+            "sale_price": 90,
+            "old_price": 0,
+            "listed_discount_pct": 0,
+            "last_seen_at": seen_at - timedelta(days=1),
+        }
+    queries = []
+
+    def fake_exec_all(sql, params=None):
+        queries.append(params)
+        if "ANY" in sql:
+            return [catalog[sku] for sku in params["skus"] if sku in catalog]
+        since = datetime.fromisoformat(params["watermark"]) if params["watermark"] else seen_at - timedelta(days=30)
+        rows = [row for row in catalog.values() if row["last_seen_at"] >= since]
+        return sorted(rows, key=lambda row: row["last_seen_at"])
+
+    monkeypatch.setattr(executor, "exec_all", fake_exec_all)
+    monkeypatch.setattr(executor, "PRODUCT_STYLE_INDEX_PATH", root)
+    monkeypatch.setattr(executor, "PRODUCT_DATA_MODE", "auto")
+    monkeypatch.setattr(executor, "RANK_WEIGHTS", {"budget": 0.2, "discount": 0.2, "style": 0.6})
+
+    assert executor.rebuild_style_index_impl()["products"] == 301
+    assert executor.rebuild_style_index_impl() == {"status": "BUILT", "products": 301, "added": 1, "retrained": False}
+    assert queries[1] == {"watermark": seen_at.isoformat()}
+
+    ctx = executor.RunContext(
+        run_id=uuid.uuid4(),
+        user_id=uuid.uuid4(),
+        artifacts={
+            "style_brief": STYLE,
+            "brand_search": {
+                "product_candidates": [
+                    {
+                        "sku": "search-1",
+                        "title": "Red Slip Dress",
+                        "brand": "Zara",
+                        "category": "dress",
+                        "color": "red",
+                        "sale_price": 40.0,
+                        "discount_pct": 10.0,
+                    }
+                ]
+            },
+        },
+    )
+    payload = executor._rank_payload(ctx)
+
+    top = payload["ranked_items"][0]
+    assert top["sku"] == "sku-blazer"
+    assert top["data_source"] == "catalog"
+    assert top["style_similarity"] > 0.5
+    assert payload["style_retrieval"]["catalog_candidates"] == executor.RANK_STYLE_CANDIDATES
+    assert all("style_similarity" in item for item in payload["ranked_items"])
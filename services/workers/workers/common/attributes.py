@@ -0,0 +1,155 @@
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+# Every vocabulary term is folded into one compiled alternation, so a title is scanned once no matter how many
+# attributes are extracted. Terms map to (attribute, canonical value); longer terms are tried first ("t-shirt"
+# before "shirt", "off white" before "white").
+COLORS = (
+    "black", "white", "gray", "grey", "navy", "blue", "red", "green",
+    "yellow", "pink", "purple", "orange", "brown", "beige", "cream", "olive",
+)
+CATEGORY_TERMS = {
+    "dress": ("dress", "dresses", "gown", "gowns", "jumpsuit", "romper"),
+    "top": (
+        "top", "tops", "shirt", "shirts", "t-shirt", "tee", "tees", "blouse", "blouses", "tank", "camisole", "cami",
+        "sweater", "sweaters", "cardigan", "pullover", "bodysuit", "polo", "turtleneck", "sweatshirt",
+    ),
+    "bottom": (
+        "bottom", "bottoms", "jeans", "pants", "trouser", "trousers", "skirt", "skirts", "shorts", "leggings",
+        "chinos", "joggers",
+    ),
+    "outerwear": ("jacket", "jackets", "coat", "coats", "blazer", "blazers", "hoodie", "parka", "trench", "vest"),
+    "shoes": (
+        "shoe", "shoes", "heel", "heels", "sneaker", "sneakers", "boot", "boots", "sandal", "sandals", "loafers",
+        "flats", "mules",
+    ),
+    "bag": ("bag", "bags", "tote", "handbag", "backpack", "clutch", "crossbody"),
+}
+GENDER_TERMS = {
+    "women": ("women", "womens", "women's", "woman", "ladies", "female"),
+    "men": ("men", "mens", "men's", "man", "male"),
+    "unisex": ("unisex",),
+}
+MATERIAL_TERMS = {
+    "cotton": ("cotton", "organic cotton"),
+    "linen": ("linen",),
+    "wool": ("wool", "merino"),
+    "cashmere": ("cashmere",),
+    "silk": ("silk",),
+    "satin": ("satin",),
+    "denim": ("denim",),
+    "leather": ("leather",),
+    "faux leather": ("faux leather", "vegan leather"),
+    "suede": ("suede",),
+    "polyester": ("polyester",),
+    "viscose": ("viscose", "rayon"),
+    "nylon": ("nylon",),
+    "knit": ("knit", "knitted", "rib-knit", "ribbed"),
+    "jersey": ("jersey",),
+    "velvet": ("velvet",),
+    "corduroy": ("corduroy",),
+    "tweed": ("tweed",),
+}
+SIZE_TERMS = {
+    "xxs": ("xxs",),
+    "xs": ("xs",),
+    "xl": ("xl",),
+    "xxl": ("xxl", "2xl"),
+    "petite": ("petite",),
+    "plus": ("plus size", "plus-size", "curve"),
+    "tall": ("tall",),
+}
+
+
+@dataclass(frozen=True)
+class TitleAttributes:
+    colors: tuple[str, ...] = ()
+    category: str = ""
+    gender: str = ""
+    materials: tuple[str, ...] = ()
+    sizes: tuple[str, ...] = ()
+
+    def as_dict(self) -> dict:
+        """JSON form stored on catalog rows; color has its own column."""
+        return {
+            "category": self.category,
+            "gender": self.gender,
+            "materials": list(self.materials),
+            "sizes": list(self.sizes),
+        }
+
+
+def _build_lookup() -> dict[str, tuple[str, str]]:
+    lookup = {color: ("color", color) for color in COLORS}
+    for attribute, vocabulary in (
+        ("category", CATEGORY_TERMS),
+        ("gender", GENDER_TERMS),
+        ("material", MATERIAL_TERMS),
+        ("size", SIZE_TERMS),
+    ):
+        for canonical, terms in vocabulary.items():
+            for term in terms:
+                lookup[term] = (attribute, canonical)
+    return lookup
+
+
+_LOOKUP = _build_lookup()
+_COLOR_RANK = {color: rank for rank, color in enumerate(COLORS)}
+# "size 8" / "size m" are matched by the same pattern; lookarounds instead of \b so "men's" ends cleanly.
+_PATTERN = re.compile(
+    r"(?<![a-z0-9])(?:size\s+(?P<size>\d{1,2}|[a-z]{1,3})|(?P<term>"
+    + "|".join(re.escape(term) for term in sorted(_LOOKUP, key=len, reverse=True))
+    + r"))(?![a-z0-9])"
+)
+
+
+@lru_cache(maxsize=65536)
+def extract_attributes(title: str) -> TitleAttributes:
+    """Color, category, gender, material and size tokens from one pass over ``title``.
+
+    Colors are ordered by COLORS priority; the category is the last category word (the head noun in
+    "Linen Shirt Dress"); gender is the first gender word.
+    """
+    colors: set[str] = set()
+    category = gender = ""
+    materials: list[str] = []
+    sizes: list[str] = []
+    for match in _PATTERN.finditer((title or "").lower()):
+        size = match.group("size")
+        if size is not None:
+            if size not in sizes:
+                sizes.append(size)
+            continue
+        attribute, value = _LOOKUP[match.group("term")]
+        if attribute == "color":
+            colors.add(value)
+        elif attribute == "category":
+            category = value
+        elif attribute == "gender":
+            gender = gender or value
+        elif attribute == "material":
+            if value not in materials:
+                materials.append(value)
+        elif value not in sizes:
+            sizes.append(value)
+    return TitleAttributes(
+        colors=tuple(sorted(colors, key=_COLOR_RANK.__getitem__)),
+        category=category,
+        gender=gender,
+        materials=tuple(materials),
+        sizes=tuple(sizes),
+    )
+
+
+def guess_color(title: str, palette: list[str]) -> str:
+    """A palette color named in the title, else the first common color in it, else the first palette color."""
+    text = (title or "").lower()
+    palette_norm = [str(color).strip().lower() for color in palette if str(color).strip()]
+    for color in palette_norm:
+        if color in text:
+            return color
+    colors = extract_attributes(title or "").colors
+    if colors:
+        return colors[0]
+    return palette_norm[0] if palette_norm else "neutral"
@@ -0,0 +1,110 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime
+
+# File layout: magic, index length, JSON index (record offsets + inverted indexes + segment freshness), then the
+# records as concatenated JSON documents. Records are only ever read through the mmap, so every prefork child
+# shares the same page-cache pages instead of holding its own copy of the catalog.
+SNAPSHOT_MAGIC = b"PCS1"
+INDEXED_FIELDS = ("brand_key", "category", "color", "gender", "price_band")
+_HEADER = struct.Struct("<4sQ")
+
+
+def segment_key(brand_key: str, category: str, gender: str) -> str:
+    return f"{brand_key}|{category}|{gender}"
+
+
+def write_snapshot(path: str, rows: list[dict], segments: list[dict]) -> int:
+    """Write ``rows`` and their inverted indexes to ``path`` atomically; open mappings of the old file stay valid."""
+    blob = bytearray()
+    records: list[list[int]] = []
+    postings: dict[str, dict[str, list[int]]] = {field: {} for field in INDEXED_FIELDS}
+    for record_id, row in enumerate(rows):
+        data = json.dumps(row, separators=(",", ":")).encode("utf-8")
+        records.append([len(blob), len(data)])
+        blob += data
+        for field in INDEXED_FIELDS:
+            postings[field].setdefault(str(row[field]), []).append(record_id)
+
+    index = json.dumps(
+        {
+            "records": records,
+            "postings": postings,
+            "segments": {
+                segment_key(item["brand_key"], item["category"], item["gender"]): item["refreshed_at"].isoformat()
+                for item in segments
+            },
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as handle:
+        handle.write(_HEADER.pack(SNAPSHOT_MAGIC, len(index)))
+        handle.write(index)
+        handle.write(blob)
+    os.replace(tmp_path, path)
+    return len(rows)
+
+
+class CatalogSnapshot:
+    def __init__(self, path: str):
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_length = _HEADER.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a product catalog snapshot")
+        index = json.loads(self._map[_HEADER.size : _HEADER.size + index_length])
+        self._base = _HEADER.size + index_length
+        self._records = index["records"]
+        self._postings = index["postings"]
+        self.segments = {key: datetime.fromisoformat(value) for key, value in index["segments"].items()}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(self, record_id: int) -> dict:
+        offset, length = self._records[record_id]
+        start = self._base + offset
+        return json.loads(self._map[start : start + length])
+
+    def find(self, **filters) -> list[dict]:
+        """Rows matching every filter; a list value matches any of its entries (e.g. several price bands)."""
+        matched: set[int] | None = None
+        for field, wanted in filters.items():
+            values = wanted if isinstance(wanted, (list, tuple, set, range)) else [wanted]
+            postings = self._postings.get(field, {})
+            ids: set[int] = set()
+            for value in values:
+                ids.update(postings.get(str(value), ()))
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return []
+        record_ids = range(len(self._records)) if matched is None else sorted(matched)
+        return [self.record(record_id) for record_id in record_ids]
+
+
+_snapshots: dict[str, tuple[tuple[int, int], CatalogSnapshot]] = {}
+_snapshots_lock = threading.Lock()
+
+
+def load_snapshot(path: str) -> CatalogSnapshot | None:
+    """Return the mapped snapshot at ``path``, remapping only when the file has been replaced."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    signature = (stat.st_ino, stat.st_mtime_ns)
+    with _snapshots_lock:
+        cached = _snapshots.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        try:
+            snapshot = CatalogSnapshot(path)
+        except (OSError, ValueError, struct.error):
+            return None
+        _snapshots[path] = (signature, snapshot)
+        return snapshot
@@ -0,0 +1,188 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import numpy as np
+
+# Reproduces the original RANK formula: 0.45 * budget + 0.45 * discount + 0.1 palette bonus.
+DEFAULT_RANK_WEIGHTS = {"budget": 0.45, "discount": 0.45, "palette": 0.1}
+
+
+@dataclass
+class CandidateColumns:
+    """Candidates of one or more runs as parallel arrays; string attributes are stored as vocabulary codes."""
+
+    run_index: np.ndarray
+    sale_price: np.ndarray
+    discount_pct: np.ndarray
+    color: np.ndarray
+    brand: np.ndarray
+    category: np.ndarray
+    style_similarity: np.ndarray
+
+
+@dataclass
+class RankPreferences:
+    """Per-run preferences; the boolean matrices are indexed [run, vocabulary code]."""
+
+    budget_max: np.ndarray
+    palette: np.ndarray
+    brands: np.ndarray
+    categories: np.ndarray
+
+
+FeatureFn = Callable[[CandidateColumns, RankPreferences], np.ndarray]
+FEATURES: dict[str, FeatureFn] = {}
+
+
+def register_feature(name: str) -> Callable[[FeatureFn], FeatureFn]:
+    def decorator(fn: FeatureFn) -> FeatureFn:
+        FEATURES[name] = fn
+        return fn
+
+    return decorator
+
+
+@register_feature("budget")
+def _budget_feature(columns: CandidateColumns, prefs: RankPreferences) -> np.ndarray:
+    budget = np.maximum(prefs.budget_max[columns.run_index], 1.0)
+    return np.maximum(0.0, 1.0 - columns.sale_price / budget)
+
+
+@register_feature("discount")
+def _discount_feature(columns: CandidateColumns, prefs: RankPreferences) -> np.ndarray:
+    return np.minimum(columns.discount_pct / 50.0, 1.0)
+
+
+@register_feature("palette")
+def _palette_feature(columns: CandidateColumns, prefs: RankPreferences) -> np.ndarray:
+    return prefs.palette[columns.run_index, columns.color].astype(np.float64)
+
+
+@register_feature("brand_affinity")
+def _brand_feature(columns: CandidateColumns, prefs: RankPreferences) -> np.ndarray:
+    return prefs.brands[columns.run_index, columns.brand].astype(np.float64)
+
+
+@register_feature("category")
+def _category_feature(columns: CandidateColumns, prefs: RankPreferences) -> np.ndarray:
+    return prefs.categories[columns.run_index, columns.category].astype(np.float64)
+
+
+@register_feature("style")
+def _style_feature(columns: CandidateColumns, prefs: RankPreferences) -> np.ndarray:
+    # Cosine between the candidate and the run's style brief, set by RANK when the style index is available.
+    return np.maximum(columns.style_similarity, 0.0)
+
+
+def parse_weights(spec: str) -> dict[str, float]:
+    """``budget=0.45,discount=0.45,palette=0.1`` -> weights; an empty spec keeps the defaults."""
+    if not spec.strip():
+        return dict(DEFAULT_RANK_WEIGHTS)
+    weights = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name not in FEATURES:
+            raise ValueError(f"Unknown rank feature: {name}")
+        weights[name] = float(value)
+    return weights
+
+
+class _Vocabulary:
+    def __init__(self):
+        self.codes: dict[str, int] = {}
+        self._raw: dict = {}
+
+    def code(self, value) -> int:
+        code = self._raw.get(value)
+        if code is None:
+            code = self._raw[value] = self.codes.setdefault(str(value or "").strip().lower(), len(self.codes))
+        return code
+
+    def column(self, candidates: list[dict], key: str) -> np.ndarray:
+        return np.fromiter((self.code(item.get(key)) for item in candidates), dtype=np.intp, count=len(candidates))
+
+    def matrix(self, per_run: list[list]) -> np.ndarray:
+        matrix = np.zeros((len(per_run), len(self.codes) or 1), dtype=bool)
+        for run, values in enumerate(per_run):
+            codes = [self.codes[key] for key in (str(value).strip().lower() for value in values) if key in self.codes]
+            matrix[run, codes] = True
+        return matrix
+
+
+def build_inputs(runs: list[tuple[list[dict], dict]]) -> tuple[CandidateColumns, RankPreferences]:
+    """Columnarize ``(candidates, style_brief)`` pairs for one vectorized scoring pass."""
+    flat = [candidate for candidates, _style in runs for candidate in candidates]
+    colors, brands, categories = _Vocabulary(), _Vocabulary(), _Vocabulary()
+    columns = CandidateColumns(
+        run_index=np.repeat(np.arange(len(runs), dtype=np.intp), [len(candidates) for candidates, _style in runs]),
+        sale_price=np.fromiter(
+            (float(item.get("sale_price", item.get("price", 0))) for item in flat), dtype=np.float64, count=len(flat)
+        ),
+        discount_pct=np.fromiter(
+            (float(item.get("discount_pct", 0)) for item in flat), dtype=np.float64, count=len(flat)
+        ),
+        color=colors.column(flat, "color"),
+        brand=brands.column(flat, "brand"),
+        category=categories.column(flat, "category"),
+        style_similarity=np.fromiter(
+            (float(item.get("style_similarity", 0)) for item in flat), dtype=np.float64, count=len(flat)
+        ),
+    )
+    styles = [style for _candidates, style in runs]
+    prefs = RankPreferences(
+        budget_max=np.asarray([float(style.get("budget_max") or 150) for style in styles], dtype=np.float64),
+        palette=colors.matrix([style.get("palette") or [] for style in styles]),
+        brands=brands.matrix([style.get("recommended_brands") or [] for style in styles]),
+        categories=categories.matrix([style.get("recommended_categories") or [] for style in styles]),
+    )
+    return columns, prefs
+
+
+def score_columns(columns: CandidateColumns, prefs: RankPreferences, weights: dict[str, float]) -> np.ndarray:
+    scores = np.zeros(len(columns.run_index), dtype=np.float64)
+    for name, weight in weights.items():
+        if weight:
+            scores = scores + FEATURES[name](columns, prefs) * weight
+    return _round4(scores)
+
+
+def _round4(values: np.ndarray) -> np.ndarray:
+    """np.round, except values next to a .5 boundary go through Python's correctly rounded round()."""
+    rounded = np.round(values, 4)
+    scaled = values * 10000
+    for idx in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6):
+        rounded[idx] = round(float(values[idx]), 4)
+    return rounded
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k best scores, best first; ties keep input order (like a stable sort) without sorting all."""
+    if k <= 0 or not len(scores):
+        return np.empty(0, dtype=np.intp)
+    if len(scores) > k:
+        threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        above = np.flatnonzero(scores > threshold)
+        tied = np.flatnonzero(scores == threshold)[: k - len(above)]
+        chosen = np.concatenate([above, tied])
+    else:
+        chosen = np.arange(len(scores))
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
+
+
+def rank_batch(runs: list[tuple[list[dict], dict]], weights: dict[str, float], k: int = 10) -> list[list[dict]]:
+    """Score every run's candidates in one pass and return each run's top k, highest score first."""
+    columns, prefs = build_inputs(runs)
+    scores = score_columns(columns, prefs, weights)
+    ranked: list[list[dict]] = []
+    start = 0
+    for candidates, _style in runs:
+        end = start + len(candidates)
+        best = top_k(scores[start:end], k)
+        ranked.append([{**candidates[idx], "score": float(scores[start + idx])} for idx in best])
+        start = end
+    return ranked
+
+
+def rank_candidates(candidates: list[dict], style: dict, weights: dict[str, float], k: int = 10) -> list[dict]:
+    return rank_batch([(candidates, style)], weights, k)[0]
@@ -1,2 +1,60 @@
-def put_json_artifact(_key: str, _payload: dict) -> str:
-    return "inline://artifact"
+import hashlib
+import json
+import os
+from collections.abc import Callable
+
+from personal_stylist_common.artifact_storage import ArtifactStore, blob_storage_key
+
+ARTIFACT_STORAGE_BACKEND = os.getenv("ARTIFACT_STORAGE_BACKEND", "minio").strip().lower()
+ARTIFACT_INLINE_MAX_BYTES = int(os.getenv("ARTIFACT_INLINE_MAX_BYTES", "32768"))
+ARTIFACT_FS_ROOT = os.getenv("ARTIFACT_FS_ROOT", "/tmp/stylist-artifacts")
+ARTIFACT_ZSTD_LEVEL = int(os.getenv("ARTIFACT_ZSTD_LEVEL", "3"))
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
+MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
+MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
+MINIO_BUCKET = os.getenv("MINIO_BUCKET", "stylist-artifacts")
+MINIO_SECURE = os.getenv("MINIO_SECURE", "0") == "1"
+
+artifact_store = ArtifactStore(
+    fs_root=ARTIFACT_FS_ROOT,
+    minio_endpoint=MINIO_ENDPOINT,
+    minio_access_key=MINIO_ACCESS_KEY,
+    minio_secret_key=MINIO_SECRET_KEY,
+    minio_bucket=MINIO_BUCKET,
+    minio_secure=MINIO_SECURE,
+    backend=ARTIFACT_STORAGE_BACKEND,
+    zstd_level=ARTIFACT_ZSTD_LEVEL,
+    create_bucket=True,
+)
+
+
+def put_json_artifact(key: str, payload_json: str) -> str:
+    """Write a zstd-compressed JSON document to the configured backend and return its storage key."""
+    return artifact_store.put_json(key, payload_json)
+
+
+def get_json_artifact(storage_backend: str, key: str) -> dict:
+    return artifact_store.get_json(storage_backend, key)
+
+
+def delete_json_artifact(storage_backend: str, key: str) -> None:
+    artifact_store.delete(storage_backend, key)
+
+
+def place_artifact(payload: dict, blob_exists: Callable[[str], bool] = lambda _content_hash: False) -> dict:
+    """Content-address ``payload``: keep small payloads inline in Postgres and move large ones to object storage.
+
+    Returns the column values for its artifact_blobs row: content_hash, size_bytes, storage_backend, storage_key and
+    inline_json. Large payloads are uploaded only when ``blob_exists`` says the hash is not stored yet.
+    """
+    payload_json = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    payload_bytes = payload_json.encode("utf-8")
+    content_hash = hashlib.sha256(payload_bytes).hexdigest()
+    placement = {"content_hash": content_hash, "size_bytes": len(payload_bytes)}
+    if len(payload_bytes) <= ARTIFACT_INLINE_MAX_BYTES:
+        return {**placement, "storage_backend": "inline", "storage_key": None, "inline_json": payload_json}
+
+    key = blob_storage_key(content_hash)
+    if not blob_exists(content_hash):
+        put_json_artifact(key, payload_json)
+    return {**placement, "storage_backend": artifact_store.backend, "storage_key": key, "inline_json": None}
@@ -0,0 +1,218 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Products and style briefs are embedded by feature hashing into the same space: tokens are hashed (crc32, stable
+# across processes) into EMBEDDING_DIM signed buckets and the vector is L2-normalized, so a dot product is a cosine.
+# Field-tagged tokens ("color:navy") let a brief's palette, categories and brands line up with product attributes.
+EMBEDDING_DIM = 128
+INDEX_VERSION = 1
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> list[str]:
+    return [token for token in _TOKEN.findall(str(text or "").lower()) if len(token) > 1]
+
+
+def encode_tokens(weighted_tokens: list[tuple[str, float]]) -> np.ndarray:
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for token, weight in weighted_tokens:
+        digest = zlib.crc32(token.encode("utf-8"))
+        vector[digest % EMBEDDING_DIM] += weight if digest & 0x80000000 else -weight
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def product_tokens(row: dict) -> list[tuple[str, float]]:
+    tokens = [(token, 1.0) for token in _tokens(row.get("title"))]
+    tokens.append((f"brand:{row.get('brand_key') or ''}", 1.5))
+    tokens.append((f"category:{str(row.get('category') or '').lower()}", 2.0))
+    tokens.append((f"color:{str(row.get('color') or '').lower()}", 1.5))
+    return tokens
+
+
+def style_tokens(style: dict) -> list[tuple[str, float]]:
+    tokens = []
+    for vibe in style.get("inferred_vibes") or []:
+        tokens.extend((token, 1.0) for token in _tokens(vibe))
+    for color in style.get("palette") or []:
+        tokens.append((f"color:{str(color).lower()}", 1.5))
+        tokens.extend((token, 0.5) for token in _tokens(color))
+    for category in style.get("recommended_categories") or []:
+        tokens.append((f"category:{str(category).lower()}", 2.0))
+        tokens.extend((token, 0.5) for token in _tokens(category))
+    for brand in style.get("recommended_brands") or []:
+        tokens.append((f"brand:{re.sub(r'[^a-z0-9]+', '', str(brand).lower())}", 1.5))
+    tokens.extend((token, 0.5) for token in _tokens(style.get("style_summary")))
+    return tokens
+
+
+def encode_products(rows: list[dict]) -> np.ndarray:
+    vectors = np.zeros((len(rows), EMBEDDING_DIM), dtype=np.float32)
+    for idx, row in enumerate(rows):
+        vectors[idx] = encode_tokens(product_tokens(row))
+    return vectors
+
+
+def encode_style(style: dict) -> np.ndarray:
+    return encode_tokens(style_tokens(style))
+
+
+def _train_centroids(vectors: np.ndarray, nlist: int, iterations: int = 8, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample; good enough for a coarse IVF quantizer."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(len(vectors), nlist * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = _nearest_centroid(sample, centroids)
+        for list_id in range(nlist):
+            members = sample[assignment == list_id]
+            if len(members):
+                centroid = members.sum(axis=0)
+                norm = float(np.linalg.norm(centroid))
+                centroids[list_id] = centroid / norm if norm else centroid
+    return centroids
+
+
+def _nearest_centroid(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    assignment = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk):
+        assignment[start : start + chunk] = np.argmax(
+            vectors[start : start + chunk].astype(np.float32) @ centroids.T, axis=1
+        )
+    return assignment
+
+
+class StyleIndex:
+    """IVF index over product embeddings; every array is memory-mapped read-only from one version directory."""
+
+    def __init__(self, directory: str):
+        self.version = os.path.basename(directory)
+        with open(os.path.join(directory, "meta.json")) as handle:
+            self.meta = json.load(handle)
+        self.centroids = np.load(os.path.join(directory, "centroids.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.skus = np.load(os.path.join(directory, "skus.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.skus)
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = 8) -> list[tuple[str, float]]:
+        """Top ``k`` (sku, cosine) among the ``nprobe`` lists whose centroids are closest to ``query``."""
+        if not len(self) or k <= 0:
+            return []
+        centroid_scores = np.asarray(self.centroids) @ query
+        nprobe = min(nprobe, len(centroid_scores))
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        # Each inverted list is a contiguous slice of the mapped vectors, so only the probed pages are touched.
+        spans = [(int(self.offsets[probe]), int(self.offsets[probe + 1])) for probe in probes]
+        ids = np.concatenate([np.arange(start, end) for start, end in spans])
+        if not len(ids):
+            return []
+        scores = np.concatenate([self.vectors[start:end].astype(np.float32) @ query for start, end in spans])
+        best = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.skus[ids[idx]].decode("utf-8"), float(scores[idx])) for idx in best]
+
+
+def _write_version(
+    root: str, skus: np.ndarray, vectors: np.ndarray, centroids: np.ndarray, assignment: np.ndarray, meta: dict
+) -> str:
+    order = np.argsort(assignment, kind="stable")
+    offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(assignment, minlength=len(centroids)))
+
+    version = f"v{time.time_ns()}"
+    directory = os.path.join(root, version)
+    os.makedirs(directory)
+    np.save(os.path.join(directory, "centroids.npy"), centroids.astype(np.float32))
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+    np.save(os.path.join(directory, "vectors.npy"), vectors[order].astype(np.float16))
+    np.save(os.path.join(directory, "skus.npy"), skus[order])
+    with open(os.path.join(directory, "meta.json"), "w") as handle:
+        json.dump({**meta, "version": INDEX_VERSION, "count": int(len(skus)), "nlist": int(len(centroids))}, handle)
+
+    pointer = os.path.join(root, "CURRENT")
+    with open(f"{pointer}.tmp", "w") as handle:
+        handle.write(version)
+    os.replace(f"{pointer}.tmp", pointer)
+    # Keep the previous version for readers that mapped it just before the switch.
+    for stale in sorted(name for name in os.listdir(root) if name.startswith("v"))[:-2]:
+        shutil.rmtree(os.path.join(root, stale), ignore_errors=True)
+    return version
+
+
+def update_style_index(root: str, rows: list[dict], watermark: str | None, retrain_growth: float = 2.0) -> dict:
+    """Fold new or changed catalog rows into the index at ``root``.
+
+    Existing vectors are reused and new ones assigned to the current centroids; the quantizer is only retrained
+    when the index has grown ``retrain_growth`` times since it was last trained (or has never been trained).
+    """
+    os.makedirs(root, exist_ok=True)
+    current = load_style_index(root)
+    new_skus = np.asarray([str(row["sku"]) for row in rows], dtype="S64")
+    new_vectors = encode_products(rows)
+
+    if current is not None and len(current):
+        keep = ~np.isin(np.asarray(current.skus), new_skus)
+        skus = np.concatenate([np.asarray(current.skus)[keep], new_skus])
+        vectors = np.concatenate([np.asarray(current.vectors, dtype=np.float32)[keep], new_vectors])
+        kept_lists = np.repeat(np.arange(len(current.offsets) - 1, dtype=np.int32), np.diff(current.offsets))[keep]
+    else:
+        skus, vectors = new_skus, new_vectors
+        kept_lists = np.empty(0, dtype=np.int32)
+
+    trained_count = int(current.meta.get("trained_count", 0)) if current is not None else 0
+    nlist = max(1, min(1024, int(np.sqrt(max(len(vectors), 1)))))
+    retrain = current is None or not trained_count or len(vectors) >= trained_count * retrain_growth
+    if retrain and len(vectors):
+        centroids = _train_centroids(vectors, min(nlist, len(vectors)))
+        assignment = _nearest_centroid(vectors, centroids)
+        trained_count = len(vectors)
+    elif current is not None:
+        # Same quantizer: existing vectors keep their lists and only the new rows are assigned.
+        centroids = np.asarray(current.centroids, dtype=np.float32)
+        assignment = np.concatenate([kept_lists, _nearest_centroid(new_vectors, centroids)])
+    else:
+        centroids = np.zeros((1, EMBEDDING_DIM), dtype=np.float32)
+        assignment = np.empty(0, dtype=np.int32)
+
+    version = _write_version(
+        root,
+        skus,
+        vectors,
+        centroids,
+        assignment,
+        {"watermark": watermark, "trained_count": trained_count, "built_at": time.time()},
+    )
+    return {"version": version, "count": int(len(skus)), "added": int(len(rows)), "retrained": bool(retrain)}
+
+
+_indexes: dict[str, tuple[str, StyleIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def load_style_index(root: str) -> StyleIndex | None:
+    """Return the index version ``root/CURRENT`` points at, mapping a new version only when the pointer moves."""
+    try:
+        with open(os.path.join(root, "CURRENT")) as handle:
+            version = handle.read().strip()
+    except OSError:
+        return None
+    with _indexes_lock:
+        cached = _indexes.get(root)
+        if cached and cached[0] == version:
+            return cached[1]
+        try:
+            index = StyleIndex(os.path.join(root, version))
+        except (OSError, ValueError):
+            return None
+        _indexes[root] = (version, index)
+        return index
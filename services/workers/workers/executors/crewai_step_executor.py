@@ -2,34 +2,125 @@ import base64
 import colorsys
 import hashlib
 import json
+import math
 import os
 import re
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from io import BytesIO
+from pathlib import Path
 from urllib.parse import quote_plus
 
 import requests
-from PIL import Image
+from personal_stylist_common.drive_batch import DRIVE_BATCH_URL, DriveBatchClient
+from personal_stylist_common.hashing import stable_sha256
+from PIL import Image, ImageFilter, ImageStat
+from sqlalchemy import text
+
+from workers.common.attributes import extract_attributes, guess_color
+from workers.common.catalog_snapshot import load_snapshot, segment_key, write_snapshot
+from workers.common.db import exec_all, exec_many, exec_one, exec_write, transaction
+from workers.common.drive_tokens import drive_tokens
+from workers.common.ranking import parse_weights, rank_candidates
+from workers.common.storage import delete_json_artifact, get_json_artifact, place_artifact
+from workers.common.style_index import encode_products, encode_style, load_style_index, update_style_index
 
-from workers.common.db import exec_one, exec_write
-
-GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
 GOOGLE_DRIVE_API = "https://www.googleapis.com/drive/v3"
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID", "")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET", "")
+GOOGLE_DRIVE_BATCH_URL = os.getenv("GOOGLE_DRIVE_BATCH_URL", DRIVE_BATCH_URL)
+PHOTO_METADATA_FIELDS = "id,name,mimeType,createdTime,modifiedTime,md5Checksum,imageMediaMetadata(width,height,time)"
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta/openai")
 GEMINI_VISION_MODEL = os.getenv("GEMINI_VISION_MODEL", "gemini-2.5-flash")
+GEMINI_IMAGE_TRANSPORT = os.getenv("GEMINI_IMAGE_TRANSPORT", "inline").strip().lower()
+GEMINI_UPLOAD_BASE = os.getenv("GEMINI_UPLOAD_BASE", "https://generativelanguage.googleapis.com/upload/v1beta")
 SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY", "")
 SERPAPI_ENDPOINT = os.getenv("SERPAPI_ENDPOINT", "https://serpapi.com/search.json")
 PRODUCT_DATA_MODE = os.getenv("PRODUCT_DATA_MODE", "auto").strip().lower()
+PRODUCT_CATALOG_TTL_HOURS = float(os.getenv("PRODUCT_CATALOG_TTL_HOURS", "12"))
+PRODUCT_CATALOG_SNAPSHOT_PATH = os.getenv("PRODUCT_CATALOG_SNAPSHOT_PATH", "/tmp/stylist-catalog/product_catalog.snap")
+PRODUCT_PRICE_BAND_WIDTH = 25
+PRODUCT_STYLE_INDEX_PATH = os.getenv("PRODUCT_STYLE_INDEX_PATH", "/tmp/stylist-catalog/style_index")
+# e.g. "budget=0.4,discount=0.3,palette=0.1,brand_affinity=0.1,category=0.1"; empty keeps the original weights.
+RANK_WEIGHTS = parse_weights(os.getenv("RANK_WEIGHTS", ""))
+RANK_TOP_K = int(os.getenv("RANK_TOP_K", "10"))
+RANK_STYLE_CANDIDATES = int(os.getenv("RANK_STYLE_CANDIDATES", "50"))
+RANK_STYLE_NPROBE = int(os.getenv("RANK_STYLE_NPROBE", "8"))
+STYLE_BRIEF_MAX_IMAGES = int(os.getenv("STYLE_BRIEF_MAX_IMAGES", "4"))
+STYLE_BRIEF_CANDIDATE_POOL = int(os.getenv("STYLE_BRIEF_CANDIDATE_POOL", "8"))
+STYLE_BRIEF_IMAGE_BYTE_BUDGET = int(os.getenv("STYLE_BRIEF_IMAGE_BYTE_BUDGET", "1200000"))
+STYLE_BRIEF_IMAGE_TOKEN_BUDGET = int(os.getenv("STYLE_BRIEF_IMAGE_TOKEN_BUDGET", "2064"))
+STYLE_BRIEF_DUPLICATE_DISTANCE = int(os.getenv("STYLE_BRIEF_DUPLICATE_DISTANCE", "6"))
+STYLE_BRIEF_LLM_DEADLINE_SECONDS = float(os.getenv("STYLE_BRIEF_LLM_DEADLINE_SECONDS", "90"))
+STYLE_BRIEF_LLM_MAX_CONCURRENCY = int(os.getenv("STYLE_BRIEF_LLM_MAX_CONCURRENCY", "4"))
+STYLE_BRIEF_CACHE_TTL_HOURS = float(os.getenv("STYLE_BRIEF_CACHE_TTL_HOURS", "168"))
+# Bump when prompt or normalization changes so cached briefs are not reused across incompatible versions.
+STYLE_BRIEF_CACHE_VERSION = "1"
+
+# Steps whose artifact is a pure function of their declared memo inputs (see _step_memo_inputs), with how long a
+# memoized artifact may be reused. DEALS reflects live prices, so it gets a short TTL of its own.
+STEP_MEMO_TTL_HOURS = {
+    "DEALS": float(os.getenv("DEALS_MEMO_TTL_HOURS", "6")),
+    "RANK": float(os.getenv("STEP_MEMO_TTL_HOURS", "168")),
+    "TRYON": float(os.getenv("STEP_MEMO_TTL_HOURS", "168")),
+    "CHECKOUT_DRAFT": float(os.getenv("STEP_MEMO_TTL_HOURS", "168")),
+}
+# Bump to invalidate every memo by hand; code changes are picked up by STEP_MEMO_CODE_VERSION below.
+STEP_MEMO_VERSION = "1"
+# Sources that shape memoized artifacts. Their digest (plus STEP_MEMO_BUILD_ID, e.g. the image's git sha) is part of
+# every memo key, so a deploy that changes DEALS/RANK/TRYON/CHECKOUT_DRAFT logic never reuses older artifacts.
+STEP_MEMO_CODE_MODULES = (
+    "executors/crewai_step_executor.py",
+    "common/ranking.py",
+    "common/attributes.py",
+    "common/style_index.py",
+)
+
+# Mirrors TaskSpec.requires_inputs in personal_stylist_crewai.tasks (kept in sync by test_step_sync).
+STEP_REQUIRES_INPUTS = {
+    "STYLE_BRIEF": ("drive_connection", "selected_drive_folder", "drive_photos"),
+    "DEALS": ("style_brief",),
+    "BRAND_SEARCH": ("style_brief", "deals"),
+    "RANK": ("style_brief", "brand_search"),
+    "TRYON": ("rank",),
+    "CHECKOUT_DRAFT": ("rank",),
+}
+ARTIFACT_KINDS = {step_key.lower() for step_key in STEP_REQUIRES_INPUTS}
+# Unreferenced blobs are kept this long so a memo hit or a concurrent duplicate can still claim them.
+ARTIFACT_BLOB_GC_GRACE_HOURS = float(os.getenv("ARTIFACT_BLOB_GC_GRACE_HOURS", "24"))
+ARTIFACT_BLOB_GC_BATCH = int(os.getenv("ARTIFACT_BLOB_GC_BATCH", "500"))
+
+# (max edge in px, JPEG quality), from richest to cheapest.
+IMAGE_ENCODING_LADDER = [(1024, 82), (896, 80), (768, 78), (640, 75), (512, 72), (384, 70)]
+GEMINI_TOKENS_PER_TILE = 258
+GEMINI_TILE_SIZE = 768
+
+drive_batch = DriveBatchClient(GOOGLE_DRIVE_BATCH_URL)
+# Shared by every STYLE_BRIEF in the process so calls abandoned at the deadline cannot pile up without bound.
+style_brief_llm_pool = ThreadPoolExecutor(
+    max_workers=STYLE_BRIEF_LLM_MAX_CONCURRENCY, thread_name_prefix="style-brief-llm"
+)
 
 
 def _utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def _parse_rfc3339(value) -> datetime | None:
+    if not isinstance(value, str) or not value.strip():
+        return None
+    # Provider timestamps carry nanoseconds and a trailing Z; fromisoformat wants at most micros.
+    normalized = re.sub(r"(\.\d{6})\d+", r"\1", value.strip()).replace("Z", "+00:00")
+    try:
+        parsed = datetime.fromisoformat(normalized)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
 def _parse_json(value):
     if isinstance(value, dict):
         return value
@@ -41,105 +132,133 @@ def _parse_json(value):
     return {}
 
 
+def _artifact_row_payload(row) -> dict:
+    storage_backend = row.get("storage_backend") or "inline"
+    if row.get("inline_json") is None and storage_backend != "inline" and row.get("storage_key"):
+        return get_json_artifact(storage_backend, row["storage_key"])
+    return _parse_json(row.get("inline_json"))
+
+
 def _get_artifact(run_id, kind: str) -> dict:
     row = exec_one(
         """
-        SELECT inline_json
-        FROM artifacts
-        WHERE run_id=:run_id AND kind=:kind
-        ORDER BY created_at DESC
+        SELECT COALESCE(b.inline_json, a.inline_json) AS inline_json,
+               COALESCE(b.storage_backend, a.storage_backend) AS storage_backend,
+               COALESCE(b.storage_key, a.storage_key) AS storage_key
+        FROM artifacts a
+        LEFT JOIN artifact_blobs b ON b.content_hash = a.blob_hash
+        WHERE a.run_id=:run_id AND a.kind=:kind
+        ORDER BY a.created_at DESC
         LIMIT 1
         """,
         {"run_id": run_id, "kind": kind},
     )
     if not row:
         return {}
-    return _parse_json(row.get("inline_json"))
+    return _artifact_row_payload(row)
 
 
-def _get_run_user(run_id):
-    row = exec_one("SELECT user_id FROM runs WHERE id=:run_id", {"run_id": run_id})
-    return row.get("user_id") if row else None
+class RunCanceled(Exception):
+    """The run was canceled while one of its steps was in flight."""
 
 
-def _get_selected_drive_folder(user_id):
-    return exec_one(
-        """
-        SELECT folder_id, folder_name
-        FROM drive_folders
-        WHERE user_id=:user_id AND is_selected=TRUE
-        ORDER BY created_at DESC
-        LIMIT 1
-        """,
-        {"user_id": user_id},
-    )
+def _raise_if_run_canceled(run_id) -> None:
+    # Checked between outbound provider calls, so a canceled run stops spending quota and frees its worker slot.
+    if run_id is None:
+        return
+    row = exec_one("SELECT status FROM runs WHERE id=:run_id", {"run_id": run_id})
+    if row and row["status"] == "CANCELED":
+        raise RunCanceled(f"run {run_id} was canceled")
 
 
-def _get_drive_connection(user_id):
-    return exec_one(
-        """
-        SELECT access_token, refresh_token, token_expiry
-        FROM drive_connections
-        WHERE user_id=:user_id
-        """,
-        {"user_id": user_id},
-    )
+@dataclass
+class RunContext:
+    """Everything a step reads about its run, loaded up front in a single query."""
 
+    run_id: uuid.UUID
+    user_id: uuid.UUID | None
+    user_email: str | None = None
+    folder: dict | None = None
+    artifacts: dict[str, dict] = field(default_factory=dict)
+    # Set for runs created by /runs/{id}/rerun: the steps they execute are recomputed, never served from a memo.
+    rerun_from: str | None = None
 
-def _refresh_drive_access_token(user_id, refresh_token: str):
-    if not GOOGLE_CLIENT_ID or not GOOGLE_CLIENT_SECRET:
-        raise RuntimeError("Google OAuth client credentials are not configured in worker env")
+    def artifact(self, kind: str) -> dict:
+        return self.artifacts.get(kind, {})
 
-    response = requests.post(
-        GOOGLE_TOKEN_URL,
-        data={
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "grant_type": "refresh_token",
-            "refresh_token": refresh_token,
-        },
-        timeout=20,
-    )
-    if response.status_code >= 400:
-        raise RuntimeError(f"Failed refreshing Google Drive token: {response.text[:200]}")
 
-    payload = response.json()
-    access_token = payload.get("access_token")
-    if not access_token:
-        raise RuntimeError("Refresh token flow returned no access_token")
+def _required_artifact_kinds(step_key: str) -> list[str]:
+    return [name for name in STEP_REQUIRES_INPUTS.get(step_key, ()) if name in ARTIFACT_KINDS]
 
-    expires_in = payload.get("expires_in", 3600)
-    token_expiry = _utcnow() + timedelta(seconds=max(0, int(expires_in) - 30))
 
-    exec_write(
+def _load_run_context(run_id, step_key: str) -> RunContext:
+    row = exec_one(
         """
-        UPDATE drive_connections
-        SET access_token=:access_token, token_expiry=:token_expiry, updated_at=:updated_at
-        WHERE user_id=:user_id
+        SELECT r.id AS run_id, r.user_id, u.email AS user_email, r.rerun_from,
+               f.folder_id, f.folder_name,
+               COALESCE(
+                 (
+                   SELECT jsonb_object_agg(
+                     a.kind,
+                     jsonb_build_object(
+                       'inline_json', a.inline_json,
+                       'storage_backend', a.storage_backend,
+                       'storage_key', a.storage_key
+                     )
+                   )
+                   FROM (
+                     SELECT DISTINCT ON (a.kind) a.kind,
+                            COALESCE(b.inline_json, a.inline_json) AS inline_json,
+                            COALESCE(b.storage_backend, a.storage_backend) AS storage_backend,
+                            COALESCE(b.storage_key, a.storage_key) AS storage_key
+                     FROM artifacts a
+                     LEFT JOIN artifact_blobs b ON b.content_hash = a.blob_hash
+                     WHERE a.run_id = r.id AND a.kind = ANY(CAST(:kinds AS TEXT[]))
+                     ORDER BY a.kind, a.created_at DESC
+                   ) a
+                 ),
+                 '{}'::jsonb
+               ) AS artifacts
+        FROM runs r
+        JOIN users u ON u.id = r.user_id
+        LEFT JOIN LATERAL (
+          SELECT folder_id, folder_name
+          FROM drive_folders
+          WHERE user_id = r.user_id AND is_selected = TRUE
+          ORDER BY created_at DESC
+          LIMIT 1
+        ) f ON TRUE
+        WHERE r.id = :run_id
         """,
-        {
-            "access_token": access_token,
-            "token_expiry": token_expiry,
-            "updated_at": _utcnow(),
-            "user_id": user_id,
-        },
+        {"run_id": run_id, "kinds": _required_artifact_kinds(step_key)},
+    )
+    if not row:
+        return RunContext(run_id=run_id, user_id=None)
+
+    artifact_rows = _parse_json(row.get("artifacts"))
+    return RunContext(
+        run_id=run_id,
+        user_id=row.get("user_id"),
+        user_email=row.get("user_email"),
+        folder=(
+            {"folder_id": row["folder_id"], "folder_name": row.get("folder_name")} if row.get("folder_id") else None
+        ),
+        artifacts={kind: _artifact_row_payload(item) for kind, item in artifact_rows.items()},
+        rerun_from=row.get("rerun_from"),
     )
-    return access_token
-
-
-def _ensure_drive_access_token(user_id):
-    conn = _get_drive_connection(user_id)
-    if not conn:
-        return None
-
-    token_expiry = conn.get("token_expiry")
-    if conn.get("access_token") and token_expiry and token_expiry > _utcnow() + timedelta(seconds=60):
-        return conn.get("access_token")
 
-    if conn.get("refresh_token"):
-        return _refresh_drive_access_token(user_id, conn["refresh_token"])
 
-    return conn.get("access_token")
+def _get_selected_drive_folder(user_id):
+    return exec_one(
+        """
+        SELECT folder_id, folder_name
+        FROM drive_folders
+        WHERE user_id=:user_id AND is_selected=TRUE
+        ORDER BY created_at DESC
+        LIMIT 1
+        """,
+        {"user_id": user_id},
+    )
 
 
 def _drive_list_images(access_token: str, folder_id: str, limit: int = 40) -> list[dict]:
@@ -148,7 +267,7 @@ def _drive_list_images(access_token: str, folder_id: str, limit: int = 40) -> li
         headers={"Authorization": f"Bearer {access_token}"},
         params={
             "q": f"'{folder_id}' in parents and mimeType contains 'image/' and trashed=false",
-            "fields": "files(id,name,mimeType,createdTime,imageMediaMetadata(width,height,time))",
+            "fields": f"files({PHOTO_METADATA_FIELDS})",
             "orderBy": "createdTime desc",
             "pageSize": max(1, min(limit, 200)),
             "includeItemsFromAllDrives": "true",
@@ -161,6 +280,12 @@ def _drive_list_images(access_token: str, folder_id: str, limit: int = 40) -> li
     return response.json().get("files", [])
 
 
+def _drive_files_metadata(access_token: str, file_ids: list[str]) -> dict[str, dict]:
+    """Metadata for many files in ceil(N/100) batch calls; files whose part failed are left out."""
+    results = drive_batch.get_files_metadata(access_token, file_ids, PHOTO_METADATA_FIELDS)
+    return {file_id: item for file_id, item in results.items() if isinstance(item, dict)}
+
+
 def _download_drive_image(access_token: str, file_id: str) -> Image.Image | None:
     response = requests.get(
         f"{GOOGLE_DRIVE_API}/files/{file_id}",
@@ -176,36 +301,423 @@ def _download_drive_image(access_token: str, file_id: str) -> Image.Image | None
         return None
 
 
-def _image_to_data_uri(image: Image.Image, max_size: int = 1024, quality: int = 82) -> str:
+def _image_to_jpeg_bytes(image: Image.Image, max_size: int = 1024, quality: int = 82) -> bytes:
     img = image.copy()
     img.thumbnail((max_size, max_size))
     buffer = BytesIO()
     img.save(buffer, format="JPEG", quality=quality, optimize=True)
-    encoded = base64.b64encode(buffer.getvalue()).decode("utf-8")
+    return buffer.getvalue()
+
+
+def _jpeg_data_uri(jpeg_bytes: bytes) -> str:
+    encoded = base64.b64encode(jpeg_bytes).decode("utf-8")
     return f"data:image/jpeg;base64,{encoded}"
 
 
+def _image_to_data_uri(image: Image.Image, max_size: int = 1024, quality: int = 82) -> str:
+    return _jpeg_data_uri(_image_to_jpeg_bytes(image, max_size=max_size, quality=quality))
+
+
+def _perceptual_hash(image: Image.Image) -> int:
+    """64-bit difference hash: one bit per horizontal brightness gradient on a 9x8 grayscale grid."""
+    gray = image.convert("L").resize((9, 8))
+    pixels = list(gray.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | int(pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def _hamming_distance(left: int, right: int) -> int:
+    return bin(left ^ right).count("1")
+
+
+def _select_diverse_images(candidates: list[dict], max_images: int, duplicate_distance: int) -> list[dict]:
+    """Drop near-duplicate shots, then greedily pick the photos farthest from everything already chosen."""
+    unique: list[dict] = []
+    for candidate in candidates:
+        duplicate_of = next(
+            (
+                idx
+                for idx, kept in enumerate(unique)
+                if _hamming_distance(candidate["phash"], kept["phash"]) <= duplicate_distance
+            ),
+            None,
+        )
+        if duplicate_of is None:
+            unique.append(candidate)
+        elif float(candidate.get("sharpness") or 0) > float(unique[duplicate_of].get("sharpness") or 0):
+            # Within a burst keep the sharpest frame.
+            unique[duplicate_of] = candidate
+    if not unique:
+        return []
+
+    # Candidates arrive newest first, so ties keep the most recent photo.
+    selected = [unique[0]]
+    remaining = unique[1:]
+    while remaining and len(selected) < max(1, max_images):
+        best = max(
+            remaining,
+            key=lambda item: min(_hamming_distance(item["phash"], chosen["phash"]) for chosen in selected),
+        )
+        selected.append(best)
+        remaining.remove(best)
+    return selected
+
+
+def _estimate_image_tokens(width: int, height: int) -> int:
+    if width <= 384 and height <= 384:
+        return GEMINI_TOKENS_PER_TILE
+    tiles = math.ceil(width / GEMINI_TILE_SIZE) * math.ceil(height / GEMINI_TILE_SIZE)
+    return tiles * GEMINI_TOKENS_PER_TILE
+
+
+def _scaled_size(image: Image.Image, max_size: int) -> tuple[int, int]:
+    width, height = image.size
+    scale = min(1.0, max_size / max(width, height, 1))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _encode_within_budget(images: list[Image.Image], byte_budget: int, token_budget: int) -> tuple[list[bytes], int, int]:
+    """Pick the richest ladder rung whose estimated tokens and encoded bytes both fit the budget."""
+    encoded: list[bytes] = []
+    max_size, quality = IMAGE_ENCODING_LADDER[-1]
+    for max_size, quality in IMAGE_ENCODING_LADDER:
+        tokens = sum(_estimate_image_tokens(*_scaled_size(img, max_size)) for img in images)
+        if tokens > token_budget and (max_size, quality) != IMAGE_ENCODING_LADDER[-1]:
+            continue
+        encoded = [_image_to_jpeg_bytes(img, max_size=max_size, quality=quality) for img in images]
+        if sum(len(data) for data in encoded) <= byte_budget:
+            break
+    return encoded, max_size, quality
+
+
+def _photo_checksum(photo: dict) -> str:
+    return str(photo.get("md5Checksum") or photo.get("modifiedTime") or "")
+
+
+def _signed_int64(value: int) -> int:
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _mean_rgb(image: Image.Image) -> tuple[int, int, int] | None:
+    img = image.copy()
+    img.thumbnail((96, 96))
+    pixels = list(img.getdata())
+    if not pixels:
+        return None
+
+    stride = max(1, len(pixels) // 800)
+    sampled = pixels[::stride] or pixels
+    return (
+        int(sum(p[0] for p in sampled) / len(sampled)),
+        int(sum(p[1] for p in sampled) / len(sampled)),
+        int(sum(p[2] for p in sampled) / len(sampled)),
+    )
+
+
+def _color_histogram(image: Image.Image) -> bytes:
+    """4x4x4 RGB histogram, one byte per bin holding its share of pixels scaled to 0-255."""
+    img = image.copy()
+    img.thumbnail((64, 64))
+    counts = [0] * 64
+    pixels = list(img.getdata())
+    for r, g, b in pixels:
+        counts[(r >> 6) * 16 + (g >> 6) * 4 + (b >> 6)] += 1
+    total = max(1, len(pixels))
+    return bytes(min(255, round(count * 255 / total)) for count in counts)
+
+
+def _sharpness(image: Image.Image) -> float:
+    gray = image.convert("L")
+    gray.thumbnail((256, 256))
+    return round(float(ImageStat.Stat(gray.filter(ImageFilter.FIND_EDGES)).var[0]), 2)
+
+
+def _compute_photo_features(image: Image.Image, photo: dict) -> dict:
+    width, height = image.size
+    return {
+        "file_id": str(photo["id"]),
+        "checksum": _photo_checksum(photo),
+        "width": width,
+        "height": height,
+        "mean_rgb": list(_mean_rgb(image) or (0, 0, 0)),
+        "color_histogram": _color_histogram(image),
+        "phash": _perceptual_hash(image),
+        "sharpness": _sharpness(image),
+    }
+
+
+def _load_photo_features(photos: list[dict]) -> dict[tuple[str, str], dict]:
+    keys = [(str(photo["id"]), _photo_checksum(photo)) for photo in photos if photo.get("id")]
+    keys = [key for key in keys if key[1]]
+    if not keys:
+        return {}
+    rows = exec_all(
+        """
+        SELECT pf.file_id, pf.checksum, pf.width, pf.height, pf.mean_rgb, pf.color_histogram,
+               pf.phash, pf.sharpness
+        FROM photo_features pf
+        JOIN unnest(CAST(:file_ids AS TEXT[]), CAST(:checksums AS TEXT[])) AS wanted(file_id, checksum)
+          ON pf.file_id = wanted.file_id AND pf.checksum = wanted.checksum
+        """,
+        {"file_ids": [key[0] for key in keys], "checksums": [key[1] for key in keys]},
+    )
+    features: dict[tuple[str, str], dict] = {}
+    for row in rows:
+        item = dict(row)
+        item["phash"] = int(item["phash"] or 0) & ((1 << 64) - 1)
+        item["color_histogram"] = bytes(item["color_histogram"] or b"")
+        item["mean_rgb"] = list(item["mean_rgb"] or [])
+        features[(item["file_id"], item["checksum"])] = item
+    return features
+
+
+def _store_photo_features(features: list[dict]) -> None:
+    exec_many(
+        """
+        INSERT INTO photo_features (
+          file_id, checksum, width, height, mean_rgb, color_histogram, phash, sharpness, created_at
+        )
+        VALUES (:file_id, :checksum, :width, :height, :mean_rgb, :color_histogram, :phash, :sharpness, :created_at)
+        ON CONFLICT (file_id, checksum) DO NOTHING
+        """,
+        [{**item, "phash": _signed_int64(item["phash"]), "created_at": _utcnow()} for item in features],
+    )
+
+
+def _attach_photo_features(access_token: str, photos: list[dict]) -> dict[str, Image.Image]:
+    """Attach stored features to each photo, computing and persisting them for the candidate pool on first sight.
+
+    Returns the images downloaded along the way so later stages can reuse them instead of fetching twice.
+    """
+    # Without a checksum stored features cannot be matched, so fill the gaps in one batched metadata lookup.
+    unchecked = [str(photo["id"]) for photo in photos if photo.get("id") and not _photo_checksum(photo)]
+    if unchecked:
+        try:
+            metadata = _drive_files_metadata(access_token, unchecked)
+        except Exception:
+            metadata = {}
+        for photo in photos:
+            photo.update(metadata.get(str(photo.get("id")), {}))
+
+    stored = _load_photo_features(photos)
+    downloaded: dict[str, Image.Image] = {}
+    fresh: list[dict] = []
+    for position, photo in enumerate(photos):
+        if not photo.get("id"):
+            continue
+        features = stored.get((str(photo["id"]), _photo_checksum(photo)))
+        if features is None and position < STYLE_BRIEF_CANDIDATE_POOL:
+            img = _download_drive_image(access_token, photo["id"])
+            if img is None:
+                continue
+            features = _compute_photo_features(img, photo)
+            # Without a checksum the row could never be invalidated, so such features live for this run only.
+            if features["checksum"]:
+                fresh.append(features)
+            # Nothing downstream encodes above the top ladder rung, so keep only that much in memory.
+            img.thumbnail((IMAGE_ENCODING_LADDER[0][0], IMAGE_ENCODING_LADDER[0][0]))
+            downloaded[photo["id"]] = img
+        if features is not None:
+            photo["features"] = features
+
+    if fresh:
+        try:
+            _store_photo_features(fresh)
+        except Exception:
+            # Features are a cache; a failed write only means they get recomputed next run.
+            pass
+    return downloaded
+
+
 def _prepare_images_for_multimodal_analysis(
-    access_token: str, photos: list[dict], max_images: int = 4
+    access_token: str, photos: list[dict], max_images: int = 4, downloaded: dict | None = None
 ) -> list[dict]:
-    prepared: list[dict] = []
-    for photo in photos[:max_images]:
+    downloaded = dict(downloaded or {})
+    pool_size = max(max_images, STYLE_BRIEF_CANDIDATE_POOL)
+    candidates: list[dict] = []
+    for photo in photos[:pool_size]:
         photo_id = photo.get("id")
         if not photo_id:
             continue
-        img = _download_drive_image(access_token, photo_id)
-        if img is None:
-            continue
-        prepared.append(
-            {
-                "id": photo_id,
-                "name": str(photo.get("name", "")),
-                "data_uri": _image_to_data_uri(img),
-            }
+        features = photo.get("features")
+        if features is None:
+            img = downloaded.get(photo_id) or _download_drive_image(access_token, photo_id)
+            if img is None:
+                continue
+            downloaded[photo_id] = img
+            features = {"phash": _perceptual_hash(img), "sharpness": _sharpness(img)}
+        candidates.append({"photo": photo, "phash": features["phash"], "sharpness": features.get("sharpness")})
+
+    selected: list[dict] = []
+    for item in _select_diverse_images(candidates, max_images, STYLE_BRIEF_DUPLICATE_DISTANCE):
+        photo_id = item["photo"]["id"]
+        img = downloaded.get(photo_id) or _download_drive_image(access_token, photo_id)
+        if img is not None:
+            selected.append({**item, "image": img})
+
+    while selected:
+        images = [item["image"] for item in selected]
+        encoded, max_size, quality = _encode_within_budget(
+            images, STYLE_BRIEF_IMAGE_BYTE_BUDGET, STYLE_BRIEF_IMAGE_TOKEN_BUDGET
         )
+        if len(selected) == 1 or sum(len(data) for data in encoded) <= STYLE_BRIEF_IMAGE_BYTE_BUDGET:
+            break
+        # Even the cheapest rung is over budget: drop the least distinctive pick and retry.
+        selected = selected[:-1]
+
+    prepared: list[dict] = []
+    for item, jpeg_bytes in zip(selected, encoded if selected else []):
+        photo = item["photo"]
+        width, height = _scaled_size(item["image"], max_size)
+        image = {
+            "id": photo["id"],
+            "name": str(photo.get("name", "")),
+            "mime_type": "image/jpeg",
+            "digest": hashlib.sha256(jpeg_bytes).hexdigest(),
+            "jpeg_bytes": jpeg_bytes,
+            "phash": f"{item['phash']:016x}",
+            "width": width,
+            "height": height,
+            "quality": quality,
+            "byte_size": len(jpeg_bytes),
+            "estimated_tokens": _estimate_image_tokens(width, height),
+        }
+        if GEMINI_IMAGE_TRANSPORT != "file_api":
+            image["data_uri"] = _jpeg_data_uri(jpeg_bytes)
+        prepared.append(image)
     return prepared
 
 
+def _image_budget_summary(prepared_images: list[dict]) -> dict:
+    return {
+        "transport": GEMINI_IMAGE_TRANSPORT,
+        "image_count": len(prepared_images),
+        "payload_bytes": sum(
+            int(image.get("byte_size") or len(image.get("jpeg_bytes") or b"")) for image in prepared_images
+        ),
+        "estimated_image_tokens": sum(int(image.get("estimated_tokens") or 0) for image in prepared_images),
+        "max_edge_px": max((max(image.get("width", 0), image.get("height", 0)) for image in prepared_images), default=0),
+        "jpeg_quality": min((image["quality"] for image in prepared_images if image.get("quality")), default=None),
+        "byte_budget": STYLE_BRIEF_IMAGE_BYTE_BUDGET,
+        "token_budget": STYLE_BRIEF_IMAGE_TOKEN_BUDGET,
+        "phashes": [image.get("phash") for image in prepared_images if image.get("phash")],
+    }
+
+
+def _lookup_provider_files(provider: str, digests: list[str]) -> dict[str, str]:
+    if not digests:
+        return {}
+    rows = exec_all(
+        """
+        SELECT digest, file_uri
+        FROM provider_files
+        WHERE provider=:provider
+          AND digest = ANY(:digests)
+          AND (expires_at IS NULL OR expires_at > :fresh_until)
+        """,
+        {
+            "provider": provider,
+            "digests": list(digests),
+            # Leave headroom so a file cannot expire between lookup and the model call.
+            "fresh_until": _utcnow() + timedelta(minutes=10),
+        },
+    )
+    return {row["digest"]: row["file_uri"] for row in rows}
+
+
+def _store_provider_file(
+    provider: str, digest: str, file_uri: str, mime_type: str, byte_size: int, expires_at: datetime | None
+) -> None:
+    exec_write(
+        """
+        INSERT INTO provider_files (provider, digest, file_uri, mime_type, byte_size, expires_at, created_at)
+        VALUES (:provider, :digest, :file_uri, :mime_type, :byte_size, :expires_at, :created_at)
+        ON CONFLICT (provider, digest)
+        DO UPDATE SET
+          file_uri=EXCLUDED.file_uri,
+          mime_type=EXCLUDED.mime_type,
+          byte_size=EXCLUDED.byte_size,
+          expires_at=EXCLUDED.expires_at,
+          created_at=EXCLUDED.created_at
+        """,
+        {
+            "provider": provider,
+            "digest": digest,
+            "file_uri": file_uri,
+            "mime_type": mime_type,
+            "byte_size": byte_size,
+            "expires_at": expires_at,
+            "created_at": _utcnow(),
+        },
+    )
+
+
+def _seconds_left(deadline: float | None, default: float) -> float:
+    """HTTP timeout for a call that must finish by ``deadline`` (a time.monotonic() value)."""
+    if deadline is None:
+        return default
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("STYLE_BRIEF deadline passed before the model call")
+    return min(default, remaining)
+
+
+def _upload_gemini_file(data: bytes, mime_type: str, timeout: float = 60) -> tuple[str, datetime | None]:
+    response = requests.post(
+        f"{GEMINI_UPLOAD_BASE.rstrip('/')}/files",
+        headers={
+            "x-goog-api-key": GEMINI_API_KEY,
+            "X-Goog-Upload-Protocol": "raw",
+            "Content-Type": mime_type,
+        },
+        data=data,
+        timeout=timeout,
+    )
+    if response.status_code >= 400:
+        raise RuntimeError(f"Gemini file upload failed: {response.status_code} {response.text[:220]}")
+
+    file_info = response.json().get("file") or {}
+    file_uri = file_info.get("uri")
+    if not file_uri:
+        raise RuntimeError("Gemini file upload response missing file uri")
+    return file_uri, _parse_rfc3339(file_info.get("expirationTime"))
+
+
+def _gemini_file_uris(prepared_images: list[dict], deadline: float | None = None) -> list[str]:
+    digests = [
+        image.get("digest") or hashlib.sha256(image["jpeg_bytes"]).hexdigest()
+        for image in prepared_images
+        if image.get("jpeg_bytes")
+    ]
+    cached = _lookup_provider_files("gemini", digests)
+
+    uris: list[str] = []
+    for image in prepared_images:
+        jpeg_bytes = image.get("jpeg_bytes")
+        if not jpeg_bytes:
+            # Callers that only carry a data URI still work; they just skip the upload cache.
+            uris.append(image["data_uri"])
+            continue
+        digest = image.get("digest") or hashlib.sha256(jpeg_bytes).hexdigest()
+        file_uri = cached.get(digest)
+        if not file_uri:
+            mime_type = image.get("mime_type", "image/jpeg")
+            file_uri, expires_at = _upload_gemini_file(jpeg_bytes, mime_type, timeout=_seconds_left(deadline, 60))
+            _store_provider_file("gemini", digest, file_uri, mime_type, len(jpeg_bytes), expires_at)
+            cached[digest] = file_uri
+        uris.append(file_uri)
+    return uris
+
+
+def _multimodal_image_urls(prepared_images: list[dict], deadline: float | None = None) -> list[str]:
+    if GEMINI_IMAGE_TRANSPORT == "file_api":
+        return _gemini_file_uris(prepared_images, deadline)
+    return [image.get("data_uri") or _jpeg_data_uri(image["jpeg_bytes"]) for image in prepared_images]
+
+
 def _extract_json_object(text: str) -> dict:
     text = (text or "").strip()
     if not text:
@@ -280,7 +792,9 @@ def _normalize_llm_style_brief(raw: dict) -> dict:
     }
 
 
-def _call_multimodal_style_agent(prepared_images: list[dict]) -> dict:
+def _call_multimodal_style_agent(prepared_images: list[dict], deadline: float | None = None) -> dict:
+    """``deadline`` (time.monotonic()) bounds every HTTP call, so a call the caller gave up on ends with it."""
+    _seconds_left(deadline, STYLE_BRIEF_LLM_DEADLINE_SECONDS)
     if not GEMINI_API_KEY:
         raise RuntimeError("GEMINI_API_KEY is not configured for STYLE_BRIEF multimodal analysis")
 
@@ -311,11 +825,11 @@ def _call_multimodal_style_agent(prepared_images: list[dict]) -> dict:
     )
 
     user_content: list[dict] = [{"type": "text", "text": prompt}]
-    for image in prepared_images:
+    for image_url in _multimodal_image_urls(prepared_images, deadline):
         user_content.append(
             {
                 "type": "image_url",
-                "image_url": {"url": image["data_uri"]},
+                "image_url": {"url": image_url},
             }
         )
 
@@ -339,7 +853,7 @@ def _call_multimodal_style_agent(prepared_images: list[dict]) -> dict:
             "Content-Type": "application/json",
         },
         json=payload,
-        timeout=90,
+        timeout=_seconds_left(deadline, STYLE_BRIEF_LLM_DEADLINE_SECONDS),
     )
     if response.status_code >= 400:
         raise RuntimeError(f"Multimodal model request failed: {response.status_code} {response.text[:220]}")
@@ -355,7 +869,13 @@ def _call_multimodal_style_agent(prepared_images: list[dict]) -> dict:
     if not parsed:
         raise RuntimeError("Multimodal model response was not valid JSON")
 
-    return _normalize_llm_style_brief(parsed)
+    style = _normalize_llm_style_brief(parsed)
+    usage = data.get("usage")
+    if isinstance(usage, dict):
+        style["token_usage"] = {
+            key: usage.get(key) for key in ("prompt_tokens", "completion_tokens", "total_tokens") if key in usage
+        }
+    return style
 
 
 def _classify_color_name(rgb: tuple[int, int, int]) -> str:
@@ -394,25 +914,16 @@ def _extract_palette(access_token: str, photos: list[dict]) -> list[str]:
         photo_id = photo.get("id")
         if not photo_id:
             continue
-        img = _download_drive_image(access_token, photo_id)
-        if img is None:
-            continue
-
-        img.thumbnail((96, 96))
-        pixels = list(img.getdata())
-        if not pixels:
-            continue
-
-        stride = max(1, len(pixels) // 800)
-        sampled = pixels[::stride]
-        if not sampled:
-            sampled = pixels
-
-        avg = (
-            int(sum(p[0] for p in sampled) / len(sampled)),
-            int(sum(p[1] for p in sampled) / len(sampled)),
-            int(sum(p[2] for p in sampled) / len(sampled)),
-        )
+        features = photo.get("features")
+        if features and features.get("mean_rgb"):
+            avg = tuple(features["mean_rgb"][:3])
+        else:
+            img = _download_drive_image(access_token, photo_id)
+            if img is None:
+                continue
+            avg = _mean_rgb(img)
+            if avg is None:
+                continue
         color = _classify_color_name(avg)
         counts[color] = counts.get(color, 0) + 1
 
@@ -424,6 +935,11 @@ def _tokenize_filename(name: str) -> list[str]:
     return [tok for tok in re.split(r"[^a-zA-Z0-9]+", name.lower()) if tok]
 
 
+def _photo_tokens(photo: dict) -> set[str]:
+    # Always from the live listing: a rename keeps the md5, so stored tokens would go stale.
+    return set(_tokenize_filename(str(photo.get("name", ""))))
+
+
 def _infer_vibes(photos: list[dict]) -> list[str]:
     vibe_keywords = {
         "formal": {"formal", "office", "wedding", "blazer", "suit", "gown"},
@@ -435,7 +951,7 @@ def _infer_vibes(photos: list[dict]) -> list[str]:
 
     counts = {k: 0 for k in vibe_keywords}
     for photo in photos:
-        tokens = set(_tokenize_filename(photo.get("name", "")))
+        tokens = _photo_tokens(photo)
         for vibe, keywords in vibe_keywords.items():
             if tokens & keywords:
                 counts[vibe] += 1
@@ -455,7 +971,7 @@ def _infer_categories(photos: list[dict]) -> list[str]:
 
     counts = {k: 0 for k in category_keywords}
     for photo in photos:
-        tokens = set(_tokenize_filename(photo.get("name", "")))
+        tokens = _photo_tokens(photo)
         for category, keywords in category_keywords.items():
             if tokens & keywords:
                 counts[category] += 1
@@ -484,11 +1000,21 @@ def _brands_for_vibes(vibes: list[str]) -> list[str]:
     return ordered[:5]
 
 
-def _style_brief_fallback(access_token: str, folder: dict, photos: list[dict], reason: str) -> dict:
-    palette = _extract_palette(access_token, photos)
+def _heuristic_style_signals(access_token: str, photos: list[dict]) -> dict:
     vibes = _infer_vibes(photos)
-    categories = _infer_categories(photos)
-    brands = _brands_for_vibes(vibes)
+    return {
+        "palette": _extract_palette(access_token, photos),
+        "inferred_vibes": vibes,
+        "recommended_categories": _infer_categories(photos),
+        "recommended_brands": _brands_for_vibes(vibes),
+    }
+
+
+def _style_brief_fallback(
+    access_token: str, folder: dict, photos: list[dict], reason: str, signals: dict | None = None
+) -> dict:
+    if signals is None:
+        signals = _heuristic_style_signals(access_token, photos)
 
     return {
         "source": "google_drive",
@@ -500,24 +1026,79 @@ def _style_brief_fallback(access_token: str, folder: dict, photos: list[dict], r
         "sample_photo_ids": [photo.get("id") for photo in photos[:8]],
         "style_summary": "Fallback style brief generated because multimodal model was unavailable.",
         "observed_features": {},
-        "palette": palette or ["navy", "cream", "olive"],
-        "inferred_vibes": vibes,
-        "recommended_categories": categories,
-        "recommended_brands": brands,
+        "palette": signals["palette"] or ["navy", "cream", "olive"],
+        "inferred_vibes": signals["inferred_vibes"],
+        "recommended_categories": signals["recommended_categories"],
+        "recommended_brands": signals["recommended_brands"],
         "avoid_colors": [],
         "budget_max": 150,
         "confidence_notes": "Use GEMINI_API_KEY to enable multimodal visual analysis in STYLE_BRIEF.",
     }
 
 
-def _style_brief_payload(run_id) -> dict:
-    user_id = _get_run_user(run_id)
-    if not user_id:
+def _style_brief_fingerprint(folder_id: str, photos: list[dict]) -> str:
+    basis = json.dumps(
+        {
+            "version": STYLE_BRIEF_CACHE_VERSION,
+            "model": GEMINI_VISION_MODEL,
+            "max_images": STYLE_BRIEF_MAX_IMAGES,
+            "folder_id": folder_id,
+            "photos": [[photo.get("id"), _photo_checksum(photo)] for photo in photos],
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(basis.encode("utf-8")).hexdigest()
+
+
+def _get_cached_style_brief(user_id, folder_id: str, fingerprint: str) -> dict | None:
+    row = exec_one(
+        """
+        SELECT payload
+        FROM style_brief_cache
+        WHERE user_id=:user_id AND folder_id=:folder_id AND fingerprint=:fingerprint AND created_at > :min_created_at
+        """,
+        {
+            "user_id": user_id,
+            "folder_id": folder_id,
+            "fingerprint": fingerprint,
+            "min_created_at": _utcnow() - timedelta(hours=STYLE_BRIEF_CACHE_TTL_HOURS),
+        },
+    )
+    if not row:
+        return None
+    return _parse_json(row.get("payload")) or None
+
+
+def _store_style_brief_cache(user_id, folder_id: str, fingerprint: str, payload: dict) -> None:
+    exec_write(
+        """
+        INSERT INTO style_brief_cache (user_id, folder_id, fingerprint, payload, created_at)
+        VALUES (:user_id, :folder_id, :fingerprint, CAST(:payload AS JSONB), :created_at)
+        ON CONFLICT (user_id, folder_id)
+        DO UPDATE SET
+          fingerprint=EXCLUDED.fingerprint,
+          payload=EXCLUDED.payload,
+          created_at=EXCLUDED.created_at
+        """,
+        {
+            "user_id": user_id,
+            "folder_id": folder_id,
+            "fingerprint": fingerprint,
+            "payload": json.dumps(payload),
+            "created_at": _utcnow(),
+        },
+    )
+
+
+def _style_brief_payload(ctx: RunContext) -> dict:
+    if not ctx.user_id:
         return {"source": "system", "error": "run user not found"}
 
-    access_token = _ensure_drive_access_token(user_id)
-    folder = _get_selected_drive_folder(user_id)
+    access_token = drive_tokens.get_token(ctx.user_id)
+    return _style_brief_for_folder(ctx.user_id, access_token, ctx.folder, run_id=ctx.run_id)
+
 
+def _style_brief_for_folder(user_id, access_token: str | None, folder: dict | None, run_id=None) -> dict:
     if not access_token or not folder:
         return {
             "source": "onboarding",
@@ -561,7 +1142,21 @@ def _style_brief_payload(run_id) -> dict:
             "photo_count": 0,
         }
 
-    prepared_images = _prepare_images_for_multimodal_analysis(access_token, photos, max_images=4)
+    fingerprint = _style_brief_fingerprint(folder["folder_id"], photos)
+    try:
+        cached = _get_cached_style_brief(user_id, folder["folder_id"], fingerprint)
+    except Exception:
+        cached = None
+    if cached:
+        return {**cached, "style_brief_cache": "hit"}
+
+    # Drive downloads and the model call are where STYLE_BRIEF spends its time; a canceled run stops between them.
+    _raise_if_run_canceled(run_id)
+    downloaded = _attach_photo_features(access_token, photos)
+    _raise_if_run_canceled(run_id)
+    prepared_images = _prepare_images_for_multimodal_analysis(
+        access_token, photos, max_images=STYLE_BRIEF_MAX_IMAGES, downloaded=downloaded
+    )
     if not prepared_images:
         return _style_brief_fallback(
             access_token=access_token,
@@ -570,25 +1165,83 @@ def _style_brief_payload(run_id) -> dict:
             reason="Unable to download photos for multimodal analysis",
         )
 
+    # Run the model call in the background and build the heuristic brief meanwhile, so a failed or slow
+    # model costs max(deadline, heuristic) rather than their sum.
+    _raise_if_run_canceled(run_id)
+    deadline = time.monotonic() + STYLE_BRIEF_LLM_DEADLINE_SECONDS
+    llm_future = style_brief_llm_pool.submit(_call_multimodal_style_agent, prepared_images, deadline=deadline)
+
     try:
-        llm_style = _call_multimodal_style_agent(prepared_images)
-        return {
-            "source": "google_drive",
-            "analysis_method": "multimodal_llm",
-            "folder_id": folder["folder_id"],
-            "folder_name": folder.get("folder_name"),
-            "photo_count": len(photos),
-            "analyzed_photo_ids": [img["id"] for img in prepared_images],
-            **llm_style,
-        }
+        signals = _heuristic_style_signals(access_token, photos)
+    except Exception:
+        signals = None
+    try:
+        _raise_if_run_canceled(run_id)
+    except RunCanceled:
+        llm_future.cancel()
+        raise
+
+    try:
+        llm_style = llm_future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        # Not started yet: drop it. Started: its HTTP timeout ends at the same deadline.
+        llm_future.cancel()
+        return _style_brief_fallback(
+            access_token=access_token,
+            folder=folder,
+            photos=photos,
+            reason=f"Multimodal model exceeded {STYLE_BRIEF_LLM_DEADLINE_SECONDS:g}s deadline",
+            signals=signals,
+        )
     except Exception as exc:
         return _style_brief_fallback(
             access_token=access_token,
             folder=folder,
             photos=photos,
             reason=str(exc),
+            signals=signals,
         )
 
+    payload = {
+        "source": "google_drive",
+        "analysis_method": "multimodal_llm",
+        "folder_id": folder["folder_id"],
+        "folder_name": folder.get("folder_name"),
+        "photo_count": len(photos),
+        "analyzed_photo_ids": [img["id"] for img in prepared_images],
+        "image_budget": _image_budget_summary(prepared_images),
+        **llm_style,
+    }
+    # Only model results are cached; a fallback should be retried against the model next time.
+    try:
+        _store_style_brief_cache(user_id, folder["folder_id"], fingerprint, payload)
+    except Exception:
+        pass
+    return payload
+
+
+def prewarm_style_brief_impl(user_id: str) -> dict:
+    """Analyze the user's selected folder ahead of time so the next STYLE_BRIEF step is a cache hit."""
+    uid = uuid.UUID(user_id)
+    access_token = drive_tokens.get_token(uid)
+    folder = _get_selected_drive_folder(uid)
+    if not access_token or not folder:
+        return {"user_id": user_id, "status": "SKIPPED", "reason": "drive_not_connected_or_no_folder"}
+
+    payload = _style_brief_for_folder(uid, access_token, folder)
+    if payload.get("style_brief_cache") == "hit":
+        status = "UNCHANGED"
+    elif payload.get("analysis_method") == "multimodal_llm":
+        status = "WARMED"
+    else:
+        status = "NOT_CACHED"
+    return {
+        "user_id": user_id,
+        "folder_id": folder["folder_id"],
+        "status": status,
+        "analysis_method": payload.get("analysis_method"),
+    }
+
 
 def _real_catalog_enabled() -> bool:
     if PRODUCT_DATA_MODE == "mock":
@@ -644,41 +1297,12 @@ def _estimate_discount_pct(row: dict, old_price: float, sale_price: float, hint:
     return min(90.0, max(0.0, float(hint or 0.0)))
 
 
-def _guess_color_from_title(title: str, palette: list[str]) -> str:
-    text = (title or "").lower()
-    palette_norm = [str(color).strip().lower() for color in palette if str(color).strip()]
-    for color in palette_norm:
-        if color and color in text:
-            return color
-
-    common_colors = [
-        "black",
-        "white",
-        "gray",
-        "grey",
-        "navy",
-        "blue",
-        "red",
-        "green",
-        "yellow",
-        "pink",
-        "purple",
-        "orange",
-        "brown",
-        "beige",
-        "cream",
-        "olive",
-    ]
-    for color in common_colors:
-        if re.search(rf"\b{re.escape(color)}\b", text):
-            return color
-    return palette_norm[0] if palette_norm else "neutral"
-
-
-def _build_product_sku(brand: str, category: str, title: str, link: str) -> str:
+def _build_product_sku(brand: str, category: str, gender: str, title: str, link: str) -> str:
+    # Gender is part of the identity: catalog rows belong to one (brand, category, gender) segment, so a product
+    # listed for both segments needs a row in each rather than one row the other segment never sees.
     brand_key = re.sub(r"[^a-z0-9]+", "", brand.lower())[:8] or "item"
     cat_key = re.sub(r"[^a-z0-9]+", "", category.lower())[:4] or "gen"
-    digest = hashlib.sha1(f"{brand}|{category}|{title}|{link}".encode("utf-8")).hexdigest()[:10]
+    digest = hashlib.sha1(f"{brand}|{category}|{gender}|{title}|{link}".encode("utf-8")).hexdigest()[:10]
     return f"{brand_key}-{cat_key}-{digest}"
 
 
@@ -764,12 +1388,13 @@ def _mock_brand_search_payload(
     }
 
 
-def _real_deals_payload(style: dict, brands: list[str]) -> dict:
+def _real_deals_payload(style: dict, brands: list[str], run_id=None) -> dict:
     categories = style.get("recommended_categories") or ["dress", "top", "bottom"]
     deals = []
     errors = []
 
     for brand in brands[:5]:
+        _raise_if_run_canceled(run_id)
         query = f"{brand} sale {categories[0]}"
         try:
             results = _serpapi_shopping_search(query, num=20)
@@ -807,7 +1432,310 @@ def _real_deals_payload(style: dict, brands: list[str]) -> dict:
     }
 
 
-def _real_brand_search_payload(style: dict, deals: dict) -> dict:
+def _catalog_brand_key(brand: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "", brand.lower())
+
+
+def _price_band(price: float) -> int:
+    return min(int(price // PRODUCT_PRICE_BAND_WIDTH), 32767)
+
+
+def _catalog_row(brand: str, category: str, gender: str, position: int, row: dict) -> dict | None:
+    """Normalize one provider result into its run-independent catalog form (None when it is unusable)."""
+    title = str(row.get("title", "")).strip()
+    source_domain = str(row.get("source") or "").strip()
+    raw_link = str(row.get("link") or "").strip()
+    if raw_link and not raw_link.startswith("https://www.google.com/search"):
+        link = raw_link
+    elif source_domain:
+        _search_q = quote_plus(f"{row.get('title', '')} site:{source_domain}")
+        link = f"https://www.google.com/search?q={_search_q}"
+    else:
+        link = str(row.get("product_link") or "").strip()
+    if not title and not link:
+        return None
+
+    sale_price = _price_value(row.get("extracted_price", row.get("price")))
+    if sale_price <= 0:
+        return None
+    old_price = _price_value(row.get("extracted_old_price", row.get("old_price")))
+    return {
+        "sku": _build_product_sku(brand, category, gender, title, link),
+        "brand": brand,
+        "brand_key": _catalog_brand_key(brand),
+        "category": category.strip().lower(),
+        "gender": gender,
+        "color": guess_color(title, []),
+        "attributes": extract_attributes(title).as_dict(),
+        "price_band": _price_band(sale_price),
+        "title": title,
+        "product_url": link,
+        "image_url": row.get("thumbnail") or row.get("image"),
+        "source": str(row.get("source") or row.get("seller") or "web"),
+        "sale_price": round(sale_price, 2),
+        "old_price": round(old_price, 2),
+        # Without the run's deal hint: that fallback is applied per run in _catalog_candidate.
+        "listed_discount_pct": round(_estimate_discount_pct(row, old_price, sale_price), 2),
+        "position": position,
+    }
+
+
+def _catalog_candidate(
+    item: dict, brand: str, category: str, query: str, palette: list[str], budget_max: float, deal_hint: float
+) -> dict | None:
+    sale_price = float(item["sale_price"])
+    if sale_price > (budget_max * 2.2):
+        return None
+
+    old_price = float(item["old_price"])
+    discount_pct = float(item["listed_discount_pct"]) or min(90.0, max(0.0, deal_hint))
+    if old_price > sale_price:
+        price = old_price
+    elif 0 < discount_pct < 95:
+        price = round(sale_price / (1 - (discount_pct / 100.0)), 2)
+    else:
+        price = sale_price
+
+    title = item["title"]
+    return {
+        "sku": item["sku"],
+        "title": title or f"{brand} {category}",
+        "brand": brand,
+        "category": category,
+        "color": guess_color(title, palette),
+        "attributes": item.get("attributes") or extract_attributes(title).as_dict(),
+        "price": round(price, 2),
+        "sale_price": round(sale_price, 2),
+        "discount_pct": round(discount_pct, 2),
+        "product_url": item["product_url"],
+        "image_url": item.get("image_url"),
+        "source": item["source"],
+        "query": query,
+        "data_source": "serpapi",
+    }
+
+
+def _catalog_fresh_after() -> datetime:
+    return _utcnow() - timedelta(hours=PRODUCT_CATALOG_TTL_HOURS)
+
+
+def _load_catalog_segments(keys: list[tuple[str, str, str]], fresh_after: datetime) -> dict[tuple, list[dict]]:
+    rows = exec_all(
+        """
+        SELECT s.brand_key AS segment_brand_key, s.category AS segment_category, s.gender AS segment_gender,
+               c.sku, c.title, c.product_url, c.image_url, c.source, c.sale_price, c.old_price,
+               c.listed_discount_pct, c.position, c.attributes
+        FROM product_catalog_segments s
+        JOIN unnest(CAST(:brand_keys AS TEXT[]), CAST(:categories AS TEXT[]), CAST(:genders AS TEXT[]))
+          AS wanted(brand_key, category, gender)
+          ON s.brand_key = wanted.brand_key AND s.category = wanted.category AND s.gender = wanted.gender
+        LEFT JOIN product_catalog c
+          ON c.brand_key = s.brand_key AND c.category = s.category AND c.gender = s.gender
+         AND c.last_seen_at >= s.refreshed_at
+        WHERE s.refreshed_at > :fresh_after
+        ORDER BY s.brand_key, s.category, s.gender, c.position
+        """,
+        {
+            "brand_keys": [key[0] for key in keys],
+            "categories": [key[1] for key in keys],
+            "genders": [key[2] for key in keys],
+            "fresh_after": fresh_after,
+        },
+    )
+    segments: dict[tuple, list[dict]] = {}
+    for row in rows:
+        items = segments.setdefault((row["segment_brand_key"], row["segment_category"], row["segment_gender"]), [])
+        if row.get("sku"):
+            items.append(dict(row))
+    return segments
+
+
+def _fresh_catalog_segments(keys: list[tuple[str, str, str]], max_price: float) -> dict[tuple, list[dict]]:
+    """Catalog rows per (brand_key, category, gender) refreshed within the TTL: mmap snapshot first, then Postgres."""
+    fresh_after = _catalog_fresh_after()
+    found: dict[tuple, list[dict]] = {}
+    snapshot = load_snapshot(PRODUCT_CATALOG_SNAPSHOT_PATH)
+    if snapshot is not None:
+        price_bands = range(_price_band(max_price) + 1)
+        for key in keys:
+            refreshed_at = snapshot.segments.get(segment_key(*key))
+            if refreshed_at and refreshed_at > fresh_after:
+                items = snapshot.find(brand_key=key[0], category=key[1], gender=key[2], price_band=price_bands)
+                found[key] = sorted(items, key=lambda item: item["position"])
+
+    missing = [key for key in keys if key not in found]
+    if missing:
+        try:
+            found.update(_load_catalog_segments(missing, fresh_after))
+        except Exception:
+            # The catalog is a cache; without it every gap simply goes to the provider.
+            pass
+    return found
+
+
+def _store_catalog_segments(fetched: list[tuple[tuple[str, str, str], str, list[dict]]]) -> None:
+    seen_at = _utcnow()
+    exec_many(
+        """
+        INSERT INTO product_catalog (
+          sku, brand, brand_key, category, gender, color, price_band, title, product_url, image_url, source,
+          sale_price, old_price, listed_discount_pct, position, attributes, first_seen_at, last_seen_at
+        )
+        VALUES (
+          :sku, :brand, :brand_key, :category, :gender, :color, :price_band, :title, :product_url, :image_url, :source,
+          :sale_price, :old_price, :listed_discount_pct, :position, CAST(:attributes AS JSONB), :seen_at, :seen_at
+        )
+        ON CONFLICT (sku) DO UPDATE SET
+          color=EXCLUDED.color,
+          attributes=EXCLUDED.attributes,
+          price_band=EXCLUDED.price_band,
+          image_url=EXCLUDED.image_url,
+          source=EXCLUDED.source,
+          sale_price=EXCLUDED.sale_price,
+          old_price=EXCLUDED.old_price,
+          listed_discount_pct=EXCLUDED.listed_discount_pct,
+          position=EXCLUDED.position,
+          last_seen_at=EXCLUDED.last_seen_at
+        """,
+        [
+            {**item, "attributes": json.dumps(item["attributes"]), "seen_at": seen_at}
+            for _key, _query, items in fetched
+            for item in items
+        ],
+    )
+    exec_many(
+        """
+        INSERT INTO product_catalog_segments (brand_key, category, gender, query, result_count, refreshed_at)
+        VALUES (:brand_key, :category, :gender, :query, :result_count, :refreshed_at)
+        ON CONFLICT (brand_key, category, gender) DO UPDATE SET
+          query=EXCLUDED.query,
+          result_count=EXCLUDED.result_count,
+          refreshed_at=EXCLUDED.refreshed_at
+        """,
+        [
+            {
+                "brand_key": key[0],
+                "category": key[1],
+                "gender": key[2],
+                "query": query,
+                "result_count": len(items),
+                "refreshed_at": seen_at,
+            }
+            for key, query, items in fetched
+        ],
+    )
+
+
+def rebuild_catalog_snapshot_impl() -> dict:
+    """Write every fresh catalog segment to the mmap snapshot that BRAND_SEARCH reads before Postgres."""
+    fresh_after = _catalog_fresh_after()
+    segments = exec_all(
+        """
+        SELECT brand_key, category, gender, refreshed_at
+        FROM product_catalog_segments
+        WHERE refreshed_at > :fresh_after
+        """,
+        {"fresh_after": fresh_after},
+    )
+    rows = exec_all(
+        """
+        SELECT c.sku, c.brand_key, c.category, c.gender, c.color, c.price_band, c.title, c.product_url, c.image_url,
+               c.source, c.sale_price, c.old_price, c.listed_discount_pct, c.position, c.attributes
+        FROM product_catalog c
+        JOIN product_catalog_segments s
+          ON s.brand_key = c.brand_key AND s.category = c.category AND s.gender = c.gender
+         AND c.last_seen_at >= s.refreshed_at
+        WHERE s.refreshed_at > :fresh_after
+        ORDER BY c.brand_key, c.category, c.gender, c.position
+        """,
+        {"fresh_after": fresh_after},
+    )
+    records = [
+        {
+            **dict(row),
+            "sale_price": float(row["sale_price"]),
+            "old_price": float(row["old_price"]),
+            "listed_discount_pct": float(row["listed_discount_pct"]),
+        }
+        for row in rows
+    ]
+    os.makedirs(os.path.dirname(PRODUCT_CATALOG_SNAPSHOT_PATH) or ".", exist_ok=True)
+    count = write_snapshot(PRODUCT_CATALOG_SNAPSHOT_PATH, records, [dict(item) for item in segments])
+    return {"status": "BUILT", "products": count, "segments": len(segments)}
+
+
+def rebuild_style_index_impl() -> dict:
+    """Embed catalog rows seen since the index watermark and fold them into the memory-mapped style index."""
+    current = load_style_index(PRODUCT_STYLE_INDEX_PATH)
+    watermark = current.meta.get("watermark") if current is not None else None
+    rows = exec_all(
+        """
+        SELECT sku, brand_key, category, color, title, last_seen_at
+        FROM product_catalog
+        WHERE CAST(:watermark AS TIMESTAMPTZ) IS NULL OR last_seen_at >= CAST(:watermark AS TIMESTAMPTZ)
+        ORDER BY last_seen_at
+        """,
+        {"watermark": watermark},
+    )
+    if current is not None and not rows:
+        return {"status": "UNCHANGED", "products": len(current)}
+    if rows:
+        watermark = rows[-1]["last_seen_at"].isoformat()
+    result = update_style_index(PRODUCT_STYLE_INDEX_PATH, [dict(row) for row in rows], watermark)
+    return {"status": "BUILT", "products": result["count"], "added": result["added"], "retrained": result["retrained"]}
+
+
+def collect_artifact_blobs_impl() -> dict:
+    """Delete expired step memos, then blobs nothing has referenced for the grace period and their objects.
+
+    A step_memo row holds no refcount on its blob; the GC leaves blobs alone while a memo within its TTL points at
+    them.
+    """
+    memos = exec_write(
+        """
+        DELETE FROM step_memo m
+        USING unnest(CAST(:step_keys AS TEXT[]), CAST(:ttl_hours AS FLOAT8[])) AS ttl(step_key, hours)
+        WHERE m.step_key = ttl.step_key AND m.created_at < CAST(:now AS TIMESTAMPTZ) - ttl.hours * INTERVAL '1 hour'
+        """,
+        {"step_keys": list(STEP_MEMO_TTL_HOURS), "ttl_hours": list(STEP_MEMO_TTL_HOURS.values()), "now": _utcnow()},
+    )
+    deleted = 0
+    objects = 0
+    while True:
+        rows = exec_all(
+            """
+            DELETE FROM artifact_blobs
+            WHERE content_hash IN (
+              SELECT b.content_hash
+              FROM artifact_blobs b
+              WHERE b.refcount <= 0 AND b.last_referenced_at < :cutoff
+                AND NOT EXISTS (SELECT 1 FROM step_memo m WHERE m.content_hash = b.content_hash)
+              ORDER BY b.last_referenced_at
+              LIMIT :batch
+              FOR UPDATE SKIP LOCKED
+            )
+            AND refcount <= 0
+            AND last_referenced_at < :cutoff
+            AND NOT EXISTS (SELECT 1 FROM artifacts a WHERE a.blob_hash = artifact_blobs.content_hash)
+            AND NOT EXISTS (SELECT 1 FROM step_memo m WHERE m.content_hash = artifact_blobs.content_hash)
+            RETURNING storage_backend, storage_key
+            """,
+            {"cutoff": _utcnow() - timedelta(hours=ARTIFACT_BLOB_GC_GRACE_HOURS), "batch": ARTIFACT_BLOB_GC_BATCH},
+        )
+        deleted += len(rows)
+        for row in rows:
+            if row["storage_backend"] != "inline" and row.get("storage_key"):
+                try:
+                    delete_json_artifact(row["storage_backend"], row["storage_key"])
+                    objects += 1
+                except Exception:
+                    # Orphaned objects are harmless; the row that pointed at them is already gone.
+                    pass
+        if len(rows) < ARTIFACT_BLOB_GC_BATCH:
+            return {"status": "COLLECTED", "memos": memos, "blobs": deleted, "objects": objects}
+
+
+def _real_brand_search_payload(style: dict, deals: dict, run_id=None) -> dict:
     categories = style.get("recommended_categories") or ["dress", "top", "bottom"]
     palette = [str(c).lower() for c in (style.get("palette") or ["black", "navy", "white"])]
     budget_max = float(style.get("budget_max") or 150)
@@ -817,74 +1745,54 @@ def _real_brand_search_payload(style: dict, deals: dict) -> dict:
     gender = style.get("gender", "").lower()
     gender_label = "men" if gender == "male" else "women" if gender == "female" else ""
 
+    searches = [
+        (brand, category, (_catalog_brand_key(brand), category.strip().lower(), gender_label))
+        for brand in brands[:5]
+        for category in categories[:2]
+    ]
+    catalog = _fresh_catalog_segments(list(dict.fromkeys(key for _, _, key in searches)), budget_max * 2.2)
+
     candidates = []
     seen_keys: set[str] = set()
     errors = []
     queries = []
+    fetched: list[tuple[tuple[str, str, str], str, list[dict]]] = []
 
-    for brand in brands[:5]:
+    for brand, category, key in searches:
         deal_hint = float(deals_by_brand.get(brand, {}).get("discount_pct", 0) or 0)
-        for category in categories[:2]:
-            query = f"{brand} {category} {gender_label}".strip()
-            queries.append(query)
+        query = f"{brand} {category} {gender_label}".strip()
+        queries.append(query)
+        items = catalog.get(key)
+        if items is None:
+            _raise_if_run_canceled(run_id)
             try:
                 rows = _serpapi_shopping_search(query, num=20)
             except Exception as exc:
                 errors.append(f"{brand}/{category}: {str(exc)[:160]}")
                 continue
+            items = []
+            for position, row in enumerate(rows[:8]):
+                item = _catalog_row(brand, category, gender_label, position, row)
+                if item is not None:
+                    items.append(item)
+            catalog[key] = items
+            fetched.append((key, query, items))
+
+        for item in items:
+            candidate = _catalog_candidate(item, brand, category, query, palette, budget_max, deal_hint)
+            if candidate is None:
+                continue
+            dedupe_key = candidate["product_url"] or candidate["sku"]
+            if dedupe_key in seen_keys:
+                continue
+            seen_keys.add(dedupe_key)
+            candidates.append(candidate)
 
-            for row in rows[:8]:
-                title = str(row.get("title", "")).strip()
-                source_domain = str(row.get("source") or "").strip()
-                raw_link = str(row.get("link") or "").strip()
-                if raw_link and not raw_link.startswith("https://www.google.com/search"):
-                    link = raw_link
-                elif source_domain:
-                    _search_q = quote_plus(f"{row.get('title', '')} site:{source_domain}")
-                    link = f"https://www.google.com/search?q={_search_q}"
-                else:
-                    link = str(row.get("product_link") or "").strip()
-                if not title and not link:
-                    continue
-
-                sale_price = _price_value(row.get("extracted_price", row.get("price")))
-                if sale_price <= 0:
-                    continue
-                if sale_price > (budget_max * 2.2):
-                    continue
-
-                old_price = _price_value(row.get("extracted_old_price", row.get("old_price")))
-                discount_pct = _estimate_discount_pct(row, old_price, sale_price, hint=deal_hint)
-                if old_price > sale_price:
-                    price = old_price
-                elif 0 < discount_pct < 95:
-                    price = round(sale_price / (1 - (discount_pct / 100.0)), 2)
-                else:
-                    price = sale_price
-
-                sku = _build_product_sku(brand, category, title, link)
-                dedupe_key = link or sku
-                if dedupe_key in seen_keys:
-                    continue
-                seen_keys.add(dedupe_key)
-
-                candidates.append(
-                    {
-                        "sku": sku,
-                        "title": title or f"{brand} {category}",
-                        "brand": brand,
-                        "category": category,
-                        "color": _guess_color_from_title(title, palette),
-                        "price": round(price, 2),
-                        "sale_price": round(sale_price, 2),
-                        "discount_pct": round(discount_pct, 2),
-                        "product_url": link,
-                        "image_url": row.get("thumbnail") or row.get("image"),
-                        "source": str(row.get("source") or row.get("seller") or "web"),
-                        "query": query,
-                        "data_source": "serpapi",
-                    }
-                )
+    if fetched:
+        try:
+            _store_catalog_segments(fetched)
+        except Exception:
+            pass
 
     candidates.sort(key=lambda item: (float(item.get("discount_pct", 0)), -float(item.get("sale_price", 0))), reverse=True)
     return {
@@ -893,16 +1801,17 @@ def _real_brand_search_payload(style: dict, deals: dict) -> dict:
         "provider": "serpapi_google_shopping",
         "queries": queries[:12],
         "errors": errors[:5],
+        "catalog": {"segments": len(searches), "provider_queries": len(fetched)},
     }
 
 
-def _deals_payload(run_id) -> dict:
-    style = _get_artifact(run_id, "style_brief")
+def _deals_payload(ctx: RunContext) -> dict:
+    style = ctx.artifact("style_brief")
     brands = style.get("recommended_brands") or ["Zara", "H&M", "Mango"]
 
     if _real_catalog_enabled():
         try:
-            live_payload = _real_deals_payload(style=style, brands=brands)
+            live_payload = _real_deals_payload(style=style, brands=brands, run_id=ctx.run_id)
             if live_payload.get("deals"):
                 return live_payload
             fallback = _mock_deals_payload(brands)
@@ -910,6 +1819,8 @@ def _deals_payload(run_id) -> dict:
             fallback["fallback_reason"] = "live_provider_returned_no_results"
             fallback["live_errors"] = live_payload.get("errors", [])
             return fallback
+        except RunCanceled:
+            raise
         except Exception as exc:
             fallback = _mock_deals_payload(brands)
             fallback["data_mode"] = "mock_fallback"
@@ -919,9 +1830,9 @@ def _deals_payload(run_id) -> dict:
     return _mock_deals_payload(brands)
 
 
-def _brand_search_payload(run_id) -> dict:
-    style = _get_artifact(run_id, "style_brief")
-    deals = _get_artifact(run_id, "deals")
+def _brand_search_payload(ctx: RunContext) -> dict:
+    style = ctx.artifact("style_brief")
+    deals = ctx.artifact("deals")
 
     categories = style.get("recommended_categories") or ["dress", "top", "bottom"]
     palette = style.get("palette") or ["black", "navy", "white"]
@@ -930,7 +1841,7 @@ def _brand_search_payload(run_id) -> dict:
 
     if _real_catalog_enabled():
         try:
-            live_payload = _real_brand_search_payload(style=style, deals=deals)
+            live_payload = _real_brand_search_payload(style=style, deals=deals, run_id=ctx.run_id)
             if live_payload.get("product_candidates"):
                 return live_payload
             fallback = _mock_brand_search_payload(brands, categories, palette, deals_by_brand)
@@ -938,6 +1849,8 @@ def _brand_search_payload(run_id) -> dict:
             fallback["fallback_reason"] = "live_provider_returned_no_products"
             fallback["live_errors"] = live_payload.get("errors", [])
             return fallback
+        except RunCanceled:
+            raise
         except Exception as exc:
             fallback = _mock_brand_search_payload(brands, categories, palette, deals_by_brand)
             fallback["data_mode"] = "mock_fallback"
@@ -947,31 +1860,89 @@ def _brand_search_payload(run_id) -> dict:
     return _mock_brand_search_payload(brands, categories, palette, deals_by_brand)
 
 
-def _rank_payload(run_id) -> dict:
-    style = _get_artifact(run_id, "style_brief")
-    search = _get_artifact(run_id, "brand_search")
+def _rank_payload(ctx: RunContext) -> dict:
+    style = ctx.artifact("style_brief")
+    search = ctx.artifact("brand_search")
 
-    palette = {str(color).lower() for color in (style.get("palette") or [])}
-    budget_max = float(style.get("budget_max") or 150)
+    candidates = search.get("product_candidates", [])
+    retrieved = _style_retrieval(style, candidates)
+    if retrieved is None:
+        ranked_items = rank_candidates(candidates, style, RANK_WEIGHTS, k=RANK_TOP_K)
+        return {"ranked_items": ranked_items}
 
-    ranked_items = []
-    for candidate in search.get("product_candidates", []):
-        sale_price = float(candidate.get("sale_price", candidate.get("price", 0)))
-        discount_pct = float(candidate.get("discount_pct", 0))
-        candidate_color = str(candidate.get("color", "")).lower()
-        palette_bonus = 0.1 if candidate_color in palette else 0.0
-        budget_score = max(0.0, 1.0 - (sale_price / max(budget_max, 1.0)))
-        deal_score = min(discount_pct / 50.0, 1.0)
-        score = round((budget_score * 0.45) + (deal_score * 0.45) + palette_bonus, 4)
+    candidates, from_catalog = retrieved
+    ranked_items = rank_candidates(candidates, style, RANK_WEIGHTS, k=RANK_TOP_K)
+    return {"ranked_items": ranked_items, "style_retrieval": {"catalog_candidates": from_catalog}}
 
-        ranked_items.append({**candidate, "score": score})
 
-    ranked_items.sort(key=lambda item: item["score"], reverse=True)
-    return {"ranked_items": ranked_items[:10]}
+def _style_retrieval(style: dict, candidates: list[dict]) -> tuple[list[dict], int] | None:
+    """Score ``candidates`` against the style brief and add the catalog's nearest style matches.
 
+    Returns None when there is no style index (or product data is mocked), so RANK behaves as before.
+    """
+    if PRODUCT_DATA_MODE == "mock" or RANK_STYLE_CANDIDATES <= 0:
+        return None
+    index = load_style_index(PRODUCT_STYLE_INDEX_PATH)
+    if index is None or not len(index):
+        return None
 
-def _tryon_payload(run_id) -> dict:
-    ranked = _get_artifact(run_id, "rank")
+    query = encode_style(style)
+    similarities = encode_products(
+        [{**item, "brand_key": _catalog_brand_key(str(item.get("brand") or ""))} for item in candidates]
+    ) @ query
+    scored = [
+        {**item, "style_similarity": round(float(similarity), 4)} for item, similarity in zip(candidates, similarities)
+    ]
+
+    seen = {item.get("sku") for item in candidates}
+    hits = [
+        (sku, score)
+        for sku, score in index.search(query, RANK_STYLE_CANDIDATES, RANK_STYLE_NPROBE)
+        if sku not in seen
+    ]
+    if not hits:
+        return scored, 0
+    rows = {
+        row["sku"]: row
+        for row in exec_all(
+            """
+            SELECT sku, brand, category, title, product_url, image_url, source, sale_price, old_price,
+                   listed_discount_pct, attributes
+            FROM product_catalog
+            WHERE sku = ANY(CAST(:skus AS TEXT[]))
+            """,
+            {"skus": [sku for sku, _score in hits]},
+        )
+    }
+    palette = [str(c).lower() for c in (style.get("palette") or ["black", "navy", "white"])]
+    budget_max = float(style.get("budget_max") or 150)
+    from_catalog = 0
+    for sku, score in hits:
+        row = rows.get(sku)
+        if row is None:
+            continue
+        candidate = _catalog_candidate(
+            {
+                **dict(row),
+                "sale_price": float(row["sale_price"]),
+                "old_price": float(row["old_price"]),
+                "listed_discount_pct": float(row["listed_discount_pct"]),
+            },
+            row["brand"],
+            row["category"],
+            "style_index",
+            palette,
+            budget_max,
+            0.0,
+        )
+        if candidate is not None:
+            scored.append({**candidate, "data_source": "catalog", "style_similarity": round(score, 4)})
+            from_catalog += 1
+    return scored, from_catalog
+
+
+def _tryon_payload(ctx: RunContext) -> dict:
+    ranked = ctx.artifact("rank")
 
     tryon_results = []
     for item in ranked.get("ranked_items", [])[:4]:
@@ -990,8 +1961,8 @@ def _tryon_payload(run_id) -> dict:
     return {"tryon_results": tryon_results}
 
 
-def _checkout_payload(run_id) -> dict:
-    ranked = _get_artifact(run_id, "rank")
+def _checkout_payload(ctx: RunContext) -> dict:
+    ranked = ctx.artifact("rank")
 
     items = []
     for item in ranked.get("ranked_items", [])[:3]:
@@ -1013,69 +1984,270 @@ def _checkout_payload(run_id) -> dict:
     return {"checkout_draft": {"approval_required": True, "items": items}}
 
 
-def _artifact_payload(step_key: str, run_id) -> dict:
+def _artifact_payload(step_key: str, ctx: RunContext) -> dict:
     if step_key == "STYLE_BRIEF":
-        return _style_brief_payload(run_id)
+        return _style_brief_payload(ctx)
     if step_key == "DEALS":
-        return _deals_payload(run_id)
+        return _deals_payload(ctx)
     if step_key == "BRAND_SEARCH":
-        return _brand_search_payload(run_id)
+        return _brand_search_payload(ctx)
     if step_key == "RANK":
-        return _rank_payload(run_id)
+        return _rank_payload(ctx)
     if step_key == "TRYON":
-        return _tryon_payload(run_id)
+        return _tryon_payload(ctx)
     if step_key == "CHECKOUT_DRAFT":
-        return _checkout_payload(run_id)
+        return _checkout_payload(ctx)
     return {"note": "unknown-step"}
 
 
-def execute_step_impl(step_id: str, run_id: str, step_key: str) -> dict:
-    sid = uuid.UUID(step_id)
-    rid = uuid.UUID(run_id)
+def _style_index_version() -> str | None:
+    if PRODUCT_DATA_MODE == "mock" or RANK_STYLE_CANDIDATES <= 0:
+        return None
+    index = load_style_index(PRODUCT_STYLE_INDEX_PATH)
+    return index.version if index is not None else None
 
-    exec_write(
-        """
-        UPDATE run_steps
-        SET status='RUNNING', started_at=COALESCE(started_at, :started_at), error=NULL
-        WHERE id=:step_id AND run_id=:run_id AND status IN ('PENDING', 'QUEUED', 'RUNNING')
-        """,
-        {"step_id": sid, "run_id": rid, "started_at": _utcnow()},
+
+def _step_memo_inputs(step_key: str, ctx: RunContext) -> dict | None:
+    """Everything the step's artifact depends on, or None when the step is not memoized."""
+    if step_key == "DEALS":
+        style = ctx.artifact("style_brief")
+        return {
+            "brands": (style.get("recommended_brands") or ["Zara", "H&M", "Mango"])[:5],
+            "category": (style.get("recommended_categories") or ["dress", "top", "bottom"])[0],
+            "live": _real_catalog_enabled(),
+        }
+    if step_key == "RANK":
+        return {
+            "style_brief": ctx.artifact("style_brief"),
+            "brand_search": ctx.artifact("brand_search"),
+            "weights": RANK_WEIGHTS,
+            "top_k": RANK_TOP_K,
+            "style_index": _style_index_version(),
+            "style_candidates": RANK_STYLE_CANDIDATES,
+        }
+    if step_key in {"TRYON", "CHECKOUT_DRAFT"}:
+        return {"rank": ctx.artifact("rank")}
+    return None
+
+
+def _source_digest(relative_paths: tuple[str, ...]) -> str:
+    root = Path(__file__).resolve().parents[1]
+    digest = hashlib.sha256()
+    for relative_path in relative_paths:
+        digest.update(relative_path.encode("utf-8"))
+        digest.update((root / relative_path).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+STEP_MEMO_CODE_VERSION = f"{_source_digest(STEP_MEMO_CODE_MODULES)}:{os.getenv('STEP_MEMO_BUILD_ID', '')}"
+
+
+def _step_memo_key(step_key: str, ctx: RunContext) -> str | None:
+    if step_key not in STEP_MEMO_TTL_HOURS:
+        return None
+    inputs = _step_memo_inputs(step_key, ctx)
+    if inputs is None:
+        return None
+    canonical = json.dumps(
+        {"step": step_key, "version": STEP_MEMO_VERSION, "code": STEP_MEMO_CODE_VERSION, "inputs": inputs},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
     )
+    return stable_sha256(canonical)
 
-    try:
-        payload = _artifact_payload(step_key, rid)
 
-        exec_write(
+def _load_step_memo(step_key: str, memo_key: str) -> dict | None:
+    """The blob of a memoized artifact still within the step's TTL, ready to commit for another step.
+
+    Like _artifact_blob_exists, a hit renews the blob's lease so the GC cannot take it before the commit.
+    """
+    now = _utcnow()
+    try:
+        row = exec_one(
             """
-            INSERT INTO artifacts (run_id, run_step_id, user_id, kind, mime_type, storage_backend, inline_json)
-            SELECT r.id, :step_id, r.user_id, :kind, 'application/json', 'inline', CAST(:payload AS JSONB)
-            FROM runs r
-            WHERE r.id = :run_id
+            UPDATE artifact_blobs b
+            SET last_referenced_at=:touched_at
+            FROM step_memo m
+            WHERE b.content_hash = m.content_hash
+              AND m.step_key=:step_key AND m.memo_key=:memo_key AND m.created_at > :min_created_at
+            RETURNING b.content_hash, b.size_bytes, b.storage_backend, b.storage_key, b.inline_json
             """,
             {
-                "step_id": sid,
-                "run_id": rid,
-                "kind": step_key.lower(),
-                "payload": json.dumps(payload),
+                "step_key": step_key,
+                "memo_key": memo_key,
+                "min_created_at": now - timedelta(hours=STEP_MEMO_TTL_HOURS[step_key]),
+                "touched_at": now,
             },
         )
+    except Exception:
+        return None
+    if not row:
+        return None
+    inline_json = row.get("inline_json")
+    return {
+        "content_hash": row["content_hash"],
+        "size_bytes": row["size_bytes"],
+        "storage_backend": row["storage_backend"],
+        "storage_key": row.get("storage_key"),
+        "inline_json": json.dumps(inline_json) if isinstance(inline_json, (dict, list)) else inline_json,
+    }
+
+
+def _claim_step(step_id, run_id) -> bool:
+    # Redeliveries may re-claim a RUNNING step; the success commit below decides which attempt wins.
+    with transaction(synchronous_commit=False) as conn:
+        result = conn.execute(
+            text(
+                """
+                UPDATE run_steps
+                SET status='RUNNING', started_at=COALESCE(started_at, :started_at), error=NULL
+                WHERE id=:step_id AND run_id=:run_id AND status IN ('PENDING', 'QUEUED', 'RUNNING')
+                """
+            ),
+            {"step_id": step_id, "run_id": run_id, "started_at": _utcnow()},
+        )
+        return result.rowcount > 0
+
+
+def _artifact_blob_exists(content_hash: str) -> bool:
+    # Skipping the upload must renew the blob's lease, or the GC could delete an unreferenced row and its object
+    # before the commit upsert recreates the row. The touch commits first: a GC pass that has not locked the row yet
+    # then sees it as recently referenced, and one that already holds it deletes it, the touch matches nothing, and
+    # the payload is uploaded again.
+    row = exec_one(
+        """
+        UPDATE artifact_blobs
+        SET last_referenced_at=:touched_at
+        WHERE content_hash=:content_hash
+        RETURNING content_hash
+        """,
+        {"content_hash": content_hash, "touched_at": _utcnow()},
+    )
+    return row is not None
 
+
+def _release_unreferenced_blob(placement: dict) -> None:
+    """Hand an uploaded object no artifact committed to the blob GC, which deletes it after the grace period."""
+    try:
         exec_write(
             """
-            UPDATE run_steps
-            SET status='SUCCEEDED', finished_at=:finished_at, error=NULL
-            WHERE id=:step_id
+            INSERT INTO artifact_blobs (
+              content_hash, storage_backend, storage_key, size_bytes, refcount, last_referenced_at
+            )
+            VALUES (:content_hash, :storage_backend, :storage_key, :size_bytes, 0, :released_at)
+            ON CONFLICT (content_hash) DO NOTHING
             """,
-            {"step_id": sid, "finished_at": _utcnow()},
+            {
+                "content_hash": placement["content_hash"],
+                "storage_backend": placement["storage_backend"],
+                "storage_key": placement["storage_key"],
+                "size_bytes": placement["size_bytes"],
+                "released_at": _utcnow(),
+            },
+        )
+    except Exception:
+        pass
+
+
+def _commit_step_success(step_id, run_id, kind: str, placement: dict, memo: tuple[str, str] | None = None) -> bool:
+    # The payload is written once per content hash; a duplicate only bumps the blob's refcount. The blob upsert also
+    # locks the row, so the GC cannot delete it between here and the artifact insert. ``memo`` is a (step_key,
+    # memo_key) pair recorded in the same statement, so only committed artifacts are ever memoized.
+    memo_step_key, memo_key = memo or (None, None)
+    row = exec_one(
+        """
+        WITH finished AS (
+          UPDATE run_steps
+          SET status='SUCCEEDED', finished_at=:finished_at, error=NULL
+          WHERE id=:step_id AND run_id=:run_id AND status='RUNNING'
+          RETURNING run_id
+        ),
+        blob AS (
+          INSERT INTO artifact_blobs (
+            content_hash, storage_backend, storage_key, inline_json, size_bytes, refcount, last_referenced_at
+          )
+          SELECT :content_hash, :storage_backend, :storage_key, CAST(:payload AS JSONB), :size_bytes, 1, :finished_at
+          FROM finished
+          ON CONFLICT (content_hash) DO UPDATE SET
+            refcount=artifact_blobs.refcount + 1,
+            last_referenced_at=EXCLUDED.last_referenced_at
+          RETURNING content_hash
+        ),
+        memo AS (
+          INSERT INTO step_memo (step_key, memo_key, content_hash, created_at)
+          SELECT CAST(:memo_step_key AS TEXT), CAST(:memo_key AS TEXT), blob.content_hash, :finished_at
+          FROM blob
+          WHERE CAST(:memo_key AS TEXT) IS NOT NULL
+          ON CONFLICT (step_key, memo_key) DO UPDATE SET
+            content_hash=EXCLUDED.content_hash,
+            created_at=EXCLUDED.created_at
         )
+        INSERT INTO artifacts (run_id, run_step_id, user_id, kind, mime_type, storage_backend, blob_hash)
+        SELECT r.id, :step_id, r.user_id, :kind, 'application/json', 'blob', blob.content_hash
+        FROM finished
+        JOIN runs r ON r.id = finished.run_id
+        CROSS JOIN blob
+        RETURNING id
+        """,
+        {
+            "step_id": step_id,
+            "run_id": run_id,
+            "kind": kind,
+            "finished_at": _utcnow(),
+            "content_hash": placement["content_hash"],
+            "size_bytes": placement["size_bytes"],
+            "storage_backend": placement["storage_backend"],
+            "storage_key": placement["storage_key"],
+            "payload": placement["inline_json"],
+            "memo_step_key": memo_step_key,
+            "memo_key": memo_key,
+        },
+    )
+    return row is not None
+
 
-        return {"step_id": str(sid), "step_key": step_key, "status": "SUCCEEDED"}
+def execute_step_impl(step_id: str, run_id: str, step_key: str) -> dict:
+    sid = uuid.UUID(step_id)
+    rid = uuid.UUID(run_id)
+
+    if not _claim_step(sid, rid):
+        return {"step_id": str(sid), "step_key": step_key, "status": "SKIPPED", "reason": "step is not runnable"}
+
+    try:
+        ctx = _load_run_context(rid, step_key)
+        memo_key = _step_memo_key(step_key, ctx)
+        # A rerun asks for recomputation: skip the lookup, but still refresh the memo with the new artifact.
+        placement = _load_step_memo(step_key, memo_key) if memo_key and ctx.rerun_from is None else None
+        memo_hit = placement is not None
+        memo = None
+        if placement is None:
+            payload = _artifact_payload(step_key, ctx)
+            # The commit would be refused anyway; checking first saves uploading a canceled step's payload.
+            _raise_if_run_canceled(rid)
+            placement = place_artifact(payload, _artifact_blob_exists)
+            # Provider failures fall back to mock data; those are not worth reusing.
+            if memo_key and payload.get("data_mode") != "mock_fallback":
+                memo = (step_key, memo_key)
+
+        if not _commit_step_success(sid, rid, step_key.lower(), placement, memo):
+            if not memo_hit and placement["storage_backend"] != "inline":
+                _release_unreferenced_blob(placement)
+            return {"step_id": str(sid), "step_key": step_key, "status": "SKIPPED", "reason": "step already finished"}
+
+        result = {"step_id": str(sid), "step_key": step_key, "status": "SUCCEEDED"}
+        if memo_key:
+            result["memo"] = "HIT" if memo_hit else "BYPASS" if ctx.rerun_from else "MISS"
+        return result
+    except RunCanceled:
+        # The cancel already marked this step CANCELED; there is nothing to record.
+        return {"step_id": str(sid), "step_key": step_key, "status": "CANCELED"}
     except Exception as exc:
         exec_write(
             """
             UPDATE run_steps
             SET status='FAILED', finished_at=:finished_at, error=:error
-            WHERE id=:step_id
+            WHERE id=:step_id AND status='RUNNING'
             """,
             {
                 "step_id": sid,
@@ -7,9 +7,35 @@ RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/1")
 
 celery_app = Celery("workers", broker=BROKER_URL, backend=RESULT_BACKEND)
 
-from workers.executors.crewai_step_executor import execute_step_impl  # noqa: E402
+from workers.executors.crewai_step_executor import (  # noqa: E402
+    collect_artifact_blobs_impl,
+    execute_step_impl,
+    prewarm_style_brief_impl,
+    rebuild_catalog_snapshot_impl,
+    rebuild_style_index_impl,
+)
 
 
 @celery_app.task(name="workers.worker.execute_step")
 def execute_step(step_id: str, run_id: str, step_key: str):
     return execute_step_impl(step_id=step_id, run_id=run_id, step_key=step_key)
+
+
+@celery_app.task(name="workers.worker.prewarm_style_brief")
+def prewarm_style_brief(user_id: str):
+    return prewarm_style_brief_impl(user_id=user_id)
+
+
+@celery_app.task(name="workers.worker.rebuild_product_catalog_snapshot")
+def rebuild_product_catalog_snapshot():
+    return rebuild_catalog_snapshot_impl()
+
+
+@celery_app.task(name="workers.worker.rebuild_product_style_index")
+def rebuild_product_style_index():
+    return rebuild_style_index_impl()
+
+
+@celery_app.task(name="workers.worker.collect_artifact_blobs")
+def collect_artifact_blobs():
+    return collect_artifact_blobs_impl()